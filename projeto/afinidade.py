@@ -0,0 +1,81 @@
+import os
+from log import obter_log
+
+LOG = obter_log("afinidade")
+
+
+def nucleos_disponiveis():
+    """Núcleos em que este processo pode rodar"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def threads_do_processo(pid):
+    """Ids de todas as threads do processo (no Linux a afinidade e a prioridade são por thread)"""
+    try:
+        return [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        return [pid]
+
+
+class EscalonamentoCpu:
+    """Divide a CPU entre o jogo (laço da serial) e o Stockfish: núcleos separados e o motor em prioridade baixa"""
+
+    def __init__(self, nucleo_jogo=None, motor_nucleos=None, motor_nice=0, threads_busca=None):
+        disponiveis = nucleos_disponiveis()
+        self.jogo = {nucleo_jogo} if nucleo_jogo in disponiveis else None
+        motor = set(motor_nucleos or disponiveis) & set(disponiveis)
+        if self.jogo and not motor_nucleos:
+            motor -= self.jogo
+        if not motor or len(disponiveis) < 2:
+            # Com um só núcleo não há o que separar: resta a prioridade
+            self.jogo = None
+            motor = None
+        self.motor = motor
+        self.motor_nice = motor_nice
+        self.threads_busca = {busca: threads for busca, threads in (threads_busca or {}).items() if threads}
+        self._afinidade = hasattr(os, "sched_setaffinity")
+
+    def reservar_jogo(self):
+        """Fixa o processo do jogo (todas as threads, e as criadas depois) no núcleo reservado"""
+        if self.jogo and self._afinidade:
+            self._fixar(os.getpid(), self.jogo)
+            LOG.info("Jogo e laço da serial no núcleo %s", sorted(self.jogo))
+
+    def ajustar_motor(self, pid):
+        """Fixa o processo do motor nos núcleos dele e reduz a prioridade (as threads criadas depois herdam os dois)"""
+        if pid is None:
+            return
+        if self.motor and self._afinidade:
+            self._fixar(pid, self.motor)
+        if self.motor_nice and hasattr(os, "setpriority"):
+            for tid in threads_do_processo(pid):
+                try:
+                    os.setpriority(os.PRIO_PROCESS, tid, self.motor_nice)
+                except OSError as e:
+                    LOG.aviso("Não foi possível reduzir a prioridade do motor (pid %d): %s", pid, e)
+                    break
+        LOG.info("Motor (pid %d) nos núcleos %s com nice %d", pid, sorted(self.motor) if self.motor else "todos",
+                 self.motor_nice)
+
+    def limitar(self, opcoes):
+        """Opções do motor com as threads limitadas aos núcleos dele"""
+        if self.motor and opcoes.get("Threads", 0) > len(self.motor):
+            return dict(opcoes, Threads=len(self.motor))
+        return opcoes
+
+    def threads(self, busca, maximo):
+        """Threads para um tipo de busca ("dica" ou "jogada"), até as do processo; None = as do processo"""
+        threads = self.threads_busca.get(busca)
+        if threads is None or maximo is None:
+            return threads
+        return min(threads, maximo)
+
+    def _fixar(self, pid, nucleos):
+        for tid in threads_do_processo(pid):
+            try:
+                os.sched_setaffinity(tid, nucleos)
+            except OSError as e:
+                LOG.aviso("Não foi possível fixar o processo %d nos núcleos %s: %s", pid, sorted(nucleos), e)
+                break
@@ -0,0 +1,246 @@
+import threading
+import chess
+import chess.engine
+from log import obter_log
+
+# Quantas respostas prováveis do jogador são ponderadas antes de ele escolher a origem
+PONDER_CANDIDATOS = 3
+
+LOG = obter_log("analise")
+
+
+def pontuacao(info, cor):
+    """Score em centipawns do ponto de vista de cor, com mate valendo 10000 (0 se o info não tiver score)"""
+    if "score" not in info:
+        return 0
+    score = info["score"].pov(cor).score(mate_score=10000)
+    return score if score is not None else 0
+
+
+def ranking_das_infos(board, movimentos, infos):
+    """Converte as linhas de uma busca MultiPV em uma lista (movimento, score) ordenada"""
+    scores = {}
+    for info in infos:
+        pv = info.get("pv")
+        if not pv or pv[0] in scores or "score" not in info:
+            continue
+        scores[pv[0]] = pontuacao(info, board.turn)
+
+    # Movimentos que a busca não chegou a pontuar ficam no fim, sem score
+    ranking = [(move, scores.get(move)) for move in movimentos]
+    ranking.sort(key=lambda item: item[1] if item[1] is not None else float("-inf"), reverse=True)
+    return ranking
+
+
+class AnaliseEspeculativa:
+    """Pré-calcula dicas e pondera respostas em segundo plano enquanto o jogador pensa"""
+
+    # O SimpleEngine cancela o comando em andamento quando recebe outro:
+    # chame cancelar() antes de usar o motor fora desta classe.
+
+    def __init__(self, engine, dica_limite, cache=None, orcamento=None):
+        self.engine = engine
+        self.dica_limite = dica_limite
+        self.cache = cache
+        self.orcamento = orcamento
+        self._lock = threading.Lock()
+        self._cancelado = threading.Event()
+        self._thread = None
+        self._busca = None
+        self._dicas = {}
+        self._respostas = {}
+        self._posicao = None
+
+    ############
+    # CONTROLE #
+    ############
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cancelar()
+
+    def iniciar(self, board, jogada_limite):
+        """Começa a calcular as dicas de todas as origens e, depois, a ponderar respostas"""
+        if self._thread is not None and self._posicao == board.fen():
+            # Já está analisando (ou analisou) esta posição
+            return
+        self.cancelar()
+        self._dicas = {}
+        self._respostas = {}
+        self._posicao = board.fen()
+        board = board.copy()
+
+        origens = {}
+        for move in board.legal_moves:
+            origens.setdefault(move.from_square, []).append(move)
+
+        def tarefas():
+            for origem, movimentos in origens.items():
+                if not self._dica(board, origem, movimentos):
+                    return
+            # Respostas prováveis: a melhor jogada de cada origem, das mais fortes para as mais fracas
+            melhores = [ranking[0] for ranking in self._dicas.values() if ranking]
+            melhores.sort(key=lambda item: item[1] if item[1] is not None else float("-inf"), reverse=True)
+            for move, _ in melhores[:PONDER_CANDIDATOS]:
+                if not self._ponderar(board, move, jogada_limite):
+                    return
+
+        self._disparar(tarefas)
+
+    def ponderar(self, board, movimentos, jogada_limite):
+        """Pondera as respostas do computador a cada um dos movimentos, em ordem"""
+        self.cancelar()
+        board = board.copy()
+
+        def tarefas():
+            for move in movimentos:
+                if not self._ponderar(board, move, jogada_limite):
+                    return
+
+        self._disparar(tarefas)
+
+    def dica_progressiva(self, board, movimentos, jogada_limite, ao_atualizar):
+        """Aprofunda a dica dos movimentos de uma casa chamando ao_atualizar(ranking) a cada profundidade; depois pondera"""
+        self.cancelar()
+        board = board.copy()
+
+        def tarefas():
+            ranking = self._dica_progressiva(board, movimentos, ao_atualizar)
+            if ranking is None:
+                return
+            for move, _ in ranking:
+                if not self._ponderar(board, move, jogada_limite):
+                    return
+
+        self._disparar(tarefas)
+
+    def cancelar(self):
+        """Interrompe a busca em andamento e aguarda a thread terminar"""
+        self._cancelado.set()
+        with self._lock:
+            if self._busca is not None:
+                self._busca.stop()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    #############
+    # RESULTADO #
+    #############
+
+    def dica(self, origem):
+        """Ranking já calculado para a casa de origem, ou None"""
+        return self._dicas.get(origem)
+
+    def resposta(self, board):
+        """Jogada já ponderada do computador para a posição, ou None"""
+        return self._respostas.get(board.fen())
+
+    ##########
+    # BUSCAS #
+    ##########
+
+    def _disparar(self, tarefas):
+        self._cancelado.clear()
+        self._thread = threading.Thread(target=self._executar, args=(tarefas,), daemon=True)
+        self._thread.start()
+
+    def _executar(self, tarefas):
+        try:
+            tarefas()
+        except chess.engine.EngineError as e:
+            LOG.aviso("Análise em segundo plano interrompida: %s", e)
+        except Exception as e:
+            LOG.excecao("Erro na análise em segundo plano: %s", e)
+
+    def _buscar(self, board, limite, **opcoes):
+        """Executa uma busca cancelável; devolve None se ela foi cancelada"""
+        with self._lock:
+            if self._cancelado.is_set():
+                return None
+            busca = self._busca = self.engine.analysis(board, limite, **opcoes)
+        try:
+            melhor = busca.wait()
+            infos = busca.multipv
+        finally:
+            with self._lock:
+                self._busca = None
+        if self.orcamento and infos:
+            # Buscas de fundo também medem os nós/s do motor
+            self.orcamento.registrar(infos[0])
+        # O escalonador de vários tabuleiros pode interromper a busca para ceder o motor
+        if self._cancelado.is_set() or getattr(busca, "interrompida", False):
+            return None
+        return melhor, infos
+
+    def _dica(self, board, origem, movimentos):
+        if self.cache:
+            ranking = self.cache.obter_dica(board, origem, self.dica_limite)
+            if ranking is not None:
+                self._dicas[origem] = ranking
+                return not self._cancelado.is_set()
+        resultado = self._buscar(board, self.dica_limite, busca="dica", multipv=len(movimentos), root_moves=movimentos)
+        if resultado is None:
+            return False
+        _, infos = resultado
+        self._dicas[origem] = ranking_das_infos(board, movimentos, infos)
+        if self.cache:
+            self.cache.guardar_dica(board, origem, self.dica_limite, self._dicas[origem])
+        return True
+
+    def _dica_progressiva(self, board, movimentos, ao_atualizar):
+        origem = movimentos[0].from_square
+        with self._lock:
+            if self._cancelado.is_set():
+                return None
+            busca = self._busca = self.engine.analysis(board, self.dica_limite, busca="dica", multipv=len(movimentos),
+                                                       root_moves=movimentos)
+        try:
+            for info in busca:
+                # A última linha do MultiPV fecha uma profundidade: todas as linhas já têm score nela
+                if info.get("multipv", 1) == len(movimentos) and "pv" in info:
+                    ao_atualizar(ranking_das_infos(board, movimentos, busca.multipv))
+            busca.wait()
+            infos = busca.multipv
+        finally:
+            with self._lock:
+                self._busca = None
+        if self._cancelado.is_set():
+            return None
+        if getattr(busca, "interrompida", False):
+            # Com vários tabuleiros não havia motor ocioso (ou ele foi cedido): busca única, com prioridade
+            infos = self.engine.analyse(board, self.dica_limite, busca="dica", multipv=len(movimentos),
+                                        root_moves=movimentos)
+        if self.orcamento and infos:
+            self.orcamento.registrar(infos[0])
+
+        ranking = ranking_das_infos(board, movimentos, infos)
+        self._dicas[origem] = ranking
+        if self.cache:
+            self.cache.guardar_dica(board, origem, self.dica_limite, ranking)
+        ao_atualizar(ranking)
+        return ranking
+
+    def _ponderar(self, board, move, jogada_limite):
+        board.push(move)
+        try:
+            if board.is_game_over() or board.fen() in self._respostas:
+                return not self._cancelado.is_set()
+            if self.cache:
+                move = self.cache.obter_jogada(board, jogada_limite)
+                if move is not None:
+                    self._respostas[board.fen()] = move
+                    return not self._cancelado.is_set()
+            resultado = self._buscar(board, jogada_limite, busca="jogada")
+            if resultado is None:
+                return False
+            melhor, _ = resultado
+            if melhor.move is not None:
+                self._respostas[board.fen()] = melhor.move
+                if self.cache:
+                    self.cache.guardar_jogada(board, jogada_limite, melhor.move)
+            return True
+        finally:
+            board.pop()
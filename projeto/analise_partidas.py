@@ -0,0 +1,204 @@
+import argparse
+import collections
+import concurrent.futures
+import csv
+import math
+import os
+import sys
+import threading
+import chess
+import chess.engine
+import chess.pgn
+from analise import pontuacao
+from motor import MotorXadrez
+from transporte import CicloEventos
+import xadrez
+
+# Centipawns perdidos a partir dos quais o lance é uma imprecisão, um erro ou um erro grave
+IMPRECISAO = 50
+ERRO = 100
+ERRO_GRAVE = 300
+
+# Avaliações limitadas a este valor no cálculo da perda: um mate perdido não vale 10000 centipawns
+AVALIACAO_MAXIMA = 1000
+
+# Um núcleo por processo e prioridade baixa, para não atrasar partidas em andamento no mesmo Raspberry
+ANALISE_OPCOES = {"Threads": 1, "Hash": 32}
+ANALISE_NICE = 10
+
+# Posições em análise (por processo) antes de esperar a partida mais antiga ser escrita
+POSICOES_POR_PROCESSO = 16
+
+CAMPOS = ["partida", "lance", "cor", "jogada", "avaliacao", "melhor", "perda"]
+
+
+def precisao(antes, depois):
+    """Precisão (0-100) de um lance pela queda na chance de vitória, como no lichess"""
+    def chance(cp):
+        return 50 + 50 * (2 / (1 + math.exp(-0.00368208 * cp)) - 1)
+    queda = max(chance(antes) - chance(depois), 0)
+    return max(min(103.1668 * math.exp(-0.04354 * queda) - 3.1669, 100), 0)
+
+
+class PoolMotores:
+    """Processos do Stockfish (um por thread) avaliando posições em paralelo; posições repetidas são avaliadas uma vez"""
+
+    def __init__(self, caminho, processos, limite):
+        self.caminho = caminho
+        self.limite = limite
+        self.ciclo = CicloEventos()
+        self.executor = concurrent.futures.ThreadPoolExecutor(processos, thread_name_prefix="Analise")
+        self.avaliadas = 0
+        self._local = threading.local()
+        self._motores = []
+        self._futuros = {}
+        self._lock = threading.Lock()
+
+    def avaliar(self, board):
+        """Future com (score do lado que joga, melhor lance) da posição"""
+        chave = " ".join(board.fen().split()[:4])
+        if chave not in self._futuros:
+            self._futuros[chave] = self.executor.submit(self._avaliar, board.copy(stack=False))
+        return self._futuros[chave]
+
+    def _avaliar(self, board):
+        if board.is_checkmate():
+            return -10000, None
+        if board.is_game_over():
+            return 0, None
+        info = self._motor().analyse(board, self.limite)
+        pv = info.get("pv")
+        with self._lock:
+            self.avaliadas += 1
+        return pontuacao(info, board.turn), (pv[0] if pv else None)
+
+    def _motor(self):
+        motor = getattr(self._local, "motor", None)
+        if motor is None:
+            motor = self._local.motor = MotorXadrez(self.ciclo, self.caminho, ANALISE_OPCOES)
+            with self._lock:
+                self._motores.append(motor)
+        return motor
+
+    def fechar(self):
+        # As análises que ainda não começaram são canceladas (o cancel_futures do shutdown só existe no 3.9+)
+        for futuro in self._futuros.values():
+            futuro.cancel()
+        self.executor.shutdown()
+        for motor in self._motores:
+            motor.fechar()
+        self.ciclo.fechar()
+
+
+def ler_partidas(arquivos):
+    for arquivo in arquivos:
+        with open(arquivo) as entrada:
+            while True:
+                jogo = chess.pgn.read_game(entrada)
+                if jogo is None:
+                    break
+                yield jogo
+
+
+def relatorio(numero, jogo, avaliacoes):
+    """Linhas por lance e resumo por cor de uma partida já avaliada"""
+    linhas = []
+    perdas = {chess.WHITE: [], chess.BLACK: []}
+    precisoes = {chess.WHITE: [], chess.BLACK: []}
+    board = jogo.board()
+    for indice, move in enumerate(jogo.mainline_moves()):
+        cor = board.turn
+        melhor_score, melhor = avaliacoes[indice]
+        jogada_score = -avaliacoes[indice + 1][0]
+        antes = max(min(melhor_score, AVALIACAO_MAXIMA), -AVALIACAO_MAXIMA)
+        depois = max(min(jogada_score, AVALIACAO_MAXIMA), -AVALIACAO_MAXIMA)
+        perda = max(antes - depois, 0)
+        perdas[cor].append(perda)
+        precisoes[cor].append(precisao(antes, depois))
+        linhas.append({
+            "partida": numero,
+            "lance": board.fullmove_number,
+            "cor": "brancas" if cor == chess.WHITE else "pretas",
+            "jogada": board.san(move),
+            "avaliacao": jogada_score if cor == chess.WHITE else -jogada_score,  # do ponto de vista das brancas
+            "melhor": board.san(melhor) if melhor else "",
+            "perda": perda,
+        })
+        board.push(move)
+
+    resumo = {}
+    for cor, nome in ((chess.WHITE, "White"), (chess.BLACK, "Black")):
+        valores = perdas[cor]
+        resumo[jogo.headers.get(nome, "?")] = {
+            "perda_media": round(sum(valores) / len(valores)) if valores else 0,
+            "precisao": round(sum(precisoes[cor]) / len(valores), 1) if valores else 100.0,
+            "imprecisoes": sum(IMPRECISAO <= perda < ERRO for perda in valores),
+            "erros": sum(ERRO <= perda < ERRO_GRAVE for perda in valores),
+            "erros_graves": sum(perda >= ERRO_GRAVE for perda in valores),
+        }
+    return linhas, resumo
+
+
+def analisar(arquivos, pool, processos, saida):
+    """Avalia todas as posições das partidas e escreve o relatório de cada uma assim que ela termina"""
+    escritor = csv.DictWriter(saida, CAMPOS)
+    escritor.writeheader()
+    pendentes = collections.deque()
+
+    def escrever():
+        numero, jogo, futuros = pendentes.popleft()
+        linhas, resumo = relatorio(numero, jogo, [futuro.result() for futuro in futuros])
+        escritor.writerows(linhas)
+        saida.flush()
+        print(f"Partida {numero} ({jogo.headers.get('Date', '?')}, {jogo.headers.get('Result', '*')}):")
+        for jogador, numeros in resumo.items():
+            print(f"  {jogador}: {numeros}")
+
+    partidas = 0
+    for partidas, jogo in enumerate(ler_partidas(arquivos), 1):
+        board = jogo.board()
+        futuros = [pool.avaliar(board)]
+        for move in jogo.mainline_moves():
+            board.push(move)
+            futuros.append(pool.avaliar(board))
+        pendentes.append((partidas, jogo, futuros))
+
+        # A partida mais antiga é escrita quando termina, ou antes de enfileirar posições demais
+        while pendentes and (all(futuro.done() for futuro in pendentes[0][2])
+                             or sum(len(p[2]) for p in pendentes) > processos * POSICOES_POR_PROCESSO):
+            escrever()
+    while pendentes:
+        escrever()
+    return partidas
+
+
+def main():
+    padrao = os.path.join(xadrez.DIARIO_DIRETORIO or ".", "partidas.pgn")
+    parser = argparse.ArgumentParser(description="Análise das partidas terminadas: avaliação, melhor lance e perda por lance")
+    parser.add_argument("pgn", nargs="*", default=[padrao], help="arquivos PGN (padrão: %(default)s)")
+    parser.add_argument("--saida", default="analise.csv", help="relatório por lance em CSV (padrão: %(default)s)")
+    parser.add_argument("--stockfish", nargs="+", default=[xadrez.STOCKFISH_PATH],
+                        help="comando do motor UCI (padrão: %(default)s)")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1,
+                        help="processos do Stockfish em paralelo (padrão: %(default)s)")
+    parser.add_argument("--profundidade", type=int, default=14, help="profundidade por posição (padrão: %(default)s)")
+    parser.add_argument("--tempo", type=float, help="limite de segundos por posição, além da profundidade")
+    args = parser.parse_args()
+
+    os.nice(ANALISE_NICE)
+    stockfish = args.stockfish[0] if len(args.stockfish) == 1 else args.stockfish
+    limite = chess.engine.Limit(depth=args.profundidade, time=args.tempo)
+    pool = PoolMotores(stockfish, args.processos, limite)
+    try:
+        with open(args.saida, "w", newline="") as saida:
+            partidas = analisar(args.pgn, pool, args.processos, saida)
+    except KeyboardInterrupt:
+        print("\nAnálise interrompida pelo usuário (Ctrl+C)")
+        sys.exit(1)
+    finally:
+        pool.fechar()
+    print(f"\n{partidas} partidas, {pool.avaliadas} posições avaliadas - relatório em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import sys
+import tempfile
+import time
+import chess
+import chess.engine
+from benchmark import FASES, percentil
+from cache import CacheAnalise
+from calibrar import memoria_processo
+from diario import DiarioPartida
+from log import configurar
+from motor import MotorXadrez
+from simulador import EspSimulado
+from transporte import CicloEventos
+import xadrez
+
+# Jogador movido pelo motor: busca curta em um processo próprio, com um lance aleatório de vez em quando
+# para as partidas não se repetirem
+JOGADOR_OPCOES = {"Threads": 1, "Hash": 16}
+JOGADOR_PROFUNDIDADE = 2
+JOGADOR_ALEATORIO = 0.1
+
+# Segundos que cada trabalhador tem para terminar a partida em andamento depois do fim do teste
+ENCERRAMENTO = 30
+
+
+def jogador_motor(motor, rng):
+    """Escolha dos lances do jogador simulado pelo motor"""
+    limite = chess.engine.Limit(depth=JOGADOR_PROFUNDIDADE)
+
+    def escolher(board):
+        if rng.random() < JOGADOR_ALEATORIO:
+            return rng.choice(list(board.legal_moves))
+        return motor.play(board, limite).move
+    return escolher
+
+
+def trabalhador(indice, opcoes, resultados, parar):
+    """Processo que joga partidas seguidas contra um ESP32 simulado e envia as medições de cada uma"""
+    if not opcoes["verboso"]:
+        # Só os erros aparecem, sem misturar a saída de vários trabalhadores
+        configurar(nivel="erro", saida=sys.stderr)
+        sys.stdout = open(os.devnull, "w")
+    semente = opcoes["semente"] + indice
+    ciclo = CicloEventos()
+    motor = MotorXadrez(ciclo, opcoes["stockfish"])
+    adversario = None
+    jogador = None
+    if opcoes["jogador"] == "motor":
+        adversario = MotorXadrez(ciclo, opcoes["stockfish"], JOGADOR_OPCOES)
+        jogador = jogador_motor(adversario, random.Random(semente))
+    simulador = EspSimulado(semente=semente, jogador=jogador)
+    # Cache e diário persistem entre as partidas do trabalhador, como em uma sessão longa
+    diretorio = tempfile.mkdtemp(prefix=f"autojogo_{indice}_")
+    cache = CacheAnalise(os.path.join(diretorio, "analises.db"))
+    diario = DiarioPartida(os.path.join(diretorio, "diario.jsonl"), os.path.join(diretorio, "partidas.pgn"))
+    jogo = xadrez.XadrezESP32(ciclo=ciclo, motor=motor, cache=cache, ser=simulador.conectar(), diario=diario)
+    # Uma partida cortada pelo limite de turnos não é retomada: cada uma começa da posição inicial
+    posicao_inicial = chess.STARTING_FEN if opcoes["turnos"] else None
+
+    try:
+        while not parar.is_set():
+            if opcoes["dificuldade"]:
+                jogo.dificuldade_depth = opcoes["dificuldade"]
+            jogo.latencias = {}
+            inicio = time.monotonic()
+            concluida = jogo.iniciar_partida(posicao_inicial=posicao_inicial, max_turnos=opcoes["turnos"])
+            resultados.put({
+                "trabalhador": indice,
+                "instante": time.time(),
+                "duracao_s": time.monotonic() - inicio,
+                "concluida": bool(concluida),
+                "lances": len(jogo.board.move_stack) if jogo.board else 0,
+                "latencias": jogo.latencias,
+                "memoria_mb": memoria_processo(os.getpid()),
+                "motor_memoria_mb": memoria_processo(motor.pid()),
+                "reinicios": motor.reinicios,
+                "divergencias": simulador.divergencias,
+            })
+    except KeyboardInterrupt:
+        pass
+    finally:
+        jogo.fechar_conexao()
+        motor.fechar()
+        if adversario:
+            adversario.fechar()
+        ciclo.fechar()
+        simulador.fechar()
+        cache.fechar()
+        diario.fechar()
+        if jogo.livro:
+            jogo.livro.fechar()
+        if jogo.tablebase:
+            jogo.tablebase.fechar()
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+def resumir_janela(amostras, inicio, fim, decorrido):
+    """Partidas, latências e memória das partidas terminadas em [inicio, fim)"""
+    janela = [a for a in amostras if inicio <= a["instante"] < fim]
+    resumo = {
+        "decorrido_s": round(decorrido),
+        "partidas": len(janela),
+        "partidas_hora": round(len(amostras) * 3600 / max(decorrido, 1), 1),
+        "falhas": sum(not a["concluida"] for a in janela),
+    }
+    for fase in FASES:
+        valores = [v for a in janela for v in a["latencias"].get(fase, [])]
+        if valores:
+            resumo[fase] = {"p50_ms": round(1000 * percentil(valores, 50), 1),
+                            "p95_ms": round(1000 * percentil(valores, 95), 1)}
+    # Último valor de cada trabalhador: memória somada e reinícios acumulados
+    ultimas = {}
+    for amostra in amostras:
+        if amostra["instante"] < fim:
+            ultimas[amostra["trabalhador"]] = amostra
+    resumo["memoria_mb"] = sum(a["memoria_mb"] or 0 for a in ultimas.values())
+    resumo["motor_memoria_mb"] = sum(a["motor_memoria_mb"] or 0 for a in ultimas.values())
+    resumo["reinicios"] = sum(a["reinicios"] for a in ultimas.values())
+    resumo["divergencias"] = sum(a["divergencias"] for a in ultimas.values())
+    return resumo
+
+
+def imprimir_janela(resumo):
+    def p95(fase):
+        return resumo[fase]["p95_ms"] if fase in resumo else "-"
+    print(f"{resumo['decorrido_s']:>8}{resumo['partidas']:>9}{resumo['partidas_hora']:>11}{p95('dica'):>11}"
+          f"{p95('jogada'):>12}{resumo['memoria_mb']:>10}{resumo['motor_memoria_mb']:>10}{resumo['reinicios']:>10}",
+          flush=True)
+
+
+def crescimento(amostras, chave):
+    """Maior crescimento de memória entre a primeira e a última partida de um mesmo trabalhador"""
+    por_trabalhador = {}
+    for amostra in amostras:
+        if amostra[chave] is not None:
+            por_trabalhador.setdefault(amostra["trabalhador"], []).append(amostra[chave])
+    return max((valores[-1] - valores[0] for valores in por_trabalhador.values()), default=None)
+
+
+def resumir(amostras, janelas, decorrido):
+    """Vazão total, deriva das latências (primeira contra última janela), crescimento de memória e reinícios"""
+    com_partidas = [j for j in janelas if j["partidas"]]
+    deriva = {}
+    for fase in FASES:
+        medidas = [j[fase] for j in com_partidas if fase in j]
+        if len(medidas) >= 2:
+            deriva[fase] = {
+                "p50_ms": round(medidas[-1]["p50_ms"] - medidas[0]["p50_ms"], 1),
+                "p95_ms": round(medidas[-1]["p95_ms"] - medidas[0]["p95_ms"], 1),
+            }
+    return {
+        "decorrido_s": round(decorrido),
+        "partidas": len(amostras),
+        "partidas_hora": round(len(amostras) * 3600 / max(decorrido, 1), 1),
+        "falhas": sum(not a["concluida"] for a in amostras),
+        "lances_por_partida": round(sum(a["lances"] for a in amostras) / len(amostras), 1) if amostras else 0,
+        "deriva": deriva,
+        "crescimento_memoria_mb": crescimento(amostras, "memoria_mb"),
+        "crescimento_motor_mb": crescimento(amostras, "motor_memoria_mb"),
+        "reinicios": janelas[-1]["reinicios"] if janelas else 0,
+        "divergencias": janelas[-1]["divergencias"] if janelas else 0,
+    }
+
+
+def executar(opcoes, trabalhadores, partidas, duracao, intervalo):
+    """Joga com vários trabalhadores até o número de partidas ou a duração, resumindo cada intervalo"""
+    contexto = multiprocessing.get_context("spawn")
+    resultados = contexto.Queue()
+    parar = contexto.Event()
+    processos = [contexto.Process(target=trabalhador, args=(i, opcoes, resultados, parar), name=f"Autojogo {i}")
+                 for i in range(trabalhadores)]
+    for processo in processos:
+        processo.start()
+
+    inicio = time.time()
+    amostras = []
+    janelas = []
+    fim_janela = inicio + intervalo
+    print(f"{'tempo s':>8}{'partidas':>9}{'partidas/h':>11}{'dica p95':>11}{'jogada p95':>12}"
+          f"{'mem MB':>10}{'motor MB':>10}{'reinícios':>10}")
+    try:
+        while partidas is None or len(amostras) < partidas:
+            if duracao is not None and time.time() - inicio >= duracao:
+                break
+            if not any(processo.is_alive() for processo in processos):
+                print("Todos os trabalhadores terminaram")
+                break
+            try:
+                amostras.append(resultados.get(timeout=max(min(fim_janela - time.time(), 1), 0.01)))
+            except queue.Empty:
+                pass
+            if time.time() >= fim_janela:
+                janelas.append(resumir_janela(amostras, fim_janela - intervalo, fim_janela, fim_janela - inicio))
+                imprimir_janela(janelas[-1])
+                fim_janela += intervalo
+    except KeyboardInterrupt:
+        print("\nInterrompido pelo usuário")
+    finally:
+        parar.set()
+        # Um processo só termina depois de escrever o que pôs na fila: ela é esvaziada enquanto eles terminam
+        prazo = time.time() + ENCERRAMENTO
+        while any(processo.is_alive() for processo in processos) and time.time() < prazo:
+            try:
+                resultados.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for processo in processos:
+            if processo.is_alive():
+                processo.terminate()
+            processo.join()
+
+    decorrido = time.time() - inicio
+    janelas.append(resumir_janela(amostras, fim_janela - intervalo, time.time() + 1, decorrido))
+    imprimir_janela(janelas[-1])
+    return {"janelas": janelas, "resumo": resumir(amostras, janelas, decorrido)}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Partidas automáticas contra ESP32 simulados, em paralelo, para testes de longa duração")
+    parser.add_argument("--stockfish", nargs="+", default=[xadrez.STOCKFISH_PATH],
+                        help="comando do motor UCI (padrão: %(default)s)")
+    parser.add_argument("--trabalhadores", type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help="processos jogando ao mesmo tempo, cada um com seu motor (padrão: %(default)s)")
+    parser.add_argument("--partidas", type=int, help="encerra depois deste total de partidas")
+    parser.add_argument("--duracao", type=float, help="encerra depois destes segundos")
+    parser.add_argument("--intervalo", type=float, default=60, help="segundos entre relatórios (padrão: %(default)s)")
+    parser.add_argument("--jogador", choices=["aleatorio", "motor"], default="aleatorio",
+                        help="como o jogador simulado escolhe os lances (padrão: %(default)s)")
+    parser.add_argument("--turnos", type=int, help="turnos máximos por partida (padrão: até o fim da partida)")
+    parser.add_argument("--dificuldade", type=int,
+                        help="profundidade fixa (padrão: a do jogo, que muda a cada vitória das brancas)")
+    parser.add_argument("--semente", type=int, default=1, help="semente dos lances do primeiro trabalhador")
+    parser.add_argument("--json", help="grava as janelas e o resumo neste arquivo")
+    parser.add_argument("--verboso", action="store_true", help="mostra a saída dos jogos")
+    args = parser.parse_args()
+    if args.partidas is None and args.duracao is None:
+        parser.error("informe --partidas e/ou --duracao")
+
+    opcoes = {
+        "stockfish": args.stockfish[0] if len(args.stockfish) == 1 else args.stockfish,
+        "jogador": args.jogador,
+        "turnos": args.turnos,
+        "dificuldade": args.dificuldade,
+        "semente": args.semente,
+        "verboso": args.verboso,
+    }
+    resultado = executar(opcoes, args.trabalhadores, args.partidas, args.duracao, args.intervalo)
+
+    resumo = resultado["resumo"]
+    print(f"\n{resumo['partidas']} partidas em {resumo['decorrido_s']} s ({resumo['partidas_hora']}/h),"
+          f" {resumo['lances_por_partida']} lances por partida, {resumo['falhas']} falhas")
+    for fase, deriva in resumo["deriva"].items():
+        print(f"Deriva {fase}: p50 {deriva['p50_ms']:+} ms, p95 {deriva['p95_ms']:+} ms")
+    print(f"Crescimento de memória: Python {resumo['crescimento_memoria_mb']} MB,"
+          f" motor {resumo['crescimento_motor_mb']} MB - reinícios do motor: {resumo['reinicios']}"
+          f" - divergências de tabuleiro: {resumo['divergencias']}")
+
+    if args.json:
+        with open(args.json, "w") as arquivo:
+            json.dump(resultado, arquivo, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from cache import CacheAnalise
+from diario import DiarioPartida
+from log import configurar
+from motor import MotorXadrez
+from perfilamento import PerfilamentoTurnos
+from remoto import MotorRemoto
+from simulador import EspSimulado
+from transporte import CicloEventos
+import xadrez
+
+# Posições fixas: o jogador (simulado) joga com o lado que tem a vez
+POSICOES = [
+    ("inicial", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"),
+    ("italiana", "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"),
+    ("siciliana", "rnbqkb1r/pp2pppp/3p1n2/8/3NP3/8/PPP2PPP/RNBQKB1R w KQkq - 1 5"),
+    ("meio_jogo", "r2q1rk1/pp1nbppp/2p1pn2/3p4/2PP4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10"),
+    ("tatica", "r1b1k2r/ppppqppp/2n2n2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQK2R w KQkq - 1 6"),
+    ("final_torres", "8/5pk1/6p1/8/3R4/6P1/r4PK1/8 w - - 0 40"),
+    ("final_peoes", "8/8/4k3/3p4/3P4/4K3/8/8 w - - 0 50"),
+]
+
+FASES = ["sincronia", "dica", "jogada", "confirmacao"]
+
+
+def percentil(valores, p):
+    """Percentil pelo método do posto mais próximo"""
+    ordenados = sorted(valores)
+    posto = max(int(-(-p * len(ordenados) // 100)), 1)
+    return ordenados[posto - 1]
+
+
+def resumir(latencias):
+    resumo = {}
+    for fase in FASES:
+        valores = latencias.get(fase, [])
+        if not valores:
+            continue
+        resumo[fase] = {
+            "n": len(valores),
+            "p50_ms": round(1000 * percentil(valores, 50), 1),
+            "p95_ms": round(1000 * percentil(valores, 95), 1),
+            "p99_ms": round(1000 * percentil(valores, 99), 1),
+            "max_ms": round(1000 * max(valores), 1),
+        }
+    return resumo
+
+
+def executar(stockfish, turnos, dificuldade, semente, pty, verboso, perda=0.0, remoto=None, perfilamento_limite=None):
+    """Joga a suíte de posições contra o ESP32 simulado e devolve as latências de cada fase"""
+    simulador = EspSimulado(semente=semente, perda=perda)
+    # Núcleos e prioridade como no xadrez.py: a serial simulada também disputa a CPU com o motor
+    cpu = xadrez.escalonamento_cpu()
+    cpu.reservar_jogo()
+    ciclo = CicloEventos()
+    motor = MotorXadrez(ciclo, stockfish, cpu=cpu)
+    if remoto:
+        motor = MotorRemoto(ciclo, remoto, motor)
+    diretorio = tempfile.mkdtemp(prefix="benchmark_")
+    # Cache vazio a cada execução: o benchmark mede as buscas, não acertos de execuções anteriores
+    cache = CacheAnalise(os.path.join(diretorio, "analises.db"))
+    diario = DiarioPartida(os.path.join(diretorio, "diario.jsonl"))
+    descartada = io.StringIO()
+    saida = contextlib.nullcontext() if verboso else contextlib.redirect_stdout(descartada)
+    if not verboso:
+        # Os registros são escritos por uma thread, inclusive depois de sair do redirect_stdout
+        configurar(saida=descartada)
+
+    inicio = time.perf_counter()
+    with saida:
+        if pty:
+            jogo = xadrez.XadrezESP32(porta=simulador.abrir_pty(), ciclo=ciclo, motor=motor, cache=cache,
+                                      diario=diario)
+        else:
+            jogo = xadrez.XadrezESP32(ciclo=ciclo, motor=motor, cache=cache, ser=simulador.conectar(), diario=diario)
+    conexao = time.perf_counter() - inicio
+    if perfilamento_limite is not None:
+        jogo.perfilamento = PerfilamentoTurnos(xadrez.PERFILAMENTO_DIRETORIO, perfilamento_limite, prefixo="benchmark")
+
+    latencias = {}
+    try:
+        for nome, fen in POSICOES:
+            print(f"Posição {nome}...", flush=True)
+            simulador.posicao_inicial = fen
+            jogo.dificuldade_depth = dificuldade
+            jogo.latencias = {}
+            with saida:
+                jogo.iniciar_partida(posicao_inicial=fen, max_turnos=turnos)
+            for fase, valores in jogo.latencias.items():
+                latencias.setdefault(fase, []).extend(valores)
+    finally:
+        estatisticas = motor.estatisticas()
+        with saida:
+            jogo.fechar_conexao()
+            motor.fechar()
+            ciclo.fechar()
+            simulador.fechar()
+            cache.fechar()
+            diario.fechar()
+            if jogo.livro:
+                jogo.livro.fechar()
+            if jogo.tablebase:
+                jogo.tablebase.fechar()
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    return {
+        "conexao_s": round(conexao, 2),
+        "partidas": simulador.partidas,
+        "divergencias": simulador.divergencias,
+        "motor": estatisticas,
+        "fases": resumir(latencias),
+        "perfis": jogo.perfilamento.estatisticas() if jogo.perfilamento else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência por fase do turno contra um ESP32 simulado")
+    parser.add_argument("--stockfish", nargs="+", default=[xadrez.STOCKFISH_PATH],
+                        help="comando do motor UCI (padrão: %(default)s)")
+    parser.add_argument("--turnos", type=int, default=10, help="turnos por posição (padrão: %(default)s)")
+    parser.add_argument("--dificuldade", type=int, default=3, help="profundidade da dificuldade (padrão: %(default)s)")
+    parser.add_argument("--semente", type=int, default=1, help="semente dos lances do jogador simulado")
+    parser.add_argument("--pty", action="store_true", help="fala com o simulador por um pseudoterminal, como uma porta real")
+    parser.add_argument("--ocupacao", action="store_true",
+                        help="modo ocupação: o simulador transmite os sensores e o lance é reconhecido pelo Raspberry")
+    parser.add_argument("--sem-fila", action="store_true", help="um comando por vez, sem a fila de comandos numerados")
+    parser.add_argument("--perda", type=float, default=0.0,
+                        help="probabilidade de o simulador perder um comando numerado (padrão: %(default)s)")
+    parser.add_argument("--remoto", metavar="HOST:PORTA", help="buscas em um servidor_engine.py, com o motor local como reserva")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"grava o perfil de cada turno lento em {xadrez.PERFILAMENTO_DIRETORIO}")
+    parser.add_argument("--profile-limite", type=int, default=xadrez.PERFILAMENTO_LIMITE_MS, metavar="MS",
+                        help="espera do jogador no turno, em ms, a partir da qual o perfil é gravado (padrão: %(default)s)")
+    parser.add_argument("--json", help="grava o resultado neste arquivo")
+    parser.add_argument("--verboso", action="store_true", help="mostra a saída do jogo")
+    args = parser.parse_args()
+    xadrez.MODO_OCUPACAO = args.ocupacao
+    xadrez.FILA_COMANDOS = not args.sem_fila
+
+    stockfish = args.stockfish[0] if len(args.stockfish) == 1 else args.stockfish
+    remoto = None
+    if args.remoto:
+        host, porta = args.remoto.rsplit(":", 1)
+        remoto = (host, int(porta))
+    resultado = executar(stockfish, args.turnos, args.dificuldade, args.semente, args.pty, args.verboso, args.perda,
+                         remoto, args.profile_limite if args.profile else None)
+
+    print(f"\nConexão: {resultado['conexao_s']} s - partidas: {resultado['partidas']}"
+          f" - divergências de tabuleiro: {resultado['divergencias']} - motor: {resultado['motor']}")
+    print(f"{'fase':<12}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for fase, resumo in resultado["fases"].items():
+        print(f"{fase:<12}{resumo['n']:>6}{resumo['p50_ms']:>10}{resumo['p95_ms']:>10}"
+              f"{resumo['p99_ms']:>10}{resumo['max_ms']:>10}")
+    if resultado["perfis"]:
+        print(f"Perfis de turno: {resultado['perfis']} em {xadrez.PERFILAMENTO_DIRETORIO}")
+
+    if args.json:
+        with open(args.json, "w") as arquivo:
+            json.dump(resultado, arquivo, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import sqlite3
+import threading
+import chess
+import chess.polyglot
+
+# Limite de entradas no disco; ao ultrapassar, as menos usadas recentemente são descartadas
+CACHE_MAX_ENTRADAS = 200000
+CACHE_FOLGA = 0.1  # fração extra removida de uma vez para não limpar a cada inserção
+
+
+def assinatura_limite(limite):
+    """Resume um chess.engine.Limit em texto para compor a chave do cache"""
+    # Só a profundidade, que é a da dificuldade (ou a calibrada para ela): o tempo e os nós vêm do orçamento, que
+    # muda com os nós/s medidos, e com eles a mesma posição nunca voltaria a acertar depois de reiniciar. O MultiPV
+    # da dica é o número de lances da origem, que já faz parte da chave.
+    return f"d{limite.depth}"
+
+
+class CacheAnalise:
+    """Cache persistente (SQLite) de dicas e jogadas, indexado pelo hash Zobrist da posição"""
+
+    def __init__(self, arquivo, max_entradas=CACHE_MAX_ENTRADAS):
+        self.arquivo = arquivo
+        self.max_entradas = max_entradas
+        self.acertos = {"dica": 0, "jogada": 0}
+        self.falhas = {"dica": 0, "jogada": 0}
+        self._lock = threading.Lock()
+        self._acessos = {}  # (chave, tipo, parametro) -> acesso ainda não gravado: os acertos não escrevem no disco
+
+        self.conexao = sqlite3.connect(arquivo, check_same_thread=False)
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        self.conexao.execute("PRAGMA synchronous=NORMAL")
+        self.conexao.execute(
+            "CREATE TABLE IF NOT EXISTS analises ("
+            " chave INTEGER NOT NULL,"
+            " tipo TEXT NOT NULL,"
+            " parametro TEXT NOT NULL,"
+            " valor TEXT NOT NULL,"
+            " acesso INTEGER NOT NULL,"
+            " PRIMARY KEY (chave, tipo, parametro)) WITHOUT ROWID"
+        )
+        self.conexao.execute("CREATE INDEX IF NOT EXISTS analises_acesso ON analises (acesso)")
+        self.conexao.commit()
+
+        self._entradas, ultimo = self.conexao.execute("SELECT COUNT(*), MAX(acesso) FROM analises").fetchone()
+        self._relogio = ultimo or 0
+
+    #########
+    # DICAS #
+    #########
+
+    def obter_dica(self, board, origem, limite):
+        """Ranking guardado para a casa de origem, ou None"""
+        valor = self._obter("dica", board, f"{origem}:{assinatura_limite(limite)}")
+        if valor is None:
+            return None
+        ranking = []
+        for item in valor.split(","):
+            uci, _, score = item.partition(":")
+            ranking.append((chess.Move.from_uci(uci), int(score) if score else None))
+        if not all(move in board.legal_moves for move, _ in ranking):
+            return None
+        return ranking
+
+    def guardar_dica(self, board, origem, limite, ranking):
+        valor = ",".join(f"{move.uci()}:{'' if score is None else score}" for move, score in ranking)
+        self._guardar("dica", board, f"{origem}:{assinatura_limite(limite)}", valor)
+
+    ###########
+    # JOGADAS #
+    ###########
+
+    def obter_jogada(self, board, limite):
+        """Jogada do computador guardada para a posição, ou None"""
+        valor = self._obter("jogada", board, assinatura_limite(limite))
+        if valor is None:
+            return None
+        move = chess.Move.from_uci(valor)
+        return move if move in board.legal_moves else None
+
+    def guardar_jogada(self, board, limite, move):
+        self._guardar("jogada", board, assinatura_limite(limite), move.uci())
+
+    ##############
+    # MANUTENÇÃO #
+    ##############
+
+    def estatisticas(self):
+        """Acertos, falhas e tamanho atual do cache"""
+        return {
+            "acertos": dict(self.acertos),
+            "falhas": dict(self.falhas),
+            "entradas": self._entradas,
+        }
+
+    def fechar(self):
+        with self._lock:
+            self._gravar_acessos()
+            self.conexao.commit()
+            self.conexao.close()
+
+    def _chave(self, board):
+        # O SQLite só guarda inteiros com sinal de 64 bits
+        chave = chess.polyglot.zobrist_hash(board)
+        return chave - (1 << 64) if chave >= (1 << 63) else chave
+
+    def _obter(self, tipo, board, parametro):
+        chave = self._chave(board)
+        with self._lock:
+            linha = self.conexao.execute(
+                "SELECT valor FROM analises WHERE chave = ? AND tipo = ? AND parametro = ?",
+                (chave, tipo, parametro),
+            ).fetchone()
+            if linha is None:
+                self.falhas[tipo] += 1
+                return None
+            self.acertos[tipo] += 1
+            self._relogio += 1
+            # Gravado junto com a próxima inserção (ou ao fechar), fora do caminho da jogada
+            self._acessos[(chave, tipo, parametro)] = self._relogio
+            return linha[0]
+
+    def _guardar(self, tipo, board, parametro, valor):
+        chave = self._chave(board)
+        with self._lock:
+            self._relogio += 1
+            self._acessos.pop((chave, tipo, parametro), None)
+            cursor = self.conexao.execute(
+                "INSERT OR IGNORE INTO analises (chave, tipo, parametro, valor, acesso) VALUES (?, ?, ?, ?, ?)",
+                (chave, tipo, parametro, valor, self._relogio),
+            )
+            if cursor.rowcount == 0:
+                self.conexao.execute(
+                    "UPDATE analises SET valor = ?, acesso = ? WHERE chave = ? AND tipo = ? AND parametro = ?",
+                    (valor, self._relogio, chave, tipo, parametro),
+                )
+            else:
+                self._entradas += 1
+            self._gravar_acessos()
+            if self._entradas > self.max_entradas:
+                self._despejar()
+            self.conexao.commit()
+
+    def _gravar_acessos(self):
+        if self._acessos:
+            self.conexao.executemany(
+                "UPDATE analises SET acesso = ? WHERE chave = ? AND tipo = ? AND parametro = ?",
+                [(acesso, *entrada) for entrada, acesso in self._acessos.items()],
+            )
+            self._acessos.clear()
+
+    def _despejar(self):
+        """Remove as entradas menos usadas recentemente"""
+        excesso = self._entradas - self.max_entradas + int(self.max_entradas * CACHE_FOLGA)
+        self.conexao.execute(
+            "DELETE FROM analises WHERE acesso IN (SELECT acesso FROM analises ORDER BY acesso LIMIT ?)",
+            (excesso,),
+        )
+        self._entradas = self.conexao.execute("SELECT COUNT(*) FROM analises").fetchone()[0]
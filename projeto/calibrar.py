@@ -0,0 +1,234 @@
+import argparse
+import math
+import os
+import statistics
+import time
+import chess
+import chess.engine
+from benchmark import POSICOES, percentil
+from motor import MOTOR_OPCOES, MotorXadrez
+from orcamento import NPS_INICIAL
+from perfil import gravar_perfil
+from transporte import CicloEventos
+import xadrez
+
+# Opções testadas: threads até a do MOTOR_OPCOES (um núcleo fica livre para a serial) e hash em MB
+CALIBRAR_THREADS = list(range(1, MOTOR_OPCOES["Threads"] + 1))
+CALIBRAR_HASH = [16, 32, 64, 128, 256]
+
+# Fração da memória total que o processo do motor pode ocupar: o resto fica para o sistema e o jogo
+MEMORIA_FRACAO = 0.25
+
+# Configurações até 5% mais lentas que a melhor empatam com ela: fica a que usa menos threads e hash
+TOLERANCIA = 0.05
+
+# Percentil do tempo até cada profundidade que precisa caber no tempo alvo
+PERCENTIL_ALVO = 95
+
+
+def memoria_total():
+    """Memória total do sistema em MB (None fora do Linux)"""
+    try:
+        with open("/proc/meminfo") as entrada:
+            for linha in entrada:
+                if linha.startswith("MemTotal:"):
+                    return int(linha.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def memoria_processo(pid):
+    """Memória residente do processo em MB (None fora do Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as entrada:
+            for linha in entrada:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) // 1024
+    except (OSError, TypeError):
+        pass
+    return None
+
+
+def medir_busca(motor, board, limite, **opcoes):
+    """Segundos de parede até completar cada profundidade de uma busca, e os nós/s do motor ao final"""
+    tempos = {}
+    nps = None
+    # Um objeto novo por busca envia ucinewgame: nenhuma posição aproveita a hash da anterior
+    inicio = time.perf_counter()
+    with motor.analysis(board, limite, game=object(), **opcoes) as analise:
+        for info in analise:
+            if "pv" in info and "depth" in info:
+                # Com MultiPV a profundidade só está completa na última linha dela
+                tempos[info["depth"]] = time.perf_counter() - inicio
+            if info.get("nps"):
+                nps = info["nps"]
+    return tempos, nps
+
+
+def tempos_ate(medicoes, profundidade):
+    """Tempo até a profundidade em cada posição (infinito onde ela não foi atingida no tempo máximo)"""
+    return [tempos.get(profundidade, math.inf) for tempos, _ in medicoes]
+
+
+def calibrar_opcoes(ciclo, stockfish, threads, hash_mb, profundidade, tempo_maximo, cpu):
+    """Busca a suíte de posições com uma configuração e resume tempo até a profundidade, nós/s e memória"""
+    motor = MotorXadrez(ciclo, stockfish, {"Threads": threads, "Hash": hash_mb}, cpu)
+    try:
+        limite = chess.engine.Limit(depth=profundidade, time=tempo_maximo)
+        medicoes = [medir_busca(motor, chess.Board(fen), limite) for _, fen in POSICOES]
+        memoria = memoria_processo(motor.pid())
+    finally:
+        motor.fechar()
+    nps = [n for _, n in medicoes if n]
+    return {
+        "threads": threads,
+        "hash": hash_mb,
+        "tempo_s": statistics.median(tempos_ate(medicoes, profundidade)),
+        "nps": int(statistics.median(nps)) if nps else None,
+        "memoria_mb": memoria,
+        "medicoes": medicoes,
+    }
+
+
+def escolher(resultados, orcamento_memoria):
+    """A configuração que atinge a profundidade mais rápido dentro da memória, desempatando por menos recursos"""
+    cabem = [r for r in resultados if orcamento_memoria is None or r["memoria_mb"] is None
+             or r["memoria_mb"] <= orcamento_memoria]
+    if not cabem:
+        raise SystemExit("Nenhuma configuração cabe na memória disponível para o motor")
+    melhor = min(r["tempo_s"] for r in cabem)
+    empatadas = [r for r in cabem if r["tempo_s"] <= melhor * (1 + TOLERANCIA)]
+    return min(empatadas, key=lambda r: (r["threads"], r["hash"]))
+
+
+def profundidade_no_tempo(medicoes, maxima, alvo):
+    """Maior profundidade (até a máxima) atingida no tempo alvo no percentil PERCENTIL_ALVO das posições"""
+    atingivel = 1
+    for profundidade in range(1, maxima + 1):
+        if percentil(tempos_ate(medicoes, profundidade), PERCENTIL_ALVO) <= alvo:
+            atingivel = profundidade
+    return atingivel
+
+
+def calibrar_dica(ciclo, stockfish, opcoes, profundidade, tempo_maximo, cpu):
+    """Buscas como as da dica: MultiPV restrito aos movimentos da peça com mais lances de cada posição"""
+    motor = MotorXadrez(ciclo, stockfish, opcoes, cpu)
+    try:
+        limite = chess.engine.Limit(depth=profundidade, time=tempo_maximo)
+        medicoes = []
+        for _, fen in POSICOES:
+            board = chess.Board(fen)
+            origens = {}
+            for movimento in board.legal_moves:
+                origens.setdefault(movimento.from_square, []).append(movimento)
+            movimentos = max(origens.values(), key=len)
+            medicoes.append(medir_busca(motor, board, limite, busca="dica", multipv=len(movimentos),
+                                        root_moves=movimentos))
+    finally:
+        motor.fechar()
+    return medicoes
+
+
+def limites_jogada(medicoes, profundidade_maxima, jogada_tempo):
+    """Profundidade atingível no tempo de cada faixa de dificuldade (cada faixa vai até a seguinte)"""
+    faixas = sorted(jogada_tempo)
+    limites = {}
+    for i, faixa in enumerate(faixas):
+        maxima = faixas[i + 1] - 1 if i + 1 < len(faixas) else profundidade_maxima
+        limites[faixa] = {
+            "profundidade": profundidade_no_tempo(medicoes, maxima, jogada_tempo[faixa]),
+            "tempo": jogada_tempo[faixa],
+        }
+    return limites
+
+
+def resumo(resultado):
+    """Medições de uma configuração como guardadas no perfil (o tempo é None se a profundidade não foi atingida)"""
+    tempo = resultado["tempo_s"]
+    return {
+        "threads": resultado["threads"],
+        "hash": resultado["hash"],
+        "tempo_s": round(tempo, 3) if math.isfinite(tempo) else None,
+        "nps": resultado["nps"],
+        "memoria_mb": resultado["memoria_mb"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Calibra Threads/Hash do motor e os limites de cada dificuldade para este hardware")
+    parser.add_argument("--stockfish", nargs="+", default=[xadrez.STOCKFISH_PATH],
+                        help="comando do motor UCI (padrão: %(default)s)")
+    parser.add_argument("--threads", type=int, nargs="+", default=CALIBRAR_THREADS,
+                        help="threads testadas (padrão: %(default)s)")
+    parser.add_argument("--hash", type=int, nargs="+", default=CALIBRAR_HASH, help="hash testadas em MB (padrão: %(default)s)")
+    parser.add_argument("--profundidade", type=int, default=max(xadrez.JOGADA_TEMPO) + 2,
+                        help="profundidade medida em cada posição (padrão: %(default)s)")
+    parser.add_argument("--tempo-maximo", type=float, default=2 * max(xadrez.JOGADA_TEMPO.values()),
+                        help="segundos por posição antes de desistir da profundidade (padrão: %(default)s)")
+    parser.add_argument("--dica-tempo", type=float, default=xadrez.DICA_TEMPO,
+                        help="latência alvo da dica em segundos (padrão: %(default)s)")
+    parser.add_argument("--jogada-tempo", type=float, nargs=len(xadrez.JOGADA_TEMPO),
+                        default=[xadrez.JOGADA_TEMPO[faixa] for faixa in sorted(xadrez.JOGADA_TEMPO)],
+                        help=f"latência alvo da jogada por faixa de dificuldade {sorted(xadrez.JOGADA_TEMPO)} "
+                             "(padrão: %(default)s)")
+    parser.add_argument("--saida", default=xadrez.PERFIL_ARQUIVO, help="perfil gravado (padrão: %(default)s)")
+    args = parser.parse_args()
+
+    stockfish = args.stockfish[0] if len(args.stockfish) == 1 else args.stockfish
+    jogada_tempo = dict(zip(sorted(xadrez.JOGADA_TEMPO), args.jogada_tempo))
+    total = memoria_total()
+    orcamento_memoria = int(total * MEMORIA_FRACAO) if total else None
+    # A hash é alocada inteira ao configurar o motor: as que não cabem nem são testadas
+    hashes = [h for h in args.hash if orcamento_memoria is None or h < orcamento_memoria]
+    print(f"{os.cpu_count()} núcleos, {total} MB de memória ({orcamento_memoria} MB para o motor)")
+    # O motor é medido nos núcleos e com a prioridade que terá no jogo: threads além dos núcleos dele não são testadas
+    cpu = xadrez.escalonamento_cpu()
+    threads_testadas = ([t for t in args.threads if cpu.limitar({"Threads": t})["Threads"] == t]
+                        or [cpu.limitar({"Threads": max(args.threads)})["Threads"]])
+    if cpu.motor:
+        print(f"Motor nos núcleos {sorted(cpu.motor)} (nice {cpu.motor_nice})")
+
+    ciclo = CicloEventos()
+    resultados = []
+    try:
+        print(f"\n{'threads':>8}{'hash MB':>9}{'tempo s':>10}{'nós/s':>12}{'memória MB':>12}")
+        for threads in threads_testadas:
+            for hash_mb in hashes:
+                resultado = calibrar_opcoes(ciclo, stockfish, threads, hash_mb, args.profundidade, args.tempo_maximo,
+                                            cpu)
+                resultados.append(resultado)
+                print(f"{threads:>8}{hash_mb:>9}{resultado['tempo_s']:>10.2f}{resultado['nps'] or '-':>12}"
+                      f"{resultado['memoria_mb'] or '-':>12}", flush=True)
+
+        escolhido = escolher(resultados, orcamento_memoria)
+        opcoes = {"Threads": escolhido["threads"], "Hash": escolhido["hash"]}
+        print(f"\nEscolhido: {opcoes}")
+        dica = calibrar_dica(ciclo, stockfish, opcoes, xadrez.DICA_PROFUNDIDADE, args.tempo_maximo, cpu)
+    finally:
+        ciclo.fechar()
+
+    jogada = limites_jogada(escolhido["medicoes"], args.profundidade, jogada_tempo)
+    dica_profundidade = profundidade_no_tempo(dica, xadrez.DICA_PROFUNDIDADE, args.dica_tempo)
+    print(f"Dica: profundidade {dica_profundidade} em {args.dica_tempo} s")
+    for faixa, limites in jogada.items():
+        aviso = " (abaixo da própria faixa)" if limites["profundidade"] < faixa else ""
+        print(f"{xadrez.DIFICULDADES.get(faixa, f'Faixa {faixa}')}: profundidade até {limites['profundidade']}"
+              f" em {limites['tempo']} s{aviso}")
+
+    gravar_perfil(args.saida, {
+        "stockfish": stockfish,
+        "motor": opcoes,
+        "nps": escolhido["nps"] or NPS_INICIAL,
+        "dica": {"profundidade": dica_profundidade, "tempo": args.dica_tempo},
+        "jogada": jogada,
+        "hardware": {"nucleos": os.cpu_count(), "memoria_mb": total},
+        "calibrado_em": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "configuracoes": [resumo(r) for r in resultados],
+    })
+    print(f"\nPerfil gravado em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+import serial.tools.list_ports
+from log import obter_log
+
+# Intervalo entre varreduras das portas: começa curto e dobra até o máximo enquanto nada muda
+ESPERA_MINIMA = 0.1
+ESPERA_MAXIMA = 2.0
+
+LOG = obter_log("descoberta")
+
+
+class DescobertaESP32:
+    """Encontra as portas dos ESP32, lembrando a última que funcionou, sem ocupar a CPU enquanto espera"""
+
+    def __init__(self, padroes, arquivo=None):
+        self.padroes = [padrao.upper() for padrao in padroes]
+        self.arquivo = arquivo  # guarda a última porta que respondeu ao handshake
+        self._vistas = None
+
+    def portas(self):
+        """Portas seriais atuais cuja descrição indica um ESP32 (mostra só as mudanças)"""
+        portas = [porta for porta in serial.tools.list_ports.comports()
+                  if any(padrao in porta.description.upper() for padrao in self.padroes)]
+        vistas = {porta.device for porta in portas}
+        if vistas != self._vistas:
+            for porta in portas:
+                if self._vistas is None or porta.device not in self._vistas:
+                    LOG.info("ESP32 detectado: %s - %s", porta.device, porta.description)
+            for device in (self._vistas or set()) - vistas:
+                LOG.info("ESP32 desconectado: %s", device)
+            self._vistas = vistas
+        return [porta.device for porta in portas]
+
+    ###########
+    # MEMÓRIA #
+    ###########
+
+    def ultima(self):
+        if not self.arquivo:
+            return None
+        try:
+            with open(self.arquivo) as entrada:
+                return entrada.read().strip() or None
+        except OSError:
+            return None
+
+    def lembrar(self, porta):
+        if not self.arquivo or porta == self.ultima():
+            return
+        try:
+            with open(self.arquivo, "w") as saida:
+                saida.write(porta)
+        except OSError as e:
+            LOG.aviso("Erro ao guardar a última porta: %s", e)
+
+    ##########
+    # ESPERA #
+    ##########
+
+    def aguardar(self, preferida=None, recusadas=(), exclusiva=False, timeout=None):
+        """Próxima porta a tentar: a preferida ou a última conhecida, se existirem; senão a primeira outra (None no timeout)"""
+        limite = None if timeout is None else time.monotonic() + timeout
+        espera = ESPERA_MINIMA
+        while True:
+            # Caminhos conhecidos são testados direto, sem enumerar as portas USB
+            for porta in ([preferida] if exclusiva else [preferida, self.ultima()]):
+                if porta and porta not in recusadas and os.path.exists(porta):
+                    return porta
+            if not exclusiva:
+                livres = [porta for porta in self.portas() if porta not in recusadas]
+                if livres:
+                    return livres[0]
+            if limite is not None and time.monotonic() >= limite:
+                return None
+            time.sleep(espera)
+            espera = min(espera * 2, ESPERA_MAXIMA)
+
+    def observar(self, ao_conectar):
+        """Chama ao_conectar(porta) em uma thread para cada ESP32 que aparecer, inclusive os já conectados"""
+        def observar():
+            conhecidas = set()
+            espera = ESPERA_MINIMA
+            while True:
+                atuais = set(self.portas())
+                novas = atuais - conhecidas
+                for porta in sorted(novas):
+                    ao_conectar(porta)
+                # Uma porta que sumiu volta a ser nova quando reaparecer
+                conhecidas = atuais
+                espera = ESPERA_MINIMA if novas else min(espera * 2, ESPERA_MAXIMA)
+                time.sleep(espera)
+
+        threading.Thread(target=observar, name="DescobertaESP32", daemon=True).start()
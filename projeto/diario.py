@@ -0,0 +1,177 @@
+import datetime
+import json
+import os
+import threading
+import time
+import chess
+import chess.pgn
+from log import obter_log
+
+# fsync em lote: no máximo estes registros (ou segundos) ficam só no cache do sistema operacional.
+# Cada registro é escrito na hora, então uma queda do processo não perde nada; só uma queda de energia.
+DIARIO_LOTE = 8
+DIARIO_INTERVALO = 5.0
+
+# A cada quantos lances um FEN de controle é gravado (permite retomar mesmo com um lance corrompido)
+DIARIO_CHECKPOINT = 10
+
+# Várias partidas (modo com vários tabuleiros) podem exportar para o mesmo PGN
+_lock_pgn = threading.Lock()
+
+LOG = obter_log("diario")
+
+
+def vez_do_jogador(board):
+    """Desfaz o lance do jogador que ainda aguardava a resposta do computador (o ESP32 só começa na vez dele)"""
+    if board.turn != board.root().turn and board.move_stack:
+        board.pop()
+    return board
+
+
+class DiarioPartida:
+    """Diário só de acréscimos da partida em andamento (JSON por linha), para retomar após uma queda"""
+
+    def __init__(self, arquivo, pgn=None, tabuleiro=None):
+        self.arquivo = arquivo
+        self.pgn = pgn  # partidas terminadas são acrescentadas a este arquivo
+        self.tabuleiro = tabuleiro  # porta do ESP32, usada como "Site" no PGN
+        self._fd = None
+        self._pendentes = 0
+        self._ultimo_fsync = time.monotonic()
+
+    ###########
+    # ESCRITA #
+    ###########
+
+    def iniciar(self, board, dificuldade):
+        """Começa o diário de uma nova partida, descartando o anterior"""
+        self._reescrever([{"tipo": "inicio", "fen": board.fen(), "dificuldade": dificuldade,
+                           "data": datetime.date.today().isoformat()}])
+
+    def registrar(self, board):
+        """Grava o último lance de board (chamar logo após o push)"""
+        registros = [{"tipo": "lance", "uci": board.peek().uci()}]
+        if len(board.move_stack) % DIARIO_CHECKPOINT == 0:
+            registros.append({"tipo": "checkpoint", "lances": len(board.move_stack), "fen": board.fen()})
+        self._gravar(registros)
+
+    def finalizar(self, board):
+        """Marca a partida como terminada, exporta o PGN e apaga o diário"""
+        self._gravar([{"tipo": "fim", "resultado": board.result()}], sincronizar=True)
+        if self.pgn:
+            self.exportar_pgn(board)
+        self.fechar()
+        os.remove(self.arquivo)
+
+    def _gravar(self, registros, sincronizar=False):
+        if self._fd is None:
+            self._fd = os.open(self.arquivo, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        os.write(self._fd, "".join(json.dumps(registro) + "\n" for registro in registros).encode("utf-8"))
+        self._pendentes += len(registros)
+        if (sincronizar or self._pendentes >= DIARIO_LOTE
+                or time.monotonic() - self._ultimo_fsync >= DIARIO_INTERVALO):
+            self._sincronizar()
+
+    def _sincronizar(self):
+        if self._fd is not None and self._pendentes:
+            os.fsync(self._fd)
+        self._pendentes = 0
+        self._ultimo_fsync = time.monotonic()
+
+    def _reescrever(self, registros):
+        # Troca atômica: uma queda no meio deixa o diário antigo ou o novo, nunca um pedaço
+        self.fechar()
+        temporario = f"{self.arquivo}.tmp"
+        with open(temporario, "w") as saida:
+            saida.write("".join(json.dumps(registro) + "\n" for registro in registros))
+            saida.flush()
+            os.fsync(saida.fileno())
+        os.replace(temporario, self.arquivo)
+
+    def fechar(self):
+        if self._fd is not None:
+            self._sincronizar()
+            os.close(self._fd)
+            self._fd = None
+
+    ###############
+    # RECUPERAÇÃO #
+    ###############
+
+    def retomar(self):
+        """Partida interrompida como (board, dificuldade), reconstruída só com os lances; ou None"""
+        registros = self._ler()
+        if not registros or registros[0].get("tipo") != "inicio" or registros[-1].get("tipo") == "fim":
+            return None
+        inicio = registros[0]
+
+        board = chess.Board(inicio["fen"])
+        controle = None  # último checkpoint válido e os lances gravados depois dele
+        for registro in registros[1:]:
+            tipo = registro.get("tipo")
+            if tipo == "checkpoint":
+                controle = (registro["fen"], [])
+                if board is not None and board.fen() != registro["fen"]:
+                    board = None
+            elif tipo == "lance":
+                if controle is not None:
+                    controle[1].append(registro["uci"])
+                if board is not None:
+                    movimento = chess.Move.from_uci(registro["uci"])
+                    if movimento in board.legal_moves:
+                        board.push(movimento)
+                    else:
+                        board = None
+
+        if board is None:
+            # Lances inconsistentes: parte do último FEN de controle (sem o histórico anterior a ele)
+            if controle is None:
+                return None
+            LOG.aviso("Diário inconsistente, retomando do último checkpoint")
+            board = chess.Board(controle[0])
+            for uci in controle[1]:
+                movimento = chess.Move.from_uci(uci)
+                if movimento not in board.legal_moves:
+                    break
+                board.push(movimento)
+
+        vez_do_jogador(board)
+        self._reescrever([{"tipo": "inicio", "fen": board.root().fen(), "dificuldade": inicio["dificuldade"],
+                           "data": inicio.get("data")}]
+                         + [{"tipo": "lance", "uci": movimento.uci()} for movimento in board.move_stack])
+        return board, inicio["dificuldade"]
+
+    def _ler(self):
+        try:
+            with open(self.arquivo, "rb") as entrada:
+                linhas = entrada.read().split(b"\n")
+        except FileNotFoundError:
+            return []
+        registros = []
+        for linha in linhas:
+            try:
+                registros.append(json.loads(linha))
+            except ValueError:
+                # Última linha cortada pela queda (ou lixo): o que veio antes continua valendo
+                break
+        return registros
+
+    #######
+    # PGN #
+    #######
+
+    def exportar_pgn(self, board):
+        """Acrescenta a partida ao arquivo PGN"""
+        registros = self._ler()
+        inicio = registros[0] if registros and registros[0].get("tipo") == "inicio" else {}
+        jogo = chess.pgn.Game.from_board(board)
+        jogo.headers["Event"] = "Xadrez ESP32"
+        jogo.headers["Site"] = self.tabuleiro or "?"
+        jogo.headers["Date"] = (inicio.get("data") or datetime.date.today().isoformat()).replace("-", ".")
+        computador = f"Stockfish (profundidade {inicio.get('dificuldade', '?')})"
+        if board.root().turn == chess.WHITE:
+            jogo.headers["White"], jogo.headers["Black"] = "Jogador", computador
+        else:
+            jogo.headers["White"], jogo.headers["Black"] = computador, "Jogador"
+        with _lock_pgn, open(self.pgn, "a") as saida:
+            print(jogo, file=saida, end="\n\n")
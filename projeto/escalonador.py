@@ -0,0 +1,204 @@
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+from motor import MOTOR_OPCOES, MotorXadrez
+
+# Prioridade dos pedidos de motor (menor = mais urgente)
+PRIORIDADE_DICA = 0    # o jogador aguarda os destinos com a peça na mão
+PRIORIDADE_JOGADA = 1  # jogada do computador
+PRIORIDADE_FUNDO = 2   # análise especulativa: cede o motor a qualquer pedido mais urgente
+
+
+class EscalonadorMotor:
+    """Divide os processos do Stockfish entre vários tabuleiros, por prioridade e em rodízio"""
+
+    def __init__(self, ciclo, caminho, tabuleiros, opcoes=None, cpu=None):
+        # Um processo por tabuleiro, até um por thread disponível; as threads e a hash são repartidas
+        total = dict(MOTOR_OPCOES if opcoes is None else opcoes)
+        if cpu:
+            total = cpu.limitar(total)
+        self.vagas = max(1, min(tabuleiros, total["Threads"]))
+        opcoes = dict(total)
+        opcoes["Threads"] = max(1, total["Threads"] // self.vagas)
+        opcoes["Hash"] = max(16, total["Hash"] // self.vagas)
+        self.motores = [MotorXadrez(ciclo, caminho, opcoes, cpu) for _ in range(self.vagas)]
+        self._livres = list(self.motores)
+        self._ocupados = {}  # motor -> [prioridade, interromper]
+        self._fila = []
+        self._ordem = itertools.count()
+        self._condicao = threading.Condition()
+        self._atendido = {}  # tabuleiro -> instante do último atendimento
+        self._metricas = {}
+
+    ###########
+    # PEDIDOS #
+    ###########
+
+    @contextlib.contextmanager
+    def usar(self, tabuleiro, prioridade, interromper=None):
+        """Reserva um motor para o tabuleiro durante o bloco with"""
+        motor = self.adquirir(tabuleiro, prioridade, interromper)
+        inicio = time.monotonic()
+        try:
+            yield motor
+        finally:
+            self.liberar(tabuleiro, motor, time.monotonic() - inicio)
+
+    def adquirir(self, tabuleiro, prioridade, interromper=None):
+        """Aguarda um motor livre; pedidos urgentes e tabuleiros atendidos há mais tempo vão primeiro"""
+        inicio = time.monotonic()
+        with self._condicao:
+            if prioridade >= PRIORIDADE_FUNDO and (not self._livres or self._fila):
+                # Análise de fundo só usa motor ocioso: não espera na fila (devolve None)
+                return None
+            pedido = (prioridade, self._atendido.get(tabuleiro, 0.0), next(self._ordem))
+            heapq.heappush(self._fila, pedido)
+            while not (self._livres and self._fila[0] is pedido):
+                self._preemptar(prioridade)
+                self._condicao.wait()
+            heapq.heappop(self._fila)
+            motor = self._livres.pop()
+            self._ocupados[motor] = [prioridade, interromper]
+            self._atendido[tabuleiro] = time.monotonic()
+            # O próximo da fila pode ter encontrado outro motor livre
+            self._condicao.notify_all()
+
+            espera = time.monotonic() - inicio
+            metricas = self._metricas_de(tabuleiro)
+            metricas["buscas"] += 1
+            metricas["espera_total"] += espera
+            metricas["espera_max"] = max(metricas["espera_max"], espera)
+        return motor
+
+    def liberar(self, tabuleiro, motor, duracao):
+        with self._condicao:
+            del self._ocupados[motor]
+            self._livres.append(motor)
+            self._metricas_de(tabuleiro)["tempo_motor"] += duracao
+            self._condicao.notify_all()
+
+    def _preemptar(self, prioridade):
+        # Sem motor livre, um pedido urgente interrompe uma análise de fundo (uma de cada vez)
+        if self._livres or prioridade >= PRIORIDADE_FUNDO:
+            return
+        for ocupacao in self._ocupados.values():
+            if ocupacao[0] == PRIORIDADE_FUNDO and ocupacao[1] is not None:
+                interromper, ocupacao[1] = ocupacao[1], None
+                interromper()
+                return
+
+    ############
+    # MÉTRICAS #
+    ############
+
+    def _metricas_de(self, tabuleiro):
+        if tabuleiro not in self._metricas:
+            self._metricas[tabuleiro] = {
+                "inicio": time.monotonic(), "buscas": 0,
+                "espera_total": 0.0, "espera_max": 0.0, "tempo_motor": 0.0,
+            }
+        return self._metricas[tabuleiro]
+
+    def relatorio(self, tabuleiro=None):
+        """Vazão (buscas por minuto) e latência de espera por motor de cada tabuleiro"""
+        with self._condicao:
+            tabuleiros = [tabuleiro] if tabuleiro is not None else list(self._metricas)
+            relatorio = {}
+            for nome in tabuleiros:
+                metricas = self._metricas_de(nome)
+                minutos = max(time.monotonic() - metricas["inicio"], 1e-9) / 60
+                buscas = metricas["buscas"]
+                relatorio[nome] = {
+                    "buscas": buscas,
+                    "buscas_por_minuto": round(buscas / minutos, 1),
+                    "espera_media_ms": round(1000 * metricas["espera_total"] / buscas, 1) if buscas else 0.0,
+                    "espera_max_ms": round(1000 * metricas["espera_max"], 1),
+                    "tempo_motor_s": round(metricas["tempo_motor"], 1),
+                }
+        return relatorio if tabuleiro is None else relatorio[tabuleiro]
+
+    def verificar(self):
+        for motor in self.motores:
+            motor.verificar()
+
+    def fechar(self):
+        for motor in self.motores:
+            motor.fechar()
+
+
+class MotorCompartilhado:
+    """Visão de um tabuleiro sobre o escalonador, com a mesma interface do MotorXadrez"""
+
+    def __init__(self, escalonador, tabuleiro):
+        self.escalonador = escalonador
+        self.tabuleiro = tabuleiro
+
+    def nova_partida(self):
+        self.escalonador.verificar()
+
+    def verificar(self):
+        self.escalonador.verificar()
+
+    def estatisticas(self):
+        return self.escalonador.relatorio(self.tabuleiro)
+
+    def play(self, board, limite, **opcoes):
+        with self.escalonador.usar(self.tabuleiro, PRIORIDADE_JOGADA) as motor:
+            return motor.play(board, limite, **opcoes)
+
+    def analyse(self, board, limite, **opcoes):
+        with self.escalonador.usar(self.tabuleiro, PRIORIDADE_DICA) as motor:
+            return motor.analyse(board, limite, **opcoes)
+
+    def analysis(self, board, limite=None, **opcoes):
+        """Análise de fundo: só com motor ocioso, reservado até wait() e cedido a pedidos urgentes"""
+        busca = _BuscaCompartilhada()
+        motor = self.escalonador.adquirir(self.tabuleiro, PRIORIDADE_FUNDO, busca.stop)
+        if motor is None:
+            busca.interrompida = True
+            return busca
+        inicio = time.monotonic()
+        busca.liberar = lambda: self.escalonador.liberar(self.tabuleiro, motor, time.monotonic() - inicio)
+        try:
+            busca.iniciar(motor.analysis(board, limite, **opcoes))
+        except Exception:
+            busca.liberar()
+            raise
+        return busca
+
+
+class _BuscaCompartilhada:
+    """Análise em andamento que devolve o motor ao escalonador quando termina"""
+
+    def __init__(self):
+        self.busca = None
+        self.liberar = None
+        self.interrompida = False  # parada pelo escalonador: o resultado está incompleto
+
+    def iniciar(self, busca):
+        self.busca = busca
+        if self.interrompida:
+            busca.stop()
+
+    def stop(self):
+        self.interrompida = True
+        if self.busca is not None:
+            self.busca.stop()
+
+    def __iter__(self):
+        # Infos à medida que chegam; termina quando a busca acaba (ou é interrompida)
+        return iter(self.busca) if self.busca is not None else iter(())
+
+    def wait(self):
+        if self.busca is None:
+            return None
+        try:
+            return self.busca.wait()
+        finally:
+            self.liberar()
+
+    @property
+    def multipv(self):
+        return self.busca.multipv if self.busca is not None else []
@@ -0,0 +1,92 @@
+import random
+import chess
+import chess.polyglot
+
+# Política do livro por dificuldade: (profundidade até, lances da partida no livro, escolha)
+# "ponderada" sorteia entre as entradas pelo peso; "melhor" usa sempre a de maior peso
+LIVRO_POLITICAS = [
+    (3, 6, "ponderada"),     # Fácil
+    (6, 12, "ponderada"),    # Médio
+    (None, 24, "melhor"),    # Difícil e acima
+]
+
+
+class LivroAberturas:
+    """Livro de aberturas polyglot (.bin) mapeado em memória"""
+
+    def __init__(self, arquivo, politicas=LIVRO_POLITICAS):
+        self.arquivo = arquivo
+        self.politicas = politicas
+        self.leitor = chess.polyglot.open_reader(arquivo)
+        self.random = random.Random()
+        self.acertos = 0
+        self.falhas = 0
+        self.fora_do_livro = False
+
+    def nova_partida(self):
+        self.fora_do_livro = False
+
+    def politica(self, profundidade):
+        """Lances no livro e tipo de escolha para a profundidade da dificuldade"""
+        for limite, lances, escolha in self.politicas:
+            if limite is None or profundidade <= limite:
+                return lances, escolha
+        return self.politicas[-1][1:]
+
+    def em_livro(self, board, profundidade):
+        """Indica se a posição ainda deve ser respondida pelo livro"""
+        if self.fora_do_livro:
+            return False
+        lances, _ = self.politica(profundidade)
+        if board.ply() >= lances:
+            return False
+        try:
+            self.leitor.find(board)
+            return True
+        except IndexError:
+            return False
+
+    def jogada(self, board, profundidade):
+        """Jogada do livro para a posição, ou None quando a partida já saiu dele"""
+        if self.fora_do_livro:
+            return None
+        lances, escolha = self.politica(profundidade)
+        if board.ply() >= lances:
+            return None
+        try:
+            if escolha == "melhor":
+                entrada = self.leitor.find(board)
+            else:
+                entrada = self.leitor.weighted_choice(board, random=self.random)
+        except IndexError:
+            # Depois de sair do livro a partida não é mais consultada nele
+            self.falhas += 1
+            self.fora_do_livro = True
+            return None
+        self.acertos += 1
+        return entrada.move
+
+    def ranking(self, board, movimentos, profundidade):
+        """Movimentos da casa ordenados pelo peso no livro, ou None se nenhum está no livro"""
+        if self.fora_do_livro:
+            return None
+        lances, _ = self.politica(profundidade)
+        if board.ply() >= lances:
+            return None
+        pesos = {}
+        for entrada in self.leitor.find_all(board):
+            if entrada.move in movimentos:
+                pesos[entrada.move] = pesos.get(entrada.move, 0) + entrada.weight
+        if not pesos:
+            self.falhas += 1
+            return None
+        self.acertos += 1
+        # Lances fora do livro vão para o fim, sem score
+        ranking = sorted(pesos, key=pesos.get, reverse=True)
+        return [(move, None) for move in ranking] + [(move, None) for move in movimentos if move not in pesos]
+
+    def estatisticas(self):
+        return {"acertos": self.acertos, "falhas": self.falhas}
+
+    def fechar(self):
+        self.leitor.close()
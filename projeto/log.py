@@ -0,0 +1,159 @@
+import atexit
+import collections
+import sys
+import threading
+import time
+import traceback
+
+# Níveis (os mesmos números do módulo logging)
+DEPURACAO = 10
+INFO = 20
+AVISO = 30
+ERRO = 40
+NOMES = {DEPURACAO: "DEPUR", INFO: "INFO", AVISO: "AVISO", ERRO: "ERRO"}
+NIVEIS = {"depuracao": DEPURACAO, "info": INFO, "aviso": AVISO, "erro": ERRO}
+
+# Registros recentes mantidos em memória (inclusive os de nível abaixo do exibido), despejados junto com cada erro
+LOG_ANEL = 500
+
+# Registros aguardando a escrita: se o terminal travar, os mais antigos são descartados em vez de travar o jogo
+LOG_PENDENTES = 10000
+
+# Intervalo máximo entre duas escritas da thread (segundos)
+LOG_INTERVALO = 0.1
+
+
+def _nivel(nivel):
+    return NIVEIS[nivel.lower()] if isinstance(nivel, str) else nivel
+
+
+def _formatar(registro):
+    instante, nivel, nome, mensagem, args = registro
+    if args:
+        try:
+            mensagem = mensagem % args
+        except (TypeError, ValueError) as e:
+            mensagem = f"{mensagem} {args} (formatação inválida: {e})"
+    hora = time.strftime("%H:%M:%S", time.localtime(instante))
+    return f"{hora}.{int(instante * 1000) % 1000:03d} {NOMES.get(nivel, nivel):<5} [{nome}] {mensagem}\n"
+
+
+class SaidaLog:
+    """Escreve os registros em uma thread própria: quem registra só enfileira, sem formatar nem esperar o terminal"""
+
+    def __init__(self, nivel=INFO, nivel_anel=DEPURACAO, anel=LOG_ANEL, saida=None):
+        self.saida = saida  # None = sys.stdout do momento da escrita
+        self.anel = collections.deque(maxlen=anel)
+        self.descartados = 0
+        self._pendentes = collections.deque(maxlen=LOG_PENDENTES)
+        self._evento = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.configurar(nivel, nivel_anel)
+
+    def configurar(self, nivel=None, nivel_anel=None, saida=None):
+        if nivel is not None:
+            self.nivel = _nivel(nivel)  # a partir deste nível os registros são escritos
+        if nivel_anel is not None:
+            self.nivel_anel = _nivel(nivel_anel)  # a partir deste, guardados no anel
+        if saida is not None:
+            self.saida = saida
+        # Abaixo deste nível uma chamada de registro é só uma comparação
+        self.minimo = min(self.nivel, self.nivel_anel)
+
+    def registrar(self, nivel, nome, mensagem, args):
+        registro = (time.time(), nivel, nome, mensagem, args)
+        if nivel >= ERRO and self.anel:
+            # O contexto do erro, inclusive o que não foi exibido, sai antes dele
+            self._enfileirar(("despejo", list(self.anel)))
+        if nivel >= self.nivel_anel:
+            self.anel.append(registro)
+        if nivel >= self.nivel:
+            self._enfileirar(registro)
+
+    def _enfileirar(self, registro):
+        if len(self._pendentes) == self._pendentes.maxlen:
+            self.descartados += 1
+        self._pendentes.append(registro)
+        if self._thread is None:
+            self._iniciar()
+        self._evento.set()
+
+    def _iniciar(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._escrever, name="Log", daemon=True)
+                self._thread.start()
+
+    def _escrever(self):
+        while True:
+            self._evento.wait(LOG_INTERVALO)
+            self._evento.clear()
+            self.esvaziar()
+
+    def esvaziar(self):
+        """Escreve tudo o que está pendente (chamado pela thread, e na saída do programa)"""
+        with self._lock:
+            partes = []
+            while self._pendentes:
+                registro = self._pendentes.popleft()
+                if registro[0] == "despejo":
+                    partes.append(f"---- últimos {len(registro[1])} registros antes do erro ----\n")
+                    partes.extend(_formatar(anterior) for anterior in registro[1])
+                    partes.append("---- fim dos registros anteriores ----\n")
+                else:
+                    partes.append(_formatar(registro))
+            if self.descartados:
+                partes.append(f"---- {self.descartados} registros descartados (saída lenta) ----\n")
+                self.descartados = 0
+            if not partes:
+                return
+            saida = self.saida or sys.stdout
+            try:
+                saida.write("".join(partes))
+                saida.flush()
+            except (OSError, ValueError):
+                pass
+
+
+SAIDA = SaidaLog()
+atexit.register(SAIDA.esvaziar)
+
+
+class Log:
+    """Registros de um componente; a mensagem só é formatada (estilo %) na thread de escrita"""
+
+    def __init__(self, nome):
+        self.nome = nome
+
+    def ativo(self, nivel):
+        """Indica se um registro deste nível seria guardado (para evitar calcular argumentos caros)"""
+        return nivel >= SAIDA.minimo
+
+    def depurar(self, mensagem, *args):
+        if DEPURACAO >= SAIDA.minimo:
+            SAIDA.registrar(DEPURACAO, self.nome, mensagem, args)
+
+    def info(self, mensagem, *args):
+        if INFO >= SAIDA.minimo:
+            SAIDA.registrar(INFO, self.nome, mensagem, args)
+
+    def aviso(self, mensagem, *args):
+        if AVISO >= SAIDA.minimo:
+            SAIDA.registrar(AVISO, self.nome, mensagem, args)
+
+    def erro(self, mensagem, *args):
+        SAIDA.registrar(ERRO, self.nome, mensagem, args)
+
+    def excecao(self, mensagem, *args):
+        """Erro com o traceback da exceção sendo tratada (chamar dentro do except)"""
+        SAIDA.registrar(ERRO, self.nome, mensagem + "\n%s", args + (traceback.format_exc().rstrip(),))
+
+
+def obter_log(nome):
+    return Log(nome)
+
+
+def configurar(nivel=None, nivel_anel=None, saida=None):
+    """Níveis exibido e guardado no anel ("depuracao", "info", "aviso", "erro") e destino da escrita"""
+    SAIDA.configurar(nivel, nivel_anel, saida)
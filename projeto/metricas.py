@@ -0,0 +1,191 @@
+import http.server
+import math
+import os
+import threading
+import time
+from log import obter_log
+
+# Limites dos histogramas (formato Prometheus: cada balde conta as observações <= limite)
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LIMITES_NOS = (1e3, 4e3, 1.6e4, 6.4e4, 2.56e5, 1e6, 4e6, 1.6e7)
+LIMITES_NPS = (2.5e4, 5e4, 1e5, 2e5, 4e5, 8e5, 1.6e6, 3.2e6)
+LIMITES_PROFUNDIDADE = (1, 2, 4, 6, 8, 10, 12, 16, 20, 30)
+
+LOG = obter_log("metricas")
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatar(valor):
+    if valor == math.inf:
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos):
+        return tuple(str(rotulos.get(nome, "")) for nome in self.rotulos)
+
+    def _rotulos(self, chave, extra=()):
+        pares = list(zip(self.rotulos, chave)) + list(extra)
+        if not pares:
+            return ""
+        return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+    def texto(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        with self._lock:
+            for chave, valor in sorted(self._series.items()):
+                linhas.extend(self._linhas(chave, valor))
+        return linhas
+
+    def _linhas(self, chave, valor):
+        return [f"{self.nome}{self._rotulos(chave)} {_formatar(valor)}"]
+
+
+class Contador(Metrica):
+    """Valor que só cresce (tentativas, timeouts, bytes)"""
+
+    tipo = "counter"
+
+    def incrementar(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._series[chave] = self._series.get(chave, 0) + valor
+
+
+class Medidor(Metrica):
+    """Valor instantâneo, que pode subir e descer"""
+
+    tipo = "gauge"
+
+    def definir(self, valor, **rotulos):
+        with self._lock:
+            self._series[self._chave(rotulos)] = valor
+
+
+class Histograma(Metrica):
+    """Distribuição em baldes cumulativos, com soma e contagem"""
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), limites=LIMITES_SEGUNDOS):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = tuple(sorted(limites)) + (math.inf,)
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = {"baldes": [0] * len(self.limites), "soma": 0.0, "contagem": 0}
+            for indice, limite in enumerate(self.limites):
+                if valor <= limite:
+                    serie["baldes"][indice] += 1
+                    break
+            serie["soma"] += valor
+            serie["contagem"] += 1
+
+    def _linhas(self, chave, serie):
+        linhas = []
+        acumulado = 0
+        for limite, quantidade in zip(self.limites, serie["baldes"]):
+            acumulado += quantidade
+            linhas.append(f"{self.nome}_bucket{self._rotulos(chave, [('le', _formatar(limite))])} {acumulado}")
+        linhas.append(f"{self.nome}_sum{self._rotulos(chave)} {_formatar(serie['soma'])}")
+        linhas.append(f"{self.nome}_count{self._rotulos(chave)} {serie['contagem']}")
+        return linhas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas do processo, exportado em texto no formato do Prometheus"""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar(Contador, nome, ajuda, rotulos)
+
+    def medidor(self, nome, ajuda, rotulos=()):
+        return self._registrar(Medidor, nome, ajuda, rotulos)
+
+    def histograma(self, nome, ajuda, rotulos=(), limites=LIMITES_SEGUNDOS):
+        return self._registrar(Histograma, nome, ajuda, rotulos, limites=limites)
+
+    def _registrar(self, classe, nome, ajuda, rotulos, **opcoes):
+        with self._lock:
+            if nome not in self._metricas:
+                self._metricas[nome] = classe(nome, ajuda, rotulos, **opcoes)
+            return self._metricas[nome]
+
+    ##############
+    # EXPORTAÇÃO #
+    ##############
+
+    def texto(self):
+        with self._lock:
+            metricas = list(self._metricas.values())
+        linhas = []
+        for metrica in metricas:
+            linhas.extend(metrica.texto())
+        return "\n".join(linhas) + "\n"
+
+    def gravar(self, arquivo):
+        """Grava o texto de forma atômica (compatível com o textfile collector do node_exporter)"""
+        temporario = f"{arquivo}.tmp"
+        with open(temporario, "w") as saida:
+            saida.write(self.texto())
+        os.replace(temporario, arquivo)
+
+    def gravar_periodicamente(self, arquivo, intervalo):
+        def gravar():
+            while True:
+                try:
+                    self.gravar(arquivo)
+                except OSError as e:
+                    LOG.aviso("Erro ao gravar métricas em %s: %s", arquivo, e)
+                time.sleep(intervalo)
+
+        threading.Thread(target=gravar, name="GravarMetricas", daemon=True).start()
+
+    def servir_http(self, porta, endereco=""):
+        """Serve /metrics em uma thread própria; devolve o servidor (ou None se a porta estiver ocupada)"""
+        registro = self
+
+        class Tratador(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                corpo = registro.texto().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            servidor = http.server.ThreadingHTTPServer((endereco, porta), Tratador)
+        except OSError as e:
+            LOG.aviso("Não foi possível servir métricas na porta %d: %s", porta, e)
+            return None
+        servidor.daemon_threads = True
+        threading.Thread(target=servidor.serve_forever, name="ServidorMetricas", daemon=True).start()
+        LOG.info("Métricas disponíveis em http://%s:%d/metrics", endereco or "0.0.0.0", porta)
+        return servidor
+
+
+# Registro compartilhado pelos módulos do projeto
+REGISTRO = RegistroMetricas()
@@ -0,0 +1,152 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+import chess.engine
+from log import obter_log
+from metricas import REGISTRO
+
+# Opções UCI aplicadas sempre que o motor é iniciado (as que o motor não tiver são ignoradas).
+# Um núcleo fica livre para a serial e o laço principal.
+MOTOR_OPCOES = {
+    "Threads": max(1, (os.cpu_count() or 1) - 1),
+    "Hash": 128,
+}
+
+# False: o ucinewgame só é enviado quando o processo (re)inicia, mantendo a hash aquecida entre partidas
+MOTOR_LIMPAR_ENTRE_PARTIDAS = False
+
+# Quantas vezes um comando é repetido após reiniciar um motor que morreu ou travou
+MOTOR_TENTATIVAS = 1
+
+# Falhas que indicam motor morto ou travado (e não um erro do próprio comando); antes do Python 3.11 o
+# SimpleEngine e o Future.result levantam os TimeoutError do asyncio e do concurrent.futures, não o embutido
+FALHAS_MOTOR = (chess.engine.EngineTerminatedError, TimeoutError, asyncio.TimeoutError,
+                concurrent.futures.TimeoutError)
+
+MOTOR_REINICIOS = REGISTRO.contador("xadrez_motor_reinicios_total", "Reinícios do Stockfish após falha")
+
+LOG = obter_log("motor")
+
+
+class MotorXadrez:
+    """Processo do Stockfish mantido entre partidas, com verificação de saúde e reinício transparente"""
+
+    # Oferece play, analyse e analysis como o SimpleEngine: pode ser usado no lugar dele.
+
+    def __init__(self, ciclo, caminho, opcoes=None, cpu=None):
+        self.ciclo = ciclo
+        self.caminho = caminho
+        self.opcoes = dict(MOTOR_OPCOES if opcoes is None else opcoes)
+        self.cpu = cpu  # EscalonamentoCpu: núcleos, prioridade e threads por tipo de busca (None = sem ajuste)
+        if cpu:
+            self.opcoes = cpu.limitar(self.opcoes)
+        self._engine = None
+        self._lock = threading.Lock()
+        self._partida = None  # o chess.engine envia ucinewgame quando este objeto muda
+        self.reinicios = 0
+
+    ############
+    # CONTROLE #
+    ############
+
+    def nova_partida(self):
+        """Prepara o motor para uma nova partida, iniciando-o ou reiniciando-o se preciso"""
+        if MOTOR_LIMPAR_ENTRE_PARTIDAS:
+            self._partida = object()
+        engine = self._obter()
+        try:
+            engine.ping()
+        except FALHAS_MOTOR as e:
+            LOG.aviso("Motor não respondeu ao isready: %s", e)
+            self._reiniciar(engine)
+
+    def verificar(self):
+        """Reinicia o motor se o processo tiver terminado (não interrompe a busca em andamento)"""
+        engine = self._engine
+        if engine is not None and engine.protocol.returncode.done():
+            LOG.aviso("Motor terminou inesperadamente (código %s)", engine.protocol.returncode.result())
+            self._reiniciar(engine)
+
+    def pid(self):
+        """PID do processo do motor (None se ainda não foi iniciado)"""
+        engine = self._engine
+        return engine.transport.get_pid() if engine is not None else None
+
+    def estatisticas(self):
+        return {"ativo": self._engine is not None, "reinicios": self.reinicios}
+
+    def fechar(self):
+        with self._lock:
+            engine, self._engine = self._engine, None
+        if engine is not None:
+            self._encerrar(engine)
+
+    ##########
+    # BUSCAS #
+    ##########
+
+    def play(self, board, limite, **opcoes):
+        return self._executar(lambda engine: engine.play(board, limite, **opcoes), opcoes)
+
+    def analyse(self, board, limite, **opcoes):
+        return self._executar(lambda engine: engine.analyse(board, limite, **opcoes), opcoes)
+
+    def analysis(self, board, limite=None, **opcoes):
+        return self._executar(lambda engine: engine.analysis(board, limite, **opcoes), opcoes)
+
+    def _executar(self, comando, opcoes):
+        """Executa o comando; se o motor morreu ou travou, reinicia e repete a partir do mesmo tabuleiro"""
+        opcoes.setdefault("game", self._partida)
+        # Tipo da busca ("dica" ou "jogada"): pode ter um número de threads próprio
+        busca = opcoes.pop("busca", None)
+        threads = self.cpu.threads(busca, self.opcoes.get("Threads")) if self.cpu else None
+        for tentativa in range(MOTOR_TENTATIVAS + 1):
+            engine = self._obter()
+            if threads and "Threads" in engine.options:
+                # Só para esta busca: a seguinte sem threads próprias volta às do processo
+                opcoes["options"] = dict(opcoes.get("options") or {}, Threads=threads)
+            try:
+                return comando(engine)
+            except FALHAS_MOTOR as e:
+                if tentativa == MOTOR_TENTATIVAS:
+                    raise
+                LOG.aviso("Falha no motor (%s: %s), reiniciando...", type(e).__name__, e)
+                self._reiniciar(engine)
+
+    ############
+    # PROCESSO #
+    ############
+
+    def _obter(self):
+        with self._lock:
+            if self._engine is None:
+                self._engine = self._iniciar()
+            return self._engine
+
+    def _iniciar(self):
+        engine = self.ciclo.abrir_engine(self.caminho)
+        if self.cpu:
+            # Antes do configure: as threads de busca criadas por ele herdam núcleos e prioridade
+            self.cpu.ajustar_motor(engine.transport.get_pid())
+        opcoes = {nome: valor for nome, valor in self.opcoes.items() if nome in engine.options}
+        engine.configure(opcoes)
+        LOG.info("Motor %s iniciado %s", engine.id.get("name", self.caminho), opcoes)
+        return engine
+
+    def _reiniciar(self, engine):
+        with self._lock:
+            if self._engine is not engine:
+                # Outra thread já reiniciou este motor
+                return
+            self._engine = None
+            self.reinicios += 1
+        MOTOR_REINICIOS.incrementar()
+        self._encerrar(engine)
+
+    def _encerrar(self, engine):
+        try:
+            engine.quit()
+        except Exception:
+            pass
+        engine.close()
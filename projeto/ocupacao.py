@@ -0,0 +1,82 @@
+import time
+import chess
+
+# Uma leitura dos sensores só vale depois de se repetir por este tempo (peça arrastada, sensor oscilando)
+OCUPACAO_ESTAVEL = 0.3
+
+# Uma posição diferente da esperada que dura este tempo é tratada como lance executado errado
+OCUPACAO_ERRO = 2.0
+
+
+class IndiceOcupacao:
+    """Ocupação resultante de cada lance legal: a mudança vista pelos sensores identifica o lance"""
+
+    def __init__(self, board):
+        self.antes = board.occupied
+        self.lances = {}  # ocupação depois do lance -> [(lance, casas que precisam ter sido levantadas)]
+        for move in board.legal_moves:
+            # No tabuleiro físico a promoção é sempre para dama
+            if move.promotion not in (None, chess.QUEEN):
+                continue
+            depois = board.copy(stack=False)
+            depois.push(move)
+            # Casas esvaziadas (origem, torre do roque, peão capturado en passant) e a da peça capturada
+            levantadas = self.antes & ~depois.occupied
+            if board.piece_at(move.to_square) is not None:
+                levantadas |= chess.BB_SQUARES[move.to_square]
+            self.lances.setdefault(depois.occupied, []).append((move, levantadas))
+
+    def ocupacao(self, move):
+        """Ocupação esperada depois do lance"""
+        for ocupacao, lances in self.lances.items():
+            if any(lance == move for lance, _ in lances):
+                return ocupacao
+        return None
+
+    def candidatos(self, ocupacao, tocadas):
+        """Lances que levam a esta ocupação e cujas peças retiradas foram de fato vistas fora do tabuleiro"""
+        return [lance for lance, levantadas in self.lances.get(ocupacao, []) if not levantadas & ~tocadas]
+
+
+class InferenciaJogada:
+    """Acompanha as leituras de ocupação de um turno e reconhece o lance quando a leitura se estabiliza"""
+
+    def __init__(self, board, estavel=OCUPACAO_ESTAVEL):
+        self.board = board.copy(stack=False)
+        self.indice = IndiceOcupacao(board)
+        self.estavel_por = estavel
+        self.ocupacao = self.indice.antes
+        self.desde = time.monotonic()
+        self.tocadas = 0  # casas ocupadas no início do turno que já foram vistas vazias
+
+    def observar(self, ocupacao, instante=None):
+        """Registra uma leitura (bitboard, casa 0 no bit menos significativo)"""
+        instante = time.monotonic() if instante is None else instante
+        if ocupacao == self.indice.antes:
+            # Peças levantadas e devolvidas ao lugar: recomeça sem elas
+            self.tocadas = 0
+        # Até as leituras passageiras contam: a captura aparece como a vítima retirada por um instante
+        self.tocadas |= self.indice.antes & ~ocupacao
+        if ocupacao != self.ocupacao:
+            self.ocupacao = ocupacao
+            self.desde = instante
+
+    def estavel(self, instante=None, duracao=None):
+        """Indica se a leitura atual já se repete há tempo suficiente"""
+        instante = time.monotonic() if instante is None else instante
+        return instante - self.desde >= (self.estavel_por if duracao is None else duracao)
+
+    def lance(self):
+        """Lance legal que explica a leitura atual, ou None se ela não corresponde a um único lance"""
+        candidatos = self.indice.candidatos(self.ocupacao, self.tocadas)
+        return candidatos[0] if len(candidatos) == 1 else None
+
+    def levantada(self):
+        """Casa da única peça do lado que joga fora do tabuleiro (para acender a dica), ou None"""
+        retiradas = self.indice.antes & ~self.ocupacao
+        if self.ocupacao & ~self.indice.antes or chess.popcount(retiradas) != 1:
+            return None
+        casa = chess.lsb(retiradas)
+        if not self.board.occupied_co[self.board.turn] & chess.BB_SQUARES[casa]:
+            return None
+        return casa
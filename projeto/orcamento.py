@@ -0,0 +1,83 @@
+import math
+import threading
+import chess.engine
+
+# Nós por segundo assumidos até a primeira medição (Stockfish em um Raspberry Pi 3)
+NPS_INICIAL = 150000
+
+# Peso de cada nova medição nas médias móveis de nós/s e de sobrecarga
+SUAVIZACAO = 0.3
+
+# Segundos reservados, no mínimo, para a comunicação com o motor dentro do orçamento
+SOBRECARGA_MINIMA = 0.05
+
+
+def arredondar_nos(nos):
+    """Arredonda para degraus de ~19%: o limite fica estável entre turnos"""
+    return int(2 ** (round(math.log2(max(nos, 1)) * 4) / 4))
+
+
+class OrcamentoBusca:
+    """Converte o tempo de parede alvo de cada busca em limites de nós e tempo, conforme os nós/s medidos"""
+
+    def __init__(self, dica_profundidade, dica_tempo, jogada_tempo, nps=NPS_INICIAL, jogada_profundidade=None):
+        self.dica_profundidade = dica_profundidade
+        self.dica_tempo = dica_tempo
+        self.jogada_tempo = jogada_tempo  # {profundidade da dificuldade: segundos}
+        # {profundidade da dificuldade: profundidade atingível no tempo dela neste hardware} (perfil calibrado)
+        self.jogada_profundidade = jogada_profundidade or {}
+        self.nps = nps
+        self.sobrecarga = SOBRECARGA_MINIMA
+        self.medicoes = 0
+        self.estouros = 0
+        self._alvos = {}
+        self._lock = threading.Lock()
+
+    ###########
+    # LIMITES #
+    ###########
+
+    def limite_dica(self):
+        return self._limite(self.dica_profundidade, self.dica_tempo)
+
+    def limite_jogada(self, profundidade):
+        """Limite da jogada do computador; profundidades fora da tabela usam a faixa imediatamente abaixo"""
+        faixas = sorted(self.jogada_tempo)
+        faixa = max((p for p in faixas if p <= profundidade), default=faixas[0])
+        profundidade = min(profundidade, self.jogada_profundidade.get(faixa, profundidade))
+        return self._limite(profundidade, self.jogada_tempo[faixa])
+
+    def _limite(self, profundidade, alvo):
+        # O movetime é o prazo rígido: o motor para nele mesmo sem ter atingido a profundidade ou os nós
+        tempo = max(math.floor((alvo - self.sobrecarga) * 20) / 20, 0.05)
+        limite = chess.engine.Limit(depth=profundidade, nodes=arredondar_nos(self.nps * tempo), time=tempo)
+        self._alvos[(limite.depth, limite.nodes, limite.time)] = alvo
+        return limite
+
+    ###########
+    # MEDIÇÃO #
+    ###########
+
+    def registrar(self, info, duracao=None, limite=None):
+        """Atualiza nós/s (e a sobrecarga, se houver a duração de parede) com o info de uma busca"""
+        nos = info.get("nodes")
+        tempo = info.get("time")
+        with self._lock:
+            if nos and tempo and tempo >= 0.01:
+                self.nps += SUAVIZACAO * (nos / tempo - self.nps)
+                self.medicoes += 1
+            if duracao is not None and tempo is not None:
+                sobrecarga = max(duracao - tempo, SOBRECARGA_MINIMA)
+                self.sobrecarga += SUAVIZACAO * (sobrecarga - self.sobrecarga)
+            if duracao is not None and limite is not None:
+                alvo = self._alvos.get((limite.depth, limite.nodes, limite.time))
+                if alvo is not None and duracao > alvo:
+                    self.estouros += 1
+
+    def estatisticas(self):
+        return {
+            "nps": int(self.nps),
+            "sobrecarga_ms": round(1000 * self.sobrecarga, 1),
+            "medicoes": self.medicoes,
+            "estouros": self.estouros,
+        }
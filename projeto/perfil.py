@@ -0,0 +1,36 @@
+import json
+import os
+from log import obter_log
+
+# Versão do formato do perfil: um perfil de outra versão é ignorado (basta calibrar de novo)
+PERFIL_VERSAO = 1
+
+LOG = obter_log("perfil")
+
+
+def carregar_perfil(arquivo):
+    """Perfil do motor gravado pelo calibrar.py; None se não existir ou for de outra versão"""
+    if not arquivo or not os.path.exists(arquivo):
+        return None
+    try:
+        with open(arquivo) as entrada:
+            perfil = json.load(entrada)
+    except (OSError, ValueError) as e:
+        LOG.aviso("Perfil do motor %s ilegível, usando a configuração padrão: %s", arquivo, e)
+        return None
+    if perfil.get("versao") != PERFIL_VERSAO:
+        LOG.aviso("Perfil do motor %s é de outra versão, usando a configuração padrão (calibre de novo)", arquivo)
+        return None
+    # O JSON só tem chaves texto: as faixas de dificuldade voltam a ser profundidades
+    perfil["jogada"] = {int(faixa): limites for faixa, limites in perfil["jogada"].items()}
+    return perfil
+
+
+def gravar_perfil(arquivo, perfil):
+    """Grava o perfil em um arquivo temporário e o troca pelo anterior, sem deixar um perfil pela metade"""
+    perfil = dict(perfil, versao=PERFIL_VERSAO)
+    temporario = arquivo + ".tmp"
+    with open(temporario, "w") as saida:
+        json.dump(perfil, saida, indent=2, ensure_ascii=False)
+        saida.write("\n")
+    os.replace(temporario, arquivo)
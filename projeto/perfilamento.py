@@ -0,0 +1,142 @@
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from log import obter_log
+
+# Intervalo entre amostras das pilhas de todas as threads (o cProfile só vê a thread do jogo)
+PERFILAMENTO_AMOSTRAGEM = 0.005  # segundos
+
+# Fases do turno em que o jogador espera pelo sistema: a soma delas decide se o turno foi lento
+# (a confirmação fica de fora porque inclui o tempo que o jogador leva para mover a peça do computador)
+PERFILAMENTO_FASES = ("sincronia", "dica", "jogada")
+
+LOG = obter_log("perfilamento")
+
+# Um perfilador por processo: no Python 3.12+ ativar um segundo levanta ValueError, e com --multiplos os
+# tabuleiros revezam (o turno que começa com outro em andamento fica sem perfil)
+_perfilador = threading.Lock()
+
+
+def quadro_dobrado(quadro):
+    """Nome de um quadro da pilha no formato das pilhas dobradas (sem ";", que separa os quadros)"""
+    codigo = quadro.f_code
+    nome = f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+    return nome.replace(";", ":")
+
+
+class AmostradorPilhas:
+    """Thread que amostra as pilhas de todas as outras threads e as conta no formato dobrado (flamegraph)"""
+
+    def __init__(self, intervalo=PERFILAMENTO_AMOSTRAGEM):
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        self.pilhas = Counter()
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._amostrar, name="Amostrador de pilhas", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+        return self.pilhas
+
+    def _amostrar(self):
+        proprio = threading.get_ident()
+        while not self._parar.wait(self.intervalo):
+            nomes = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, quadro in sys._current_frames().items():
+                if ident == proprio:
+                    continue
+                pilha = []
+                while quadro is not None:
+                    pilha.append(quadro_dobrado(quadro))
+                    quadro = quadro.f_back
+                pilha.append(nomes.get(ident, f"thread {ident}").replace(";", ":"))
+                self.pilhas[";".join(reversed(pilha))] += 1
+
+
+class PerfilamentoTurnos:
+    """Perfil de cada turno (modo --profile): .prof do cProfile e .folded das pilhas amostradas dos turnos lentos"""
+
+    # Cada turno vai do início do laço até o início do seguinte; só é gravado se o jogador esperou
+    # pelo menos limite_ms nas fases de PERFILAMENTO_FASES.
+
+    def __init__(self, diretorio, limite_ms, prefixo="", intervalo=PERFILAMENTO_AMOSTRAGEM):
+        self.diretorio = diretorio
+        self.limite = limite_ms / 1000
+        self.prefixo = re.sub(r"[^\w.-]", "_", prefixo) + "_" if prefixo else ""
+        self.amostrador = AmostradorPilhas(intervalo)
+        self.turno = None
+        self.gravados = 0
+        self.descartados = 0
+        self.ignorados = 0  # turnos sem perfil porque outro tabuleiro estava com o perfilador
+        self._perfil = None
+        self._inicio = None
+        self._espera = 0.0
+        os.makedirs(diretorio, exist_ok=True)
+
+    def iniciar(self, turno):
+        """Começa o perfil do turno (encerrando o anterior); repetir o turno atual continua o mesmo perfil"""
+        if turno == self.turno:
+            return
+        self.encerrar()
+        self.turno = turno
+        self._espera = 0.0
+        self._inicio = time.time()
+        self._perfil = None
+        if not _perfilador.acquire(blocking=False):
+            self.ignorados += 1
+            return
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError as e:
+            # Outra ferramenta de perfil ativa no processo (Python 3.12+)
+            _perfilador.release()
+            self.ignorados += 1
+            LOG.aviso("Turno %d sem perfil: %s", turno, e)
+            return
+        self._perfil = perfil
+        self.amostrador.iniciar()
+
+    def acumular(self, fase, duracao):
+        if self.turno is not None and fase in PERFILAMENTO_FASES:
+            self._espera += duracao
+
+    def encerrar(self):
+        """Termina o perfil do turno em andamento e o grava se o turno passou do limite"""
+        if self.turno is None:
+            return
+        turno, self.turno = self.turno, None
+        if self._perfil is None:
+            return
+        self._perfil.disable()
+        _perfilador.release()
+        pilhas = self.amostrador.parar()
+        if self._espera < self.limite:
+            self.descartados += 1
+            return
+        ms = round(self._espera * 1000)
+        momento = time.strftime("%Y%m%d-%H%M%S", time.localtime(self._inicio))
+        base = os.path.join(self.diretorio, f"{self.prefixo}{momento}_turno{turno:03d}_{ms}ms")
+        try:
+            self._perfil.dump_stats(base + ".prof")
+            with open(base + ".folded", "w") as saida:
+                for pilha, amostras in pilhas.items():
+                    saida.write(f"{pilha} {amostras}\n")
+        except OSError as e:
+            LOG.aviso("Não foi possível gravar o perfil do turno %d: %s", turno, e)
+            return
+        self.gravados += 1
+        LOG.info("Turno %d lento (%d ms): perfil gravado em %s.prof/.folded", turno, ms, base)
+
+    def estatisticas(self):
+        return {"gravados": self.gravados, "descartados": self.descartados, "ignorados": self.ignorados}
@@ -0,0 +1,221 @@
+import binascii
+import struct
+import chess
+
+# Protocolo binário do enlace com o ESP32:
+# [0xA5 0x5A][tipo][tamanho][dados ...][CRC-16/CCITT alto][CRC-16/CCITT baixo]
+# O CRC cobre tipo, tamanho e dados. Bytes fora de um quadro válido são descartados.
+# Com a fila de comandos, o bit SEQUENCIA do tipo indica que o primeiro byte dos dados é o número de sequência.
+SINCRONIA = b"\xa5\x5a"
+MAX_DADOS = 64
+SEQUENCIA = 0x80
+
+TIPOS = {
+    "teste": 0x01,
+    "iniciar_partida": 0x02,
+    "tabuleiro": 0x03,
+    "melhores_movimentos": 0x04,
+    "confirmacao": 0x05,
+    "jogada": 0x06,
+    "vencedor": 0x07,
+    "ok": 0x08,
+    "protocolo": 0x09,
+    "delta": 0x0A,
+    "sincronizar": 0x0B,
+    "dica": 0x0C,  # nova ordem dos destinos enquanto o jogador decide (dica progressiva)
+    "ocupacao": 0x0D,  # leitura dos 64 sensores (modo ocupação)
+    "modo": 0x0E,  # negociação entre o lance em duas etapas e o modo ocupação
+    "ack": 0x0F,  # confirmação de um comando numerado que não tem resposta própria
+    "fila": 0x10,  # negociação da fila de comandos numerados
+}
+COMANDOS = {tipo: comando for comando, tipo in TIPOS.items()}
+
+# "interrompida": partida cortada sem resultado, que continua no próximo início
+RESULTADOS = ["1-0", "0-1", "1/2-1/2", "interrompida"]
+
+# Tamanho exato (ou mínimo, para o delta: casas + checksum) dos dados de cada tipo com formato fixo
+TAMANHOS = {"tabuleiro": 8, "ocupacao": 8}
+TAMANHOS_MINIMOS = {"delta": 2}
+
+
+def crc16(dados):
+    """CRC-16/CCITT-FALSE (polinômio 0x1021, valor inicial 0xFFFF)"""
+    return binascii.crc_hqx(dados, 0xFFFF)
+
+
+def ocupacao_para_bitboard(tabuleiro):
+    """Converte a lista de 64 casas (0/1) no inteiro de 64 bits equivalente a board.occupied"""
+    if isinstance(tabuleiro, int):
+        return tabuleiro
+    bitboard = 0
+    for casa, ocupada in enumerate(tabuleiro):
+        if ocupada:
+            bitboard |= 1 << casa
+    return bitboard
+
+
+def bitboard_para_ocupacao(bitboard):
+    return [(bitboard >> casa) & 1 for casa in range(64)]
+
+
+def checksum_ocupacao(bitboard):
+    """CRC-16 do bitboard de ocupação (8 bytes, casa 0 no bit menos significativo), igual ao do ESP32"""
+    return crc16(struct.pack("<Q", bitboard))
+
+
+def delta_ocupacao(anterior, atual):
+    """Casas que mudaram entre dois bitboards, codificadas como casa + 64 se ficou ocupada"""
+    return [casa + (64 if atual >> casa & 1 else 0) for casa in chess.SquareSet(anterior ^ atual)]
+
+
+#############
+# CODIFICAR #
+#############
+
+def codificar_quadro(tipo, dados=b""):
+    if len(dados) > MAX_DADOS:
+        raise ValueError(f"Quadro com {len(dados)} bytes excede o máximo de {MAX_DADOS}")
+    corpo = bytes([tipo, len(dados)]) + bytes(dados)
+    return SINCRONIA + corpo + struct.pack(">H", crc16(corpo))
+
+
+def codificar(mensagem):
+    """Converte uma mensagem no formato JSON (dicionário) em um quadro binário"""
+    comando = mensagem["comando"]
+    resposta = mensagem.get("resposta")
+
+    if comando in ("tabuleiro", "ocupacao"):
+        dados = struct.pack("<Q", ocupacao_para_bitboard(resposta))
+    elif comando in ("melhores_movimentos", "dica"):
+        dados = bytes(resposta)
+    elif comando == "confirmacao":
+        dados = bytes([1 if resposta == "sim" else 0])
+    elif comando == "vencedor":
+        dados = bytes([RESULTADOS.index(resposta) if resposta in RESULTADOS else 2])
+    elif comando == "iniciar_partida":
+        dados = bytes([mensagem.get("dificuldade", 0)])
+    elif comando == "jogada":
+        dados = bytes([mensagem["posicao"]])
+    elif comando == "protocolo":
+        dados = bytes([1 if resposta == "binario" else 0])
+    elif comando == "modo":
+        dados = bytes([1 if resposta == "ocupacao" else 0])
+    elif comando == "fila":
+        dados = bytes([1 if resposta == "sim" else 0])
+    elif comando == "delta":
+        dados = bytes(resposta) + struct.pack(">H", mensagem["checksum"])
+    elif comando == "ok" and "checksum" in mensagem:
+        dados = struct.pack(">H", mensagem["checksum"])
+    else:
+        dados = b""
+    if mensagem.get("seq") is not None:
+        return codificar_quadro(TIPOS[comando] | SEQUENCIA, bytes([mensagem["seq"]]) + dados)
+    return codificar_quadro(TIPOS[comando], dados)
+
+
+###############
+# DECODIFICAR #
+###############
+
+def decodificar(tipo, dados):
+    """Converte um quadro binário na mesma mensagem (dicionário) que o protocolo JSON produziria; None se inválido"""
+    seq = None
+    if tipo & SEQUENCIA:
+        if not dados:
+            return None
+        tipo, seq, dados = tipo & ~SEQUENCIA, dados[0], dados[1:]
+    comando = COMANDOS.get(tipo)
+    if comando is None:
+        return None
+    if len(dados) != TAMANHOS.get(comando, len(dados)) or len(dados) < TAMANHOS_MINIMOS.get(comando, 0):
+        return None
+    mensagem = {"comando": comando}
+    if seq is not None:
+        mensagem["seq"] = seq
+
+    if comando == "jogada":
+        mensagem["posicao"] = dados[0] if dados else -1
+    elif comando == "tabuleiro":
+        mensagem["resposta"] = bitboard_para_ocupacao(struct.unpack("<Q", dados)[0])
+    elif comando == "ocupacao":
+        # Mantida como bitboard, como no JSON: o Raspberry a compara direto com board.occupied
+        mensagem["resposta"] = struct.unpack("<Q", dados)[0]
+    elif comando in ("melhores_movimentos", "dica"):
+        mensagem["resposta"] = list(dados)
+        mensagem["qtde"] = len(dados)
+    elif comando == "confirmacao":
+        mensagem["resposta"] = "sim" if dados and dados[0] else "nao"
+    elif comando == "vencedor":
+        mensagem["resposta"] = RESULTADOS[dados[0]] if dados and dados[0] < len(RESULTADOS) else "1/2-1/2"
+    elif comando == "iniciar_partida":
+        mensagem["dificuldade"] = dados[0] if dados else 0
+    elif comando == "protocolo":
+        mensagem["resposta"] = "binario" if dados and dados[0] else "json"
+    elif comando == "modo":
+        mensagem["resposta"] = "ocupacao" if dados and dados[0] else "etapas"
+    elif comando == "fila":
+        mensagem["resposta"] = "sim" if dados and dados[0] else "nao"
+    elif comando == "delta":
+        mensagem["resposta"] = list(dados[:-2])
+        (mensagem["checksum"],) = struct.unpack(">H", dados[-2:])
+    elif comando == "ok" and len(dados) == 2:
+        # Confirmação do tabuleiro: o ESP32 devolve o checksum da ocupação que guardou
+        mensagem["resposta"] = "tabuleiro_recebido"
+        (mensagem["checksum"],) = struct.unpack(">H", dados)
+    else:
+        mensagem["resposta"] = dados.decode("utf-8", errors="ignore")
+    return mensagem
+
+
+class DecodificadorQuadros:
+    """Remonta quadros binários a partir de bytes soltos, ressincronizando após ruído"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.descartados = 0
+        self.erros_crc = 0
+
+    def alimentar(self, dados):
+        """Recebe bytes da serial e devolve as mensagens completas já decodificadas"""
+        self.buffer.extend(dados)
+        mensagens = []
+        while True:
+            inicio = self.buffer.find(SINCRONIA)
+            if inicio < 0:
+                # Mantém um possível primeiro byte de sincronia no fim do buffer
+                manter = 1 if self.buffer[-1:] == SINCRONIA[:1] else 0
+                self.descartados += len(self.buffer) - manter
+                del self.buffer[:len(self.buffer) - manter]
+                return mensagens
+            if inicio:
+                self.descartados += inicio
+                del self.buffer[:inicio]
+
+            if len(self.buffer) < 4:
+                return mensagens
+            tipo, tamanho = self.buffer[2], self.buffer[3]
+            if tamanho > MAX_DADOS:
+                self._ressincronizar()
+                continue
+            if len(self.buffer) < 6 + tamanho:
+                return mensagens
+
+            corpo = bytes(self.buffer[2:4 + tamanho])
+            (crc,) = struct.unpack(">H", self.buffer[4 + tamanho:6 + tamanho])
+            if crc != crc16(corpo):
+                self.erros_crc += 1
+                self._ressincronizar()
+                continue
+            del self.buffer[:6 + tamanho]
+
+            mensagem = decodificar(tipo, corpo[2:])
+            if mensagem is None:
+                # Quadro íntegro, mas de tipo desconhecido ou com dados no tamanho errado
+                self.descartados += 6 + tamanho
+            else:
+                mensagens.append(mensagem)
+
+    def _ressincronizar(self):
+        # Descarta só o primeiro byte: um quadro verdadeiro pode começar logo depois
+        self.descartados += 1
+        del self.buffer[:1]
@@ -0,0 +1,311 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+import chess.engine
+from log import obter_log
+from metricas import REGISTRO
+
+# Conexões mantidas com o servidor: a busca em primeiro plano e a análise de fundo usam conexões próprias
+REMOTO_CONEXOES = 2
+
+# Segundos para conectar e concluir a inicialização UCI do motor remoto
+REMOTO_CONEXAO_TIMEOUT = 2
+
+# Prazo de cada busca além do limite de tempo dela: sem resposta até lá, a busca é refeita no motor local
+REMOTO_FOLGA = 0.5
+
+# Prazo das buscas sem limite de tempo (só profundidade ou nós): um servidor travado também não segura o jogo
+REMOTO_PRAZO_MAXIMO = 30
+
+# Depois de uma falha o servidor só é tentado de novo após este intervalo (as buscas vão para o motor local)
+REMOTO_ESPERA = 30
+
+# Falhas do servidor ou da rede; antes do Python 3.11 os TimeoutError do asyncio e do concurrent.futures não são o
+# TimeoutError embutido. Uma resposta inválida do servidor chega como EngineError: se o erro for do próprio comando,
+# o motor local o repete
+FALHAS_REMOTO = (OSError, EOFError, chess.engine.EngineError, TimeoutError, asyncio.TimeoutError,
+                 concurrent.futures.TimeoutError)
+
+REMOTO_BUSCAS = REGISTRO.contador("xadrez_motor_remoto_buscas_total", "Buscas por motor (remoto, local ou reserva)",
+                                  ["motor"])
+REMOTO_FALHAS = REGISTRO.contador("xadrez_motor_remoto_falhas_total", "Falhas e prazos estourados do motor remoto")
+
+
+class EnlaceTcp(asyncio.Protocol):
+    """Liga o protocolo UCI do chess.engine a um socket TCP, como se fosse o stdin/stdout de um processo"""
+
+    # Faz o papel do SubprocessTransport que o chess.engine espera
+
+    def __init__(self, protocolo):
+        self.protocolo = protocolo
+        self.transporte = None
+        self.codigo = None  # "código de saída" do motor: 0 depois que a conexão fecha
+
+    def connection_made(self, transport):
+        self.transporte = transport
+        self.protocolo.connection_made(self)
+
+    def data_received(self, dados):
+        self.protocolo.pipe_data_received(1, dados)
+
+    def connection_lost(self, exc):
+        self.codigo = 0
+        self.protocolo.connection_lost(exc)
+
+    def get_pipe_transport(self, fd):
+        return self.transporte
+
+    def get_pid(self):
+        return None
+
+    def get_returncode(self):
+        return self.codigo
+
+    def close(self):
+        self.transporte.close()
+
+
+async def conectar_uci(host, porta, timeout):
+    """Conecta ao servidor de motor e faz a inicialização UCI"""
+    protocolo = chess.engine.UciProtocol()
+    conexao = asyncio.get_running_loop().create_connection(lambda: EnlaceTcp(protocolo), host, porta)
+    _, enlace = await asyncio.wait_for(conexao, timeout)
+    try:
+        await asyncio.wait_for(protocolo.initialize(), timeout)
+    except BaseException:
+        # Servidor que aceita a conexão mas não responde (ex.: todos os processos ocupados)
+        enlace.close()
+        raise
+    return enlace, protocolo
+
+
+def prazo_remoto(limite):
+    """Segundos que uma busca no servidor pode levar antes de ser refeita no motor local"""
+    if limite.time is not None:
+        return limite.time + REMOTO_FOLGA
+    return REMOTO_PRAZO_MAXIMO
+
+
+class MotorRemoto:
+    """Buscas em um servidor de motor na rede (servidor_engine.py), com o motor local como reserva"""
+
+    # Oferece play, analyse e analysis como o MotorXadrez: pode ser usado no lugar dele.
+
+    def __init__(self, ciclo, endereco, local, conexoes=REMOTO_CONEXOES):
+        self.ciclo = ciclo
+        self.host, self.porta = endereco
+        self.local = local  # MotorXadrez: usado enquanto o servidor estiver lento ou fora do ar
+        self.conexoes = conexoes
+        self.log = obter_log(f"remoto {self.host}:{self.porta}")
+        self._livres = []  # conexões ociosas (SimpleEngine)
+        self._abertas = 0
+        self._espera_ate = 0.0
+        self._lock = threading.Lock()
+        self.remotas = 0
+        self.reservas = 0  # buscas refeitas no motor local depois de uma falha do servidor
+        self.falhas = 0
+
+    ############
+    # CONTROLE #
+    ############
+
+    def nova_partida(self):
+        # O motor local fica pronto para assumir sem o atraso de iniciar o processo, e a conexão para a primeira busca
+        self.local.nova_partida()
+        engine = self._adquirir()
+        if engine is not None:
+            self._liberar(engine)
+
+    def verificar(self):
+        self.local.verificar()
+
+    def pid(self):
+        return self.local.pid()
+
+    def estatisticas(self):
+        return dict(self.local.estatisticas(), remotas=self.remotas, reservas=self.reservas, falhas_remotas=self.falhas)
+
+    def fechar(self):
+        with self._lock:
+            livres, self._livres = self._livres, []
+        for engine in livres:
+            engine.close()
+        self.local.fechar()
+
+    ##########
+    # BUSCAS #
+    ##########
+
+    # O tipo da busca só vale para o motor local: o servidor usa as threads dele
+
+    def play(self, board, limite, busca=None, **opcoes):
+        return self._executar(lambda protocolo: protocolo.play(board, limite, **opcoes),
+                              lambda: self.local.play(board, limite, busca=busca, **opcoes), limite)
+
+    def analyse(self, board, limite, busca=None, **opcoes):
+        return self._executar(lambda protocolo: protocolo.analyse(board, limite, **opcoes),
+                              lambda: self.local.analyse(board, limite, busca=busca, **opcoes), limite)
+
+    def analysis(self, board, limite=None, busca=None, **opcoes):
+        engine = self._adquirir()
+        if engine is None:
+            REMOTO_BUSCAS.incrementar(motor="local")
+            return self.local.analysis(board, limite, busca=busca, **opcoes)
+        try:
+            analise = engine.analysis(board, limite, **opcoes)
+        except FALHAS_REMOTO as e:
+            self._falhou(engine, e)
+            REMOTO_BUSCAS.incrementar(motor="reserva")
+            return self.local.analysis(board, limite, busca=busca, **opcoes)
+        except BaseException:
+            self._descartar(engine)
+            raise
+        REMOTO_BUSCAS.incrementar(motor="remoto")
+        return _BuscaRemota(self, engine, analise, limite)
+
+    def _executar(self, remoto, local, limite):
+        """Executa a busca no servidor; se ele falhar ou estourar o prazo, repete no motor local"""
+        engine = self._adquirir()
+        if engine is None:
+            REMOTO_BUSCAS.incrementar(motor="local")
+            return local()
+        # O prazo é esperado aqui, e não dentro do laço: um servidor travado não segura quem chamou
+        futuro = self.ciclo.agendar(remoto(engine.protocol))
+        try:
+            resultado = futuro.result(prazo_remoto(limite))
+        except FALHAS_REMOTO as e:
+            # A busca esperando o servidor travado não fica pendurada no laço compartilhado
+            futuro.cancel()
+            self._falhou(engine, e)
+            self.reservas += 1
+            REMOTO_BUSCAS.incrementar(motor="reserva")
+            return local()
+        except BaseException:
+            # Ex.: Ctrl+C durante a busca; a conexão não pode ficar fora da contagem
+            futuro.cancel()
+            self._descartar(engine)
+            raise
+        self._liberar(engine)
+        self.remotas += 1
+        REMOTO_BUSCAS.incrementar(motor="remoto")
+        return resultado
+
+    ############
+    # CONEXÕES #
+    ############
+
+    def _adquirir(self):
+        """Conexão ociosa com o servidor (abrindo uma nova se couber); None = usar o motor local"""
+        with self._lock:
+            if time.monotonic() < self._espera_ate:
+                return None
+            while self._livres:
+                engine = self._livres.pop()
+                if not engine.protocol.returncode.done():
+                    return engine
+                # O servidor fechou esta conexão enquanto ela estava ociosa
+                self._abertas -= 1
+            if self._abertas >= self.conexoes:
+                return None
+            self._abertas += 1
+        try:
+            enlace, protocolo = self.ciclo.executar(conectar_uci(self.host, self.porta, REMOTO_CONEXAO_TIMEOUT))
+        except FALHAS_REMOTO as e:
+            with self._lock:
+                self._abertas -= 1
+            self._suspender(e)
+            return None
+        self.log.info("Conectado ao motor remoto %s", protocolo.id.get("name", "?"))
+        # O SimpleEngine só é usado nas análises (o timeout é o prazo para elas começarem)
+        return chess.engine.SimpleEngine(enlace, protocolo, timeout=REMOTO_FOLGA)
+
+    def _liberar(self, engine):
+        with self._lock:
+            self._livres.append(engine)
+
+    def _falhou(self, engine, erro):
+        self._descartar(engine)
+        self._suspender(erro)
+
+    def _descartar(self, engine):
+        # A busca pode continuar no servidor: fechar a conexão faz o servidor pará-la
+        with self._lock:
+            self._abertas -= 1
+        engine.close()
+
+    def _suspender(self, erro):
+        with self._lock:
+            self._espera_ate = time.monotonic() + REMOTO_ESPERA
+        self.falhas += 1
+        REMOTO_FALHAS.incrementar()
+        self.log.aviso("Motor remoto indisponível (%s: %s): buscas no motor local pelos próximos %d s",
+                       type(erro).__name__, erro, REMOTO_ESPERA)
+
+
+class _BuscaRemota:
+    """Análise no servidor que devolve a conexão quando termina; se o prazo estourar ou a conexão cair, é interrompida"""
+
+    def __init__(self, motor, engine, busca, limite):
+        self.motor = motor
+        self.engine = engine
+        self.busca = busca
+        self.interrompida = False  # resultado incompleto: quem chamou refaz a busca (no motor local)
+        self._erro = None
+        self._encerrada = False
+        self._prazo = None
+        self._lock = threading.Lock()
+        if limite is not None:
+            self._armar(prazo_remoto(limite))
+
+    def _armar(self, segundos):
+        with self._lock:
+            if self._prazo is None and not self._encerrada:
+                self._prazo = threading.Timer(segundos, self._estourou)
+                self._prazo.daemon = True
+                self._prazo.start()
+
+    def _estourou(self):
+        # Fechar a conexão encerra na hora a espera pelo servidor lento ou travado
+        self._erro = TimeoutError("prazo da análise estourado")
+        self.interrompida = True
+        self.engine.close()
+
+    def stop(self):
+        self.busca.stop()
+        # Uma análise sem limite de tempo também tem prazo depois de parada
+        self._armar(REMOTO_FOLGA)
+
+    def __iter__(self):
+        # Infos à medida que chegam; termina quando a busca acaba (ou a conexão cai)
+        try:
+            yield from self.busca
+        except FALHAS_REMOTO as e:
+            self._erro = self._erro or e
+            self.interrompida = True
+
+    def wait(self):
+        try:
+            return self.busca.wait()
+        except FALHAS_REMOTO as e:
+            self._erro = self._erro or e
+            self.interrompida = True
+            return None
+        finally:
+            self._encerrar()
+
+    @property
+    def multipv(self):
+        return self.busca.multipv
+
+    def _encerrar(self):
+        with self._lock:
+            if self._encerrada:
+                return
+            self._encerrada = True
+            if self._prazo is not None:
+                self._prazo.cancel()
+        if self._erro is not None:
+            self.motor._falhou(self.engine, self._erro)
+        else:
+            self.motor._liberar(self.engine)
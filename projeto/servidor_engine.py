@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import os
+from log import configurar, obter_log
+
+# Porta em que o servidor aceita conexões (a mesma de MOTOR_REMOTO em xadrez.py)
+SERVIDOR_PORTA = 9110
+
+# Processos do motor: cada conexão usa um com exclusividade, e as conexões além deles aguardam na fila
+SERVIDOR_PROCESSOS = 2
+
+# Hash de cada processo em MB (as threads são os núcleos da máquina repartidos entre os processos)
+SERVIDOR_HASH = 256
+
+# Segundos para um processo devolvido parar a busca e responder ao isready antes de ser descartado
+SERVIDOR_LIMPEZA_TIMEOUT = 5
+
+# Comandos UCI que o cliente pode enviar ao motor; o resto (debug, register, setoption de arquivos como
+# Debug Log File, EvalFile ou SyzygyPath) é descartado antes de chegar ao processo
+SERVIDOR_COMANDOS = {b"uci", b"isready", b"ucinewgame", b"position", b"go", b"stop", b"ponderhit"}
+
+# Opções que o cliente pode mudar, com o valor restaurado quando o processo volta à reserva
+# (Threads e Hash voltam aos do servidor; estes são os do Stockfish, usados só se o servidor não os define)
+SERVIDOR_OPCOES_CLIENTE = {"MultiPV": 1, "Hash": 16, "Threads": 1}
+
+LOG = obter_log("servidor")
+
+
+def opcao_cliente(partes):
+    """Nome da opção de um "setoption" que o cliente pode mudar, ou None se ela não é permitida"""
+    if len(partes) < 3 or partes[1] != b"name":
+        return None
+    fim = partes.index(b"value") if b"value" in partes else len(partes)
+    nome = b" ".join(partes[2:fim]).decode("utf-8", errors="replace").lower()
+    return next((opcao for opcao in SERVIDOR_OPCOES_CLIENTE if opcao.lower() == nome), None)
+
+
+def filtrar_linha(linha):
+    """Classifica uma linha do cliente: (permitida, opção que ela muda ou None)"""
+    partes = linha.split()
+    if not partes:
+        return False, None
+    if partes[0] == b"setoption":
+        opcao = opcao_cliente(partes)
+        return opcao is not None, opcao
+    return partes[0] in SERVIDOR_COMANDOS, None
+
+
+class ProcessoMotor:
+    """Processo do motor no servidor, reaproveitado entre conexões"""
+
+    def __init__(self, processo):
+        self.processo = processo
+        self.alteradas = set()  # opções mudadas pelo cliente atual
+
+    @classmethod
+    async def iniciar(cls, comando, opcoes):
+        processo = await asyncio.create_subprocess_exec(*comando, stdin=asyncio.subprocess.PIPE,
+                                                        stdout=asyncio.subprocess.PIPE)
+        motor = cls(processo)
+        for nome, valor in opcoes.items():
+            motor.escrever(f"setoption name {nome} value {valor}")
+        await motor.sincronizar()
+        LOG.info("Motor iniciado (pid %d) %s", processo.pid, opcoes)
+        return motor
+
+    @property
+    def vivo(self):
+        return self.processo.returncode is None
+
+    def escrever(self, linha):
+        self.processo.stdin.write((linha + "\n").encode())
+
+    def restaurar(self, opcoes):
+        """Desfaz as opções mudadas pelo cliente (fora de uma busca, como pede o UCI) para o próximo não herdá-las"""
+        self.escrever("stop")
+        for nome in sorted(self.alteradas):
+            self.escrever(f"setoption name {nome} value {opcoes.get(nome, SERVIDOR_OPCOES_CLIENTE[nome])}")
+        self.alteradas.clear()
+        self.escrever("ucinewgame")
+
+    async def sincronizar(self):
+        """Para a busca em andamento e descarta a saída até o motor responder ao isready"""
+        self.escrever("stop")
+        self.escrever("isready")
+        await self.processo.stdin.drain()
+        while True:
+            linha = await asyncio.wait_for(self.processo.stdout.readline(), SERVIDOR_LIMPEZA_TIMEOUT)
+            if not linha:
+                raise EOFError("o motor terminou")
+            if linha.strip() == b"readyok":
+                return
+
+    def encerrar(self):
+        if self.vivo:
+            self.processo.kill()
+
+
+class ServidorMotor:
+    """Servidor TCP que liga cada conexão ao stdin/stdout de um processo do motor (o cliente fala UCI direto)"""
+
+    def __init__(self, comando, opcoes, processos):
+        self.comando = comando
+        self.opcoes = opcoes
+        self._vagas = asyncio.Semaphore(processos)
+        self._livres = []
+
+    async def atender(self, leitor, escritor):
+        cliente = escritor.get_extra_info("peername")
+        async with self._vagas:
+            try:
+                motor = await self._obter()
+            except (OSError, EOFError, asyncio.TimeoutError) as e:
+                LOG.erro("Não foi possível iniciar o motor para %s: %s", cliente, e)
+                escritor.close()
+                return
+            LOG.info("Cliente %s conectado", cliente)
+            try:
+                await self._encaminhar(leitor, escritor, motor)
+            finally:
+                escritor.close()
+                LOG.info("Cliente %s desconectado", cliente)
+                await self._devolver(motor)
+
+    async def _encaminhar(self, leitor, escritor, motor):
+        async def do_cliente():
+            while True:
+                linha = await leitor.readline()
+                # O quit encerra só a conexão: o processo continua para o próximo cliente
+                if not linha or linha.strip() == b"quit":
+                    return
+                permitida, opcao = filtrar_linha(linha)
+                if not permitida:
+                    # O python-chess também envia Ponder e UCI_AnalyseMode, que o servidor só ignora
+                    LOG.depurar("Linha recusada de %s: %r", escritor.get_extra_info("peername"), linha.strip())
+                    continue
+                if opcao:
+                    motor.alteradas.add(opcao)
+                motor.processo.stdin.write(linha)
+                await motor.processo.stdin.drain()
+
+        async def do_motor():
+            while True:
+                dados = await motor.processo.stdout.read(4096)
+                if not dados:
+                    return
+                escritor.write(dados)
+                await escritor.drain()
+
+        tarefas = [asyncio.ensure_future(do_cliente()), asyncio.ensure_future(do_motor())]
+        await asyncio.wait(tarefas, return_when=asyncio.FIRST_COMPLETED)
+        for tarefa in tarefas:
+            tarefa.cancel()
+        for resultado in await asyncio.gather(*tarefas, return_exceptions=True):
+            if isinstance(resultado, Exception):
+                LOG.aviso("Conexão encerrada com erro: %s", resultado)
+
+    async def _obter(self):
+        while self._livres:
+            motor = self._livres.pop()
+            if motor.vivo:
+                return motor
+        return await ProcessoMotor.iniciar(self.comando, self.opcoes)
+
+    async def _devolver(self, motor):
+        """Devolve o processo à reserva depois de parar a busca e desfazer as opções que o cliente deixou"""
+        if motor.vivo:
+            try:
+                motor.restaurar(self.opcoes)
+                await motor.sincronizar()
+                self._livres.append(motor)
+                return
+            except (OSError, EOFError, asyncio.TimeoutError) as e:
+                LOG.aviso("Motor (pid %d) não respondeu após a conexão, descartando: %s", motor.processo.pid, e)
+        motor.encerrar()
+
+    def fechar(self):
+        for motor in self._livres:
+            motor.encerrar()
+        self._livres = []
+
+
+async def servir(servidor, host, porta):
+    tcp = await asyncio.start_server(servidor.atender, host, porta)
+    LOG.info("Servidor de motor em %s:%d", host, porta)
+    try:
+        async with tcp:
+            await tcp.serve_forever()
+    finally:
+        servidor.fechar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de motor UCI na rede para o xadrez.py (MOTOR_REMOTO)")
+    parser.add_argument("--stockfish", nargs="+", default=["stockfish"], help="comando do motor UCI (padrão: %(default)s)")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="endereço de escuta; 0.0.0.0 aceita qualquer máquina da rede, sem autenticação "
+                             "(padrão: %(default)s)")
+    parser.add_argument("--porta", type=int, default=SERVIDOR_PORTA, help="porta TCP (padrão: %(default)s)")
+    parser.add_argument("--processos", type=int, default=SERVIDOR_PROCESSOS,
+                        help="processos do motor = conexões atendidas ao mesmo tempo (padrão: %(default)s)")
+    parser.add_argument("--threads", type=int, help="threads por processo (padrão: núcleos / processos)")
+    parser.add_argument("--hash", type=int, default=SERVIDOR_HASH, help="hash por processo em MB (padrão: %(default)s)")
+    parser.add_argument("--log", choices=["depuracao", "info", "aviso", "erro"], default="info",
+                        help="nível dos registros exibidos (padrão: %(default)s)")
+    args = parser.parse_args()
+    configurar(nivel=args.log)
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.processos)
+    servidor = ServidorMotor(args.stockfish, {"Threads": threads, "Hash": args.hash}, args.processos)
+    try:
+        asyncio.run(servir(servidor, args.host, args.porta))
+    except KeyboardInterrupt:
+        print("\nServidor encerrado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+import fcntl
+import json
+import os
+import random
+import select
+import socket
+import struct
+import termios
+import threading
+import time
+import chess
+from protocolo import SINCRONIA, MAX_DADOS, checksum_ocupacao, codificar, crc16, decodificar, ocupacao_para_bitboard
+
+
+# Modo ocupação: sem mudanças, a leitura dos sensores é repetida neste intervalo, como no firmware
+OCUPACAO_REPETICAO = 0.1
+
+# Fila de comandos: comandos numerados que já têm resposta própria (os demais recebem um "ack")
+COMANDOS_COM_RESPOSTA = ("teste", "protocolo", "iniciar_partida", "tabuleiro", "modo", "fila")
+
+
+class SimulacaoEncerrada(Exception):
+    pass
+
+
+class SerialSimulada:
+    """Ponta do Raspberry de um ESP32 simulado no mesmo processo, com a interface de serial.Serial usada aqui"""
+
+    def __init__(self, sock):
+        self._sock = sock
+        self.is_open = True
+        self.timeout = None
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    @property
+    def in_waiting(self):
+        return struct.unpack("i", fcntl.ioctl(self._sock.fileno(), termios.FIONREAD, b"\0\0\0\0"))[0]
+
+    def read(self, tamanho=1):
+        return self._sock.recv(tamanho)
+
+    def readline(self):
+        linha = bytearray()
+        while not linha.endswith(b"\n"):
+            byte = self._sock.recv(1)
+            if not byte:
+                break
+            linha.extend(byte)
+        return bytes(linha)
+
+    def write(self, dados):
+        self._sock.sendall(dados)
+        return len(dados)
+
+    def reset_input_buffer(self):
+        while self.in_waiting:
+            self._sock.recv(self.in_waiting)
+
+    def reset_output_buffer(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+        self._sock.close()
+
+
+class EspSimulado:
+    """ESP32 simulado: segue o laço do xadrez.ino (JSON ou binário) e joga com lances roteirizados, aleatórios ou de um motor"""
+
+    def __init__(self, jogadas=None, semente=None, atraso=0.0, perda=0.0, jogador=None):
+        self.jogadas = list(jogadas or [])  # UCI do jogador, em ordem; depois delas os lances são aleatórios
+        self.jogador = jogador  # função board -> lance que substitui os aleatórios (ex.: um motor)
+        self.atraso = atraso  # segundos de "movimento físico" antes de cada jogada enviada
+        self.perda = perda  # probabilidade de um comando numerado se perder na linha (exercita o reenvio)
+        self.posicao_inicial = None  # FEN da próxima partida, combinado fora do protocolo (o ESP32 não conhece FEN)
+        self.rng = random.Random(semente)
+        self.board = chess.Board()
+        self.ocupacao = 0
+        self.binario = False
+        self.modo_ocupacao = False
+        self.fila = False
+        self.partidas = 0
+        self.resultados = []
+        self.divergencias = 0  # tabuleiros recebidos diferentes da posição que o simulador conhece
+        self._fd = None
+        self._entrada = bytearray()
+        self._lida = None  # leitura dos sensores transmitida no modo ocupação
+        self._esperado = 0  # próximo número de sequência aceito
+        self._ultimo_seq = 255  # último comando aceito, carimbado em tudo o que é enviado
+        self._perdas = random.Random(semente)
+        self._parar = threading.Event()
+        self._thread = None
+        self._recursos = []
+
+    ###########
+    # CONEXÃO #
+    ###########
+
+    def abrir_pty(self):
+        """Cria um pseudoterminal e devolve o caminho da porta para o XadrezESP32(porta=...)"""
+        mestre, escravo = os.openpty()
+        self._recursos = [mestre, escravo]
+        self._fd = mestre
+        self._iniciar()
+        return os.ttyname(escravo)
+
+    def conectar(self):
+        """Devolve uma SerialSimulada ligada ao simulador por um socketpair, para o XadrezESP32(ser=...)"""
+        local, remoto = socket.socketpair()
+        self._recursos = [local]
+        self._fd = local.fileno()
+        self._iniciar()
+        return SerialSimulada(remoto)
+
+    def fechar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        for recurso in self._recursos:
+            if isinstance(recurso, int):
+                os.close(recurso)
+            else:
+                recurso.close()
+        self._recursos = []
+
+    def _iniciar(self):
+        self._thread = threading.Thread(target=self._executar, name="EspSimulado", daemon=True)
+        self._thread.start()
+
+    #############
+    # PROTOCOLO #
+    #############
+
+    def _ler(self):
+        while not self._parar.is_set():
+            prontos, _, _ = select.select([self._fd], [], [], OCUPACAO_REPETICAO)
+            if not prontos and self._lida is not None:
+                self._sensores(self._lida)
+            if prontos:
+                try:
+                    dados = os.read(self._fd, 4096)
+                except OSError:
+                    dados = b""
+                if not dados:
+                    break
+                self._entrada.extend(dados)
+                return
+        raise SimulacaoEncerrada()
+
+    def _receber(self):
+        """Próxima mensagem aceita, em qualquer um dos protocolos, descartando ruído como o firmware"""
+        while True:
+            mensagem = self._ler_mensagem()
+            if mensagem is not None and self._aceitar(mensagem):
+                return mensagem
+
+    def _ler_mensagem(self):
+        while True:
+            if self._entrada[:1] == SINCRONIA[:1]:
+                mensagem = self._quadro()
+                if mensagem is not None:
+                    return mensagem
+            elif self._entrada[:1] == b"{":
+                fim = self._entrada.find(b"\n")
+                if fim < 0:
+                    self._ler()
+                    continue
+                linha = bytes(self._entrada[:fim])
+                del self._entrada[:fim + 1]
+                try:
+                    mensagem = json.loads(linha)
+                except ValueError:
+                    continue
+                if mensagem.get("comando") == "teste":
+                    # Um teste em JSON indica que o Raspberry reiniciou: volta ao protocolo JSON e ao lance em duas etapas
+                    self.binario = False
+                    self.modo_ocupacao = False
+                    self.fila = False
+                return mensagem
+            elif self._entrada:
+                del self._entrada[:1]
+            else:
+                self._ler()
+
+    def _quadro(self):
+        while len(self._entrada) < 4:
+            self._ler()
+        if self._entrada[:2] != SINCRONIA or self._entrada[3] > MAX_DADOS:
+            del self._entrada[:1]
+            return None
+        tamanho = self._entrada[3]
+        while len(self._entrada) < 6 + tamanho:
+            self._ler()
+        corpo = bytes(self._entrada[2:4 + tamanho])
+        (crc,) = struct.unpack(">H", self._entrada[4 + tamanho:6 + tamanho])
+        if crc != crc16(corpo):
+            del self._entrada[:1]
+            return None
+        del self._entrada[:6 + tamanho]
+        return decodificar(corpo[0], corpo[2:])
+
+    def _aceitar(self, mensagem):
+        # Fila de comandos, como no firmware: só o próximo número é aceito; um repetido é só confirmado de novo
+        seq = mensagem.get("seq")
+        if not self.fila or seq is None:
+            return True
+        if self.perda and self._perdas.random() < self.perda:
+            return False
+        if seq != self._esperado:
+            if (seq - self._esperado) % 256 >= 128:
+                self._enviar({"comando": "ack"}, seq)
+            return False
+        self._esperado = (seq + 1) % 256
+        self._ultimo_seq = seq
+        if mensagem["comando"] not in COMANDOS_COM_RESPOSTA:
+            self._enviar({"comando": "ack"}, seq)
+        return True
+
+    def _receber_comando(self, *comandos):
+        # Como o firmware, ignora o que não é esperado no estado atual
+        while True:
+            mensagem = self._receber()
+            if mensagem and mensagem.get("comando") in comandos:
+                return mensagem
+
+    def _enviar(self, mensagem, seq=None):
+        if self.fila:
+            mensagem = dict(mensagem, seq=self._ultimo_seq if seq is None else seq)
+        if self.binario:
+            dados = codificar(mensagem)
+        else:
+            dados = (json.dumps(mensagem) + "\n").encode("utf-8")
+        os.write(self._fd, dados)
+
+    ###########
+    # PARTIDA #
+    ###########
+
+    def _executar(self):
+        try:
+            while True:
+                self._aguardar_inicializacao()
+                self._jogar()
+        except SimulacaoEncerrada:
+            pass
+
+    def _aguardar_inicializacao(self):
+        while True:
+            mensagem = self._receber_comando("iniciar_partida", "teste", "protocolo", "modo", "fila")
+            comando = mensagem["comando"]
+            if comando == "iniciar_partida":
+                self._enviar({"comando": "ok", "resposta": "pronto_para_receber_tabuleiro"})
+                return
+            if comando == "teste":
+                self._enviar({"comando": "ok", "resposta": "teste_recebido"})
+            elif comando == "modo":
+                self.modo_ocupacao = mensagem["resposta"] == "ocupacao"
+                self._enviar({"comando": "modo", "resposta": "ocupacao" if self.modo_ocupacao else "etapas"})
+            elif comando == "fila":
+                # Confirma fora da fila e só então passa a numerar
+                self.fila = False
+                self._enviar({"comando": "ok", "resposta": mensagem["resposta"]})
+                self.fila = mensagem["resposta"] == "sim"
+                self._esperado, self._ultimo_seq = 0, 255
+            else:
+                # Confirma no protocolo atual e só então troca
+                self._enviar({"comando": "ok", "resposta": mensagem["resposta"]})
+                self.binario = mensagem["resposta"] == "binario"
+
+    def _jogar(self):
+        self.board = chess.Board(self.posicao_inicial) if self.posicao_inicial else chess.Board()
+        self.partidas += 1
+        if self.modo_ocupacao:
+            try:
+                self._jogar_por_ocupacao()
+            finally:
+                self._lida = None
+            return
+        while True:
+            if not self._receber_tabuleiro():
+                return
+
+            # Jogador: levanta a peça de origem até o Raspberry confirmar
+            movimento = self._escolher_jogada()
+            while True:
+                self._mover(movimento.from_square)
+                if self._receber_comando("confirmacao")["resposta"] == "sim":
+                    break
+                movimento = self.rng.choice(list(self.board.legal_moves))
+            self.ocupacao &= ~chess.BB_SQUARES[movimento.from_square]
+
+            destinos = self._receber_comando("melhores_movimentos")["resposta"]
+            if movimento.to_square not in destinos:
+                movimento = self._movimento(movimento.from_square, destinos[0])
+            self.board.push(movimento)
+            self.ocupacao |= chess.BB_SQUARES[movimento.to_square]
+            self._mover(movimento.to_square)
+
+            # Computador: o jogador executa o lance indicado e o sensor confirma o destino
+            mensagem = self._receber_comando("melhores_movimentos", "vencedor")
+            if mensagem["comando"] == "vencedor":
+                self.resultados.append(mensagem["resposta"])
+                return
+            origem, destino = mensagem["resposta"][:2]
+            self.board.push(self._movimento(origem, destino))
+            self._mover(destino)
+
+    def _jogar_por_ocupacao(self):
+        # Os sensores são transmitidos a cada mudança e o Raspberry reconhece os lances
+        while True:
+            if not self._receber_tabuleiro():
+                return
+            if self._lida is None:
+                self._sensores(self.ocupacao)
+
+            self._fazer_lance(self._escolher_jogada())
+
+            mensagem = self._receber_comando("melhores_movimentos", "vencedor")
+            if mensagem["comando"] == "vencedor":
+                self.resultados.append(mensagem["resposta"])
+                return
+            origem, destino = mensagem["resposta"][:2]
+            self._fazer_lance(self._movimento(origem, destino))
+
+    def _fazer_lance(self, movimento):
+        """Move as peças como uma pessoa: levanta a peça, retira a capturada e a coloca no destino"""
+        depois = self.board.copy(stack=False)
+        depois.push(movimento)
+        retiradas = [movimento.from_square] + [casa for casa in chess.SquareSet(self.board.occupied & ~depois.occupied)
+                                               if casa != movimento.from_square]
+        if self.board.piece_at(movimento.to_square) is not None:
+            retiradas.append(movimento.to_square)
+        leitura = self._lida
+        for casa in retiradas:
+            leitura &= ~chess.BB_SQUARES[casa]
+            self._sensores(leitura)
+            if casa == movimento.from_square and self.atraso:
+                # Pensando com a peça na mão (o Raspberry acende a dica)
+                self._segurar(self.atraso)
+        # O rei chega antes da torre no roque
+        colocadas = sorted(chess.SquareSet(depois.occupied & ~leitura), key=lambda casa: casa != movimento.to_square)
+        for casa in colocadas:
+            leitura |= chess.BB_SQUARES[casa]
+            self._sensores(leitura)
+        self.board.push(movimento)
+
+    def _sensores(self, leitura):
+        self._lida = leitura
+        self._enviar({"comando": "ocupacao", "resposta": leitura})
+
+    def _segurar(self, segundos):
+        fim = time.monotonic() + segundos
+        while time.monotonic() < fim:
+            if self._parar.wait(min(OCUPACAO_REPETICAO, max(fim - time.monotonic(), 0))):
+                raise SimulacaoEncerrada()
+            self._sensores(self._lida)
+
+    def _receber_tabuleiro(self):
+        while True:
+            mensagem = self._receber_comando("tabuleiro", "delta", "vencedor")
+            comando = mensagem["comando"]
+            if comando == "vencedor":
+                self.resultados.append(mensagem["resposta"])
+                return False
+            if comando == "tabuleiro":
+                self.ocupacao = ocupacao_para_bitboard(mensagem["resposta"])
+                self._enviar({"comando": "ok", "resposta": "tabuleiro_recebido",
+                              "checksum": checksum_ocupacao(self.ocupacao)})
+            else:
+                for casa in mensagem["resposta"]:
+                    bit = chess.BB_SQUARES[casa % 64]
+                    self.ocupacao = self.ocupacao | bit if casa >= 64 else self.ocupacao & ~bit
+                if checksum_ocupacao(self.ocupacao) != mensagem["checksum"]:
+                    self._enviar({"comando": "sincronizar", "resposta": "checksum_invalido"})
+                    continue
+            if self.ocupacao != self.board.occupied:
+                # No tabuleiro físico o jogador teria que corrigir as peças; aqui vale o que o Raspberry mandou
+                self.divergencias += 1
+            return True
+
+    def _escolher_jogada(self):
+        while self.jogadas:
+            movimento = chess.Move.from_uci(self.jogadas.pop(0))
+            if movimento in self.board.legal_moves:
+                return movimento
+        if self.jogador:
+            return self.jogador(self.board.copy())
+        return self.rng.choice(list(self.board.legal_moves))
+
+    def _movimento(self, origem, destino):
+        # Promoções no tabuleiro físico são sempre para dama
+        movimento = chess.Move(origem, destino)
+        if movimento not in self.board.legal_moves:
+            movimento = chess.Move(origem, destino, promotion=chess.QUEEN)
+        return movimento
+
+    def _mover(self, casa):
+        if self.atraso:
+            time.sleep(self.atraso)
+        self._enviar({"comando": "jogada", "posicao": casa})
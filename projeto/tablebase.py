@@ -0,0 +1,84 @@
+import chess
+import chess.syzygy
+
+# Score (mesma escala de score(mate_score=10000)) atribuído a vitórias e derrotas da tablebase;
+# vitórias "amaldiçoadas" pela regra dos 50 lances contam como empate
+SCORE_VITORIA = 5000
+
+
+class TablebaseSyzygy:
+    """Consulta tablebases Syzygy locais (WDL/DTZ) para finais com poucas peças"""
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self.tablebase = chess.syzygy.open_tablebase(diretorio)
+        # Nomes como "KRPvKR": cada letra, exceto o "v", é uma peça
+        self.max_pecas = max((len(nome) - 1 for nome in self.tablebase.wdl), default=0)
+        self.acertos = 0
+        self.falhas = 0
+
+    def cobre(self, board):
+        """Indica se a posição tem poucas peças o bastante para ser consultada"""
+        return (
+            self.max_pecas > 0
+            and chess.popcount(board.occupied) <= self.max_pecas
+            and not board.castling_rights
+        )
+
+    def jogada(self, board):
+        """Melhor jogada segundo WDL/DTZ, ou None se a posição não está nas tabelas"""
+        ranking = self._ranking(board, list(board.legal_moves))
+        return ranking[0][0] if ranking else None
+
+    def ranking(self, board, movimentos):
+        """Movimentos ordenados com score derivado de WDL/DTZ, ou None fora das tabelas"""
+        ranking = self._ranking(board, movimentos)
+        if ranking is None:
+            return None
+        return [(move, score) for move, score, _ in ranking]
+
+    def estatisticas(self):
+        total = self.acertos + self.falhas
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa": round(self.acertos / total, 3) if total else 0.0,
+        }
+
+    def fechar(self):
+        self.tablebase.close()
+
+    def _ranking(self, board, movimentos):
+        if not movimentos or not self.cobre(board):
+            return None
+        avaliacoes = []
+        try:
+            for move in movimentos:
+                avaliacoes.append((move,) + self._avaliar(board, move))
+        except KeyError:
+            # chess.syzygy.MissingTableError: falta a tabela de algum dos finais
+            self.falhas += 1
+            return None
+        self.acertos += 1
+        avaliacoes.sort(key=lambda item: item[2], reverse=True)
+        return avaliacoes
+
+    def _avaliar(self, board, move):
+        """(score, chave de ordenação) do movimento, do ponto de vista de quem joga"""
+        zera = board.is_zeroing(move)
+        board.push(move)
+        try:
+            if board.is_checkmate():
+                return SCORE_VITORIA + 1000, (3, 0)
+            wdl = -self.tablebase.probe_wdl(board)
+            dtz = abs(self.tablebase.probe_dtz(board))
+        finally:
+            board.pop()
+
+        if wdl == 2:
+            # Vitória: o quanto antes zerar o contador de 50 lances, melhor
+            return SCORE_VITORIA - (0 if zera else dtz), (wdl, 0 if zera else -dtz)
+        if wdl == -2:
+            # Derrota: adia ao máximo
+            return -SCORE_VITORIA + dtz, (wdl, dtz)
+        return 0, (wdl, 0)
@@ -0,0 +1,55 @@
+import chess
+import chess.engine
+from cache import CacheAnalise
+
+
+def test_jogada_persiste_entre_execucoes_com_orcamento_diferente(tmp_path):
+    arquivo = str(tmp_path / "analises.db")
+    board = chess.Board()
+    cache = CacheAnalise(arquivo)
+    cache.guardar_jogada(board, chess.engine.Limit(depth=6, time=1.95, nodes=830000), chess.Move.from_uci("e2e4"))
+    cache.fechar()
+
+    # Os nós/s medidos mudaram: o mesmo nível ainda acerta, outro nível não
+    cache = CacheAnalise(arquivo)
+    assert cache.obter_jogada(board, chess.engine.Limit(depth=6, time=1.9, nodes=790000)) == chess.Move.from_uci("e2e4")
+    assert cache.obter_jogada(board, chess.engine.Limit(depth=9, time=2.9, nodes=1200000)) is None
+    assert cache.estatisticas() == {"acertos": {"dica": 0, "jogada": 1}, "falhas": {"dica": 0, "jogada": 1},
+                                    "entradas": 1}
+    cache.fechar()
+
+
+def test_dica_por_origem(tmp_path):
+    cache = CacheAnalise(str(tmp_path / "analises.db"))
+    board = chess.Board()
+    limite = chess.engine.Limit(depth=8, time=0.45)
+    ranking = [(chess.Move.from_uci("g1f3"), 30), (chess.Move.from_uci("g1h3"), None)]
+    cache.guardar_dica(board, chess.G1, limite, ranking)
+    assert cache.obter_dica(board, chess.G1, limite) == ranking
+    assert cache.obter_dica(board, chess.B1, limite) is None
+    # A mesma posição por transposição (mesmo hash Zobrist) acerta
+    for uci in ("g1f3", "g8f6", "f3g1", "f6g8"):
+        board.push_uci(uci)
+    assert cache.obter_dica(board, chess.G1, limite) == ranking
+    cache.fechar()
+
+
+def test_acertos_protegem_do_despejo(tmp_path):
+    arquivo = str(tmp_path / "analises.db")
+    cache = CacheAnalise(arquivo, max_entradas=3)
+    limite = chess.engine.Limit(depth=3)
+    posicoes = []
+    board = chess.Board()
+    for uci in ("e2e4", "e7e5", "g1f3", "b8c6"):
+        posicoes.append(board.copy())
+        cache.guardar_jogada(board, limite, chess.Move.from_uci(uci))
+        if len(posicoes) == 2:
+            # A primeira posição é lida de novo: fica mais recente que a segunda
+            assert cache.obter_jogada(posicoes[0], limite) is not None
+        board.push_uci(uci)
+    cache.fechar()
+
+    cache = CacheAnalise(arquivo, max_entradas=3)
+    assert cache.obter_jogada(posicoes[0], limite) == chess.Move.from_uci("e2e4")
+    assert cache.obter_jogada(posicoes[1], limite) is None
+    cache.fechar()
@@ -0,0 +1,69 @@
+import threading
+from types import SimpleNamespace
+import pytest
+import serial.tools.list_ports
+import descoberta
+from descoberta import DescobertaESP32
+
+
+@pytest.fixture
+def portas(monkeypatch):
+    """Portas seriais atuais (device -> descrição), trocáveis durante o teste"""
+    atuais = {}
+    monkeypatch.setattr(serial.tools.list_ports, "comports",
+                        lambda: [SimpleNamespace(device=device, description=descricao)
+                                 for device, descricao in atuais.items()])
+    return atuais
+
+
+def test_filtra_pela_descricao(portas):
+    portas.update({"/dev/ttyUSB0": "CP2102 USB to UART Bridge", "/dev/ttyACM0": "Arduino Uno",
+                   "/dev/ttyUSB1": "cp2102 usb to uart bridge"})
+    assert DescobertaESP32(["CP210"]).portas() == ["/dev/ttyUSB0", "/dev/ttyUSB1"]
+
+
+def test_lembra_a_ultima_porta(tmp_path):
+    arquivo = str(tmp_path / ".ultima_porta")
+    assert DescobertaESP32(["CP210"], arquivo).ultima() is None
+    DescobertaESP32(["CP210"], arquivo).lembrar("/dev/ttyUSB3")
+    assert DescobertaESP32(["CP210"], arquivo).ultima() == "/dev/ttyUSB3"
+    assert DescobertaESP32(["CP210"]).ultima() is None
+
+
+def test_aguardar_prefere_a_ultima_que_existe(portas, tmp_path):
+    ultima = tmp_path / "ttyUSB7"
+    ultima.touch()
+    esp32 = DescobertaESP32(["CP210"], str(tmp_path / ".ultima_porta"))
+    esp32.lembrar(str(ultima))
+    portas["/dev/ttyUSB0"] = "CP2102"
+    assert esp32.aguardar() == str(ultima)
+    # Recusada (não respondeu ao handshake): passa para a próxima enumerada
+    assert esp32.aguardar(recusadas={str(ultima)}) == "/dev/ttyUSB0"
+
+
+def test_aguardar_exclusiva_e_timeout(portas, monkeypatch):
+    monkeypatch.setattr(descoberta, "ESPERA_MINIMA", 0.01)
+    portas["/dev/ttyUSB0"] = "CP2102"
+    esp32 = DescobertaESP32(["CP210"])
+    # Exclusiva: só a preferida serve, mesmo com outra porta disponível
+    assert esp32.aguardar(preferida="/dev/naoexiste", exclusiva=True, timeout=0.05) is None
+    assert esp32.aguardar(recusadas={"/dev/ttyUSB0"}, timeout=0.05) is None
+
+
+def test_observar_avisa_cada_porta_nova(portas, monkeypatch):
+    monkeypatch.setattr(descoberta, "ESPERA_MINIMA", 0.01)
+    monkeypatch.setattr(descoberta, "ESPERA_MAXIMA", 0.02)
+    conectadas = []
+    nova = threading.Event()
+
+    def ao_conectar(porta):
+        conectadas.append(porta)
+        nova.set()
+
+    portas["/dev/ttyUSB0"] = "CP2102"
+    DescobertaESP32(["CP210"]).observar(ao_conectar)
+    assert nova.wait(1)
+    nova.clear()
+    portas["/dev/ttyUSB1"] = "CP2102"
+    assert nova.wait(1)
+    assert conectadas == ["/dev/ttyUSB0", "/dev/ttyUSB1"]
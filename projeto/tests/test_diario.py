@@ -0,0 +1,84 @@
+import json
+import os
+import chess
+import chess.pgn
+import pytest
+from diario import DIARIO_CHECKPOINT, DiarioPartida
+
+
+def jogar(diario, board, lances):
+    for uci in lances:
+        board.push_uci(uci)
+        diario.registrar(board)
+
+
+@pytest.fixture
+def arquivos(tmp_path):
+    return str(tmp_path / "partida.jsonl"), str(tmp_path / "partidas.pgn")
+
+
+def test_retoma_na_vez_do_jogador(arquivos):
+    arquivo, pgn = arquivos
+    diario = DiarioPartida(arquivo, pgn)
+    board = chess.Board()
+    diario.iniciar(board, 6)
+    # O último lance é do jogador: a resposta do computador ainda não tinha saído quando o processo caiu
+    jogar(diario, board, ["e2e4", "e7e5", "g1f3"])
+    diario.fechar()
+
+    board, dificuldade = DiarioPartida(arquivo, pgn).retomar()
+    assert dificuldade == 6
+    assert [move.uci() for move in board.move_stack] == ["e2e4", "e7e5"]
+    assert board.turn == chess.WHITE
+
+
+def test_linha_cortada_pela_queda_e_ignorada(arquivos):
+    arquivo, pgn = arquivos
+    diario = DiarioPartida(arquivo, pgn)
+    board = chess.Board()
+    diario.iniciar(board, 3)
+    jogar(diario, board, ["d2d4", "d7d5"])
+    diario.fechar()
+    with open(arquivo, "a") as saida:
+        saida.write('{"tipo": "lance", "uci": "c2')
+
+    board, _ = DiarioPartida(arquivo, pgn).retomar()
+    assert [move.uci() for move in board.move_stack] == ["d2d4", "d7d5"]
+
+
+def test_lance_corrompido_retoma_do_checkpoint(arquivos):
+    arquivo, pgn = arquivos
+    diario = DiarioPartida(arquivo, pgn)
+    board = chess.Board()
+    diario.iniciar(board, 3)
+    lances = ["g1f3", "g8f6", "f3g1", "f6g8"] * 3
+    jogar(diario, board, lances[:DIARIO_CHECKPOINT + 2])
+    diario.fechar()
+    with open(arquivo) as entrada:
+        registros = [json.loads(linha) for linha in entrada]
+    registros[1]["uci"] = "e2e5"  # lance impossível antes do checkpoint
+    with open(arquivo, "w") as saida:
+        saida.write("".join(json.dumps(registro) + "\n" for registro in registros))
+
+    board, _ = DiarioPartida(arquivo, pgn).retomar()
+    # A partir do FEN do checkpoint, com os lances gravados depois dele
+    assert board.root().fullmove_number == DIARIO_CHECKPOINT // 2 + 1
+    assert [move.uci() for move in board.move_stack] == lances[DIARIO_CHECKPOINT:DIARIO_CHECKPOINT + 2]
+
+
+def test_partida_terminada_vai_para_o_pgn_e_nao_e_retomada(arquivos):
+    arquivo, pgn = arquivos
+    diario = DiarioPartida(arquivo, pgn, tabuleiro="/dev/ttyUSB0")
+    board = chess.Board()
+    diario.iniciar(board, 9)
+    jogar(diario, board, ["f2f3", "e7e5", "g2g4", "d8h4"])
+    diario.finalizar(board)
+
+    assert not os.path.exists(arquivo)
+    assert DiarioPartida(arquivo, pgn).retomar() is None
+    with open(pgn) as entrada:
+        jogo = chess.pgn.read_game(entrada)
+    assert jogo.headers["Result"] == "0-1"
+    assert jogo.headers["Site"] == "/dev/ttyUSB0"
+    assert jogo.headers["Black"] == "Stockfish (profundidade 9)"
+    assert len(list(jogo.mainline_moves())) == 4
@@ -0,0 +1,71 @@
+import threading
+import time
+from escalonador import PRIORIDADE_DICA, PRIORIDADE_FUNDO, PRIORIDADE_JOGADA, EscalonadorMotor
+
+
+def criar(tabuleiros, threads=4):
+    # Os MotorXadrez só iniciam o processo na primeira busca: aqui nenhum chega a iniciar
+    return EscalonadorMotor(None, "stockfish", tabuleiros, {"Threads": threads, "Hash": 128})
+
+
+def aguardar_na_fila(escalonador, pedidos):
+    while True:
+        with escalonador._condicao:
+            if len(escalonador._fila) == pedidos:
+                return
+        time.sleep(0.001)
+
+
+def test_threads_e_hash_repartidas():
+    divididos = criar(3)
+    assert divididos.vagas == 3
+    assert [motor.opcoes for motor in divididos.motores] == [{"Threads": 1, "Hash": 42}] * 3
+    # Mais tabuleiros que threads: um processo por thread
+    assert criar(8).vagas == 4
+
+
+def test_fundo_so_usa_motor_ocioso():
+    unico = criar(1, threads=1)
+    motor = unico.adquirir("a", PRIORIDADE_JOGADA)
+    assert unico.adquirir("b", PRIORIDADE_FUNDO) is None
+    unico.liberar("a", motor, 0.1)
+    assert unico.adquirir("b", PRIORIDADE_FUNDO) is motor
+
+
+def test_pedido_urgente_interrompe_o_fundo():
+    unico = criar(1, threads=1)
+    interrompida = threading.Event()
+    fundo = unico.adquirir("a", PRIORIDADE_FUNDO, interrompida.set)
+    obtido = []
+    pedido = threading.Thread(target=lambda: obtido.append(unico.adquirir("b", PRIORIDADE_DICA)))
+    pedido.start()
+    assert interrompida.wait(1)
+    # A busca interrompida devolve o motor, que vai para o pedido urgente
+    unico.liberar("a", fundo, 0.1)
+    pedido.join(1)
+    assert obtido == [fundo]
+
+
+def test_dica_antes_da_jogada_e_rodizio_entre_tabuleiros():
+    unico = criar(3, threads=1)
+    motor = unico.adquirir("a", PRIORIDADE_JOGADA)
+    atendidos = []
+
+    def pedir(tabuleiro, prioridade):
+        obtido = unico.adquirir(tabuleiro, prioridade)
+        atendidos.append(tabuleiro)
+        unico.liberar(tabuleiro, obtido, 0.0)
+
+    pedidos = [threading.Thread(target=pedir, args=("a", PRIORIDADE_JOGADA)),
+               threading.Thread(target=pedir, args=("b", PRIORIDADE_JOGADA)),
+               threading.Thread(target=pedir, args=("c", PRIORIDADE_DICA))]
+    for numero, pedido in enumerate(pedidos, 1):
+        pedido.start()
+        aguardar_na_fila(unico, numero)
+    unico.liberar("a", motor, 0.1)
+    for pedido in pedidos:
+        pedido.join(1)
+    # A dica vai primeiro; entre as jogadas, o tabuleiro b nunca atendido passa à frente do a
+    assert atendidos == ["c", "b", "a"]
+    relatorio = unico.relatorio()
+    assert relatorio["a"]["buscas"] == 2 and relatorio["b"]["buscas"] == 1
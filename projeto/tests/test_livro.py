@@ -0,0 +1,80 @@
+import struct
+import chess
+import chess.polyglot
+import pytest
+from livro import LivroAberturas
+
+
+def gravar_livro(caminho, entradas):
+    """Grava um livro polyglot a partir de (board, lance uci, peso)"""
+    registros = []
+    for board, uci, peso in entradas:
+        move = chess.Move.from_uci(uci)
+        codigo = (chess.square_file(move.to_square) | chess.square_rank(move.to_square) << 3
+                  | chess.square_file(move.from_square) << 6 | chess.square_rank(move.from_square) << 9)
+        registros.append(struct.pack(">QHHI", chess.polyglot.zobrist_hash(board), codigo, peso, 0))
+    caminho.write_bytes(b"".join(sorted(registros)))
+    return str(caminho)
+
+
+@pytest.fixture
+def livro(tmp_path):
+    inicio = chess.Board()
+    depois = chess.Board()
+    depois.push_uci("e2e4")
+    arquivo = gravar_livro(tmp_path / "livro.bin", [
+        (inicio, "e2e4", 10), (inicio, "d2d4", 30), (inicio, "g1f3", 1), (depois, "c7c5", 5),
+    ])
+    livro = LivroAberturas(arquivo)
+    yield livro
+    livro.fechar()
+
+
+def test_politica_por_dificuldade(livro):
+    assert livro.politica(3) == (6, "ponderada")
+    assert livro.politica(6) == (12, "ponderada")
+    assert livro.politica(9) == (24, "melhor")
+    assert livro.politica(12) == (24, "melhor")
+
+
+def test_dificil_joga_a_entrada_de_maior_peso(livro):
+    assert livro.jogada(chess.Board(), 9) == chess.Move.from_uci("d2d4")
+    assert livro.estatisticas() == {"acertos": 1, "falhas": 0}
+
+
+def test_facil_sorteia_entre_as_entradas(livro):
+    livro.random.seed(1)
+    jogadas = {livro.jogada(chess.Board(), 3) for _ in range(50)}
+    assert jogadas == {chess.Move.from_uci(uci) for uci in ("e2e4", "d2d4", "g1f3")}
+
+
+def test_fora_do_livro_nao_consulta_mais(livro):
+    board = chess.Board()
+    board.push_uci("a2a3")
+    assert livro.jogada(board, 9) is None
+    assert livro.fora_do_livro
+    # Mesmo voltando a uma posição do livro, a partida já saiu dele
+    assert livro.jogada(chess.Board(), 9) is None
+    assert not livro.em_livro(chess.Board(), 9)
+    livro.nova_partida()
+    assert livro.em_livro(chess.Board(), 9)
+
+
+def test_limite_de_lances_da_dificuldade(livro):
+    board = chess.Board()
+    for uci in ("g1f3", "g8f6", "f3g1", "f6g8", "g1f3", "g8f6", "f3g1", "f6g8"):
+        board.push_uci(uci)
+    # Mesma posição do início, mas depois de 8 meios-lances: fora do limite do Fácil, dentro do Médio
+    assert livro.jogada(board, 3) is None
+    assert livro.jogada(board, 6) is not None
+
+
+def test_ranking_da_casa_pelo_peso(livro):
+    board = chess.Board()
+    movimentos = [move for move in board.legal_moves if move.from_square == chess.G1]
+    ranking = livro.ranking(board, movimentos, 9)
+    assert ranking[0] == (chess.Move.from_uci("g1f3"), None)
+    assert {move for move, _ in ranking} == set(movimentos)
+    # Nenhum lance da casa no livro
+    cavalo = [move for move in board.legal_moves if move.from_square == chess.B1]
+    assert livro.ranking(board, cavalo, 9) is None
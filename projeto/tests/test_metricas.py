@@ -0,0 +1,57 @@
+import urllib.request
+from metricas import RegistroMetricas
+
+
+def test_contador_e_medidor_por_rotulo():
+    registro = RegistroMetricas()
+    tentativas = registro.contador("xadrez_tentativas_total", "Tentativas", ["porta"])
+    tentativas.incrementar(porta="/dev/ttyUSB0")
+    tentativas.incrementar(2, porta="/dev/ttyUSB0")
+    tentativas.incrementar(porta='a"b')
+    registro.medidor("xadrez_partidas", "Partidas em andamento").definir(3)
+    linhas = registro.texto().splitlines()
+    assert "# TYPE xadrez_tentativas_total counter" in linhas
+    assert 'xadrez_tentativas_total{porta="/dev/ttyUSB0"} 3' in linhas
+    assert 'xadrez_tentativas_total{porta="a\\"b"} 1' in linhas
+    assert "xadrez_partidas 3" in linhas
+
+
+def test_registrar_de_novo_devolve_a_mesma_metrica():
+    registro = RegistroMetricas()
+    assert registro.contador("xadrez_x_total", "X") is registro.contador("xadrez_x_total", "X")
+
+
+def test_histograma_cumulativo():
+    registro = RegistroMetricas()
+    latencia = registro.histograma("xadrez_latencia_segundos", "Latência", limites=(0.1, 1))
+    for valor in (0.05, 0.5, 0.7, 3):
+        latencia.observar(valor)
+    linhas = registro.texto().splitlines()
+    assert 'xadrez_latencia_segundos_bucket{le="0.1"} 1' in linhas
+    assert 'xadrez_latencia_segundos_bucket{le="1"} 3' in linhas
+    assert 'xadrez_latencia_segundos_bucket{le="+Inf"} 4' in linhas
+    assert "xadrez_latencia_segundos_sum 4.25" in linhas
+    assert "xadrez_latencia_segundos_count 4" in linhas
+
+
+def test_gravar_e_servir(tmp_path):
+    registro = RegistroMetricas()
+    registro.contador("xadrez_bytes_total", "Bytes").incrementar(10)
+    arquivo = tmp_path / "xadrez.prom"
+    registro.gravar(str(arquivo))
+    assert arquivo.read_text() == registro.texto()
+
+    servidor = registro.servir_http(0, "127.0.0.1")
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{servidor.server_address[1]}/metrics", timeout=5) as resposta:
+            assert resposta.read().decode() == registro.texto()
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+    # Porta ocupada: sem servidor, sem exceção
+    ocupada = registro.servir_http(0, "127.0.0.1")
+    try:
+        assert registro.servir_http(ocupada.server_address[1], "127.0.0.1") is None
+    finally:
+        ocupada.shutdown()
+        ocupada.server_close()
@@ -0,0 +1,64 @@
+import asyncio
+import concurrent.futures
+import chess
+import chess.engine
+import pytest
+from motor import MotorXadrez
+
+
+class EngineFalso:
+    """Imita o SimpleEngine: o primeiro trava (levanta a falha), os seguintes respondem"""
+
+    def __init__(self, falha):
+        self.falha = falha
+        self.options = {"Threads": None, "Hash": None}
+        self.id = {"name": "Falso"}
+        self.fechado = False
+
+    def configure(self, opcoes):
+        pass
+
+    def play(self, board, limite, **opcoes):
+        if self.falha:
+            raise self.falha("sem resposta")
+        return chess.engine.PlayResult(next(iter(board.legal_moves)), None)
+
+    def quit(self):
+        pass
+
+    def close(self):
+        self.fechado = True
+
+
+class CicloFalso:
+    def __init__(self, falha):
+        self.engines = []
+        self.falha = falha
+
+    def abrir_engine(self, caminho):
+        self.engines.append(EngineFalso(None if self.engines else self.falha))
+        return self.engines[-1]
+
+
+@pytest.mark.parametrize("falha", [TimeoutError, asyncio.TimeoutError, concurrent.futures.TimeoutError,
+                                   chess.engine.EngineTerminatedError])
+def test_motor_travado_e_reiniciado(falha):
+    ciclo = CicloFalso(falha)
+    motor = MotorXadrez(ciclo, "stockfish")
+    resultado = motor.play(chess.Board(), chess.engine.Limit(depth=1))
+    assert resultado.move in chess.Board().legal_moves
+    assert motor.reinicios == 1
+    assert len(ciclo.engines) == 2 and ciclo.engines[0].fechado
+
+
+def test_erro_do_comando_nao_reinicia():
+    class CicloComErro(CicloFalso):
+        def abrir_engine(self, caminho):
+            engine = super().abrir_engine(caminho)
+            engine.falha = chess.engine.EngineError
+            return engine
+
+    motor = MotorXadrez(CicloComErro(None), "stockfish")
+    with pytest.raises(chess.engine.EngineError):
+        motor.play(chess.Board(), chess.engine.Limit(depth=1))
+    assert motor.reinicios == 0
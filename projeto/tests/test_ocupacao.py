@@ -0,0 +1,54 @@
+import chess
+from ocupacao import InferenciaJogada
+
+
+def jogar(board, *leituras):
+    """Observa uma leitura por passo (casas retiradas, casas colocadas) e devolve o lance inferido"""
+    inferencia = InferenciaJogada(board)
+    ocupacao = board.occupied
+    for instante, (retiradas, colocadas) in enumerate(leituras):
+        for casa in retiradas:
+            ocupacao &= ~chess.BB_SQUARES[casa]
+        for casa in colocadas:
+            ocupacao |= chess.BB_SQUARES[casa]
+        inferencia.observar(ocupacao, instante)
+    return inferencia.lance()
+
+
+def test_lance_simples():
+    assert jogar(chess.Board(), ([chess.E2], []), ([], [chess.E4])) == chess.Move.from_uci("e2e4")
+
+
+def test_roque_pelo_rei_e_pela_torre():
+    board = chess.Board("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+    pequeno = jogar(board, ([chess.E1], []), ([], [chess.G1]), ([chess.H1], []), ([], [chess.F1]))
+    assert pequeno == chess.Move.from_uci("e1g1")
+    grande = jogar(board, ([chess.E1], []), ([], [chess.C1]), ([chess.A1], []), ([], [chess.D1]))
+    assert grande == chess.Move.from_uci("e1c1")
+
+
+def test_roque_incompleto_nao_e_reconhecido():
+    board = chess.Board("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+    # Só o rei andou duas casas: nenhum lance legal deixa essa ocupação
+    assert jogar(board, ([chess.E1], []), ([], [chess.G1])) is None
+
+
+def test_en_passant():
+    board = chess.Board("4k3/3p4/8/4P3/8/8/8/4K3 b - - 0 1")
+    board.push_uci("d7d5")
+    lance = jogar(board, ([chess.D5], []), ([chess.E5], []), ([], [chess.D6]))
+    assert lance == chess.Move.from_uci("e5d6")
+    assert board.is_en_passant(lance)
+
+
+def test_promocao_e_sempre_para_dama():
+    board = chess.Board("8/P7/8/8/8/8/8/k6K w - - 0 1")
+    assert jogar(board, ([chess.A7], []), ([], [chess.A8])) == chess.Move.from_uci("a7a8q")
+
+
+def test_captura_so_e_reconhecida_com_a_vitima_retirada():
+    board = chess.Board("1r2k3/P7/8/8/8/8/8/4K3 w - - 0 1")
+    # A leitura final é a da captura, mas b8 nunca foi visto vazio: a torre continua lá
+    assert jogar(board, ([chess.A7], []), ([], [chess.B8])) is None
+    lance = jogar(board, ([chess.B8], []), ([chess.A7], []), ([], [chess.B8]))
+    assert lance == chess.Move.from_uci("a7b8q")
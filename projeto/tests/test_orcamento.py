@@ -0,0 +1,45 @@
+import pytest
+from orcamento import SOBRECARGA_MINIMA, OrcamentoBusca, arredondar_nos
+
+JOGADA_TEMPO = {3: 1.0, 6: 2.0, 9: 3.0, 12: 5.0}
+
+
+def test_arredondar_nos_em_degraus():
+    assert arredondar_nos(100000) == arredondar_nos(101000)
+    assert arredondar_nos(0) == 1
+    degraus = sorted({arredondar_nos(nos) for nos in range(50000, 400000, 1000)})
+    assert all(1.15 < maior / menor < 1.23 for menor, maior in zip(degraus, degraus[1:]))
+
+
+def test_limite_desconta_a_sobrecarga_e_usa_os_nps():
+    orcamento = OrcamentoBusca(8, 0.5, JOGADA_TEMPO, nps=100000)
+    limite = orcamento.limite_jogada(6)
+    assert limite.depth == 6
+    assert limite.time == pytest.approx(1.95)
+    assert limite.nodes == arredondar_nos(100000 * 1.95)
+    assert orcamento.limite_dica().time == pytest.approx(0.45)
+
+
+def test_faixa_imediatamente_abaixo_e_perfil_calibrado():
+    orcamento = OrcamentoBusca(8, 0.5, JOGADA_TEMPO, jogada_profundidade={9: 7})
+    # A 10 usa a faixa da 9, que neste hardware só chega à profundidade 7 no tempo dela
+    limite = orcamento.limite_jogada(10)
+    assert (limite.depth, limite.time) == (7, pytest.approx(2.95))
+    assert orcamento.limite_jogada(2).time == pytest.approx(0.95)
+
+
+def test_medicoes_ajustam_nps_sobrecarga_e_estouros():
+    orcamento = OrcamentoBusca(8, 0.5, JOGADA_TEMPO, nps=100000)
+    limite = orcamento.limite_jogada(3)
+    orcamento.registrar({"nodes": 200000, "time": 0.5}, duracao=1.2, limite=limite)
+    assert orcamento.nps > 100000
+    assert orcamento.sobrecarga > SOBRECARGA_MINIMA
+    assert orcamento.estatisticas()["estouros"] == 1
+    assert orcamento.estatisticas()["medicoes"] == 1
+    # Buscas curtas demais não medem os nós/s
+    nps = orcamento.nps
+    orcamento.registrar({"nodes": 10, "time": 0.001})
+    assert orcamento.nps == nps
+    # Mais nós/s e mais sobrecarga: o próximo limite tem menos tempo e mais nós
+    proximo = orcamento.limite_jogada(3)
+    assert proximo.time < limite.time and proximo.nodes > limite.nodes
@@ -0,0 +1,43 @@
+import os
+from perfilamento import PerfilamentoTurnos
+
+
+def test_so_turnos_lentos_sao_gravados(tmp_path):
+    perfilamento = PerfilamentoTurnos(str(tmp_path), 100, prefixo="/dev/ttyUSB0")
+    perfilamento.iniciar(1)
+    perfilamento.acumular("dica", 0.05)
+    perfilamento.acumular("confirmacao", 5.0)  # o tempo do jogador não conta
+    perfilamento.iniciar(2)
+    perfilamento.acumular("sincronia", 0.06)
+    perfilamento.acumular("jogada", 0.06)
+    perfilamento.encerrar()
+    assert perfilamento.estatisticas() == {"gravados": 1, "descartados": 1, "ignorados": 0}
+    arquivos = sorted(os.listdir(tmp_path))
+    assert [os.path.splitext(arquivo)[1] for arquivo in arquivos] == [".folded", ".prof"]
+    assert all(arquivo.startswith("_dev_ttyUSB0_") and "_turno002_120ms" in arquivo for arquivo in arquivos)
+
+
+def test_repetir_o_turno_continua_o_mesmo_perfil(tmp_path):
+    perfilamento = PerfilamentoTurnos(str(tmp_path), 100)
+    perfilamento.iniciar(1)
+    perfilamento.acumular("dica", 0.06)
+    perfilamento.iniciar(1)
+    perfilamento.acumular("jogada", 0.06)
+    perfilamento.encerrar()
+    assert perfilamento.estatisticas()["gravados"] == 1
+
+
+def test_um_perfilador_por_processo(tmp_path):
+    primeiro = PerfilamentoTurnos(str(tmp_path), 0, prefixo="a")
+    segundo = PerfilamentoTurnos(str(tmp_path), 0, prefixo="b")
+    primeiro.iniciar(1)
+    # Com o primeiro tabuleiro perfilando, o turno do segundo fica sem perfil em vez de falhar
+    segundo.iniciar(1)
+    segundo.encerrar()
+    primeiro.encerrar()
+    assert segundo.estatisticas() == {"gravados": 0, "descartados": 0, "ignorados": 1}
+    assert primeiro.estatisticas()["gravados"] == 1
+    # Liberado o perfilador, o próximo turno do segundo é perfilado
+    segundo.iniciar(2)
+    segundo.encerrar()
+    assert segundo.estatisticas()["gravados"] == 1
@@ -0,0 +1,94 @@
+import struct
+import chess
+import pytest
+from protocolo import (TIPOS, DecodificadorQuadros, checksum_ocupacao, codificar, codificar_quadro, crc16,
+                       decodificar, delta_ocupacao)
+
+# Mensagens que voltam iguais depois de codificadas e decodificadas
+MENSAGENS = [
+    {"comando": "tabuleiro", "resposta": [1] * 16 + [0] * 32 + [1] * 16},
+    {"comando": "ocupacao", "resposta": chess.Board().occupied},
+    {"comando": "melhores_movimentos", "resposta": [12, 28, 20], "qtde": 3},
+    {"comando": "dica", "resposta": [20, 12], "qtde": 2},
+    {"comando": "confirmacao", "resposta": "sim"},
+    {"comando": "confirmacao", "resposta": "nao"},
+    {"comando": "jogada", "posicao": 63},
+    {"comando": "vencedor", "resposta": "0-1"},
+    {"comando": "vencedor", "resposta": "interrompida"},
+    {"comando": "iniciar_partida", "dificuldade": 4},
+    {"comando": "protocolo", "resposta": "binario"},
+    {"comando": "modo", "resposta": "ocupacao"},
+    {"comando": "fila", "resposta": "sim"},
+    {"comando": "delta", "resposta": [12, 92], "checksum": 0xBEEF},
+    {"comando": "ok", "resposta": "tabuleiro_recebido", "checksum": 0x1234},
+    {"comando": "jogada", "seq": 200, "posicao": 12},
+    {"comando": "ack", "seq": 7, "resposta": ""},
+]
+
+
+def decodificar_quadro(quadro):
+    return decodificar(quadro[2], quadro[4:-2])
+
+
+@pytest.mark.parametrize("mensagem", MENSAGENS, ids=lambda mensagem: mensagem["comando"])
+def test_codificar_e_decodificar_sao_inversos(mensagem):
+    assert decodificar_quadro(codificar(mensagem)) == mensagem
+
+
+def test_crc16_ccitt_false():
+    # Valor de verificação do CRC-16/CCITT-FALSE
+    assert crc16(b"123456789") == 0x29B1
+    assert crc16(b"") == 0xFFFF
+
+
+def test_checksum_ocupacao_usa_o_bitboard_em_little_endian():
+    ocupacao = chess.Board().occupied
+    assert checksum_ocupacao(ocupacao) == crc16(struct.pack("<Q", ocupacao))
+    assert checksum_ocupacao(ocupacao) != checksum_ocupacao(ocupacao ^ chess.BB_E2)
+
+
+def test_delta_ocupacao_marca_as_casas_que_ficaram_ocupadas():
+    antes = chess.Board()
+    depois = antes.copy()
+    depois.push_uci("e2e4")
+    assert sorted(delta_ocupacao(antes.occupied, depois.occupied)) == [chess.E2, chess.E4 + 64]
+    assert delta_ocupacao(antes.occupied, antes.occupied) == []
+
+
+def test_tabuleiro_curto_e_descartado_sem_perder_o_quadro_seguinte():
+    decodificador = DecodificadorQuadros()
+    curto = codificar_quadro(TIPOS["tabuleiro"], b"\x01\x02")
+    seguinte = codificar({"comando": "jogada", "posicao": 12})
+    assert decodificador.alimentar(curto + seguinte) == [{"comando": "jogada", "posicao": 12}]
+    assert decodificador.descartados == len(curto)
+
+
+def test_ocupacao_longa_e_descartada():
+    decodificador = DecodificadorQuadros()
+    longo = codificar_quadro(TIPOS["ocupacao"], bytes(9))
+    assert decodificador.alimentar(longo) == []
+    assert decodificador.descartados == len(longo)
+
+
+def test_delta_sem_checksum_e_descartado():
+    decodificador = DecodificadorQuadros()
+    assert decodificador.alimentar(codificar_quadro(TIPOS["delta"], b"\x05")) == []
+    # Só o checksum, sem casas alteradas, é um delta válido
+    mensagens = decodificador.alimentar(codificar_quadro(TIPOS["delta"], struct.pack(">H", 0x1234)))
+    assert mensagens == [{"comando": "delta", "resposta": [], "checksum": 0x1234}]
+
+
+def test_crc_invalido_conta_erro_e_ressincroniza():
+    decodificador = DecodificadorQuadros()
+    corrompido = bytearray(codificar({"comando": "confirmacao", "resposta": "sim"}))
+    corrompido[-1] ^= 0xFF
+    valido = codificar({"comando": "confirmacao", "resposta": "nao"})
+    assert decodificador.alimentar(bytes(corrompido) + valido) == [{"comando": "confirmacao", "resposta": "nao"}]
+    assert decodificador.erros_crc == 1
+
+
+def test_quadro_em_pedacos():
+    decodificador = DecodificadorQuadros()
+    quadro = codificar({"comando": "ocupacao", "resposta": 0xFFFF00000000FFFF})
+    assert decodificador.alimentar(quadro[:5]) == []
+    assert decodificador.alimentar(quadro[5:]) == [{"comando": "ocupacao", "resposta": 0xFFFF00000000FFFF}]
@@ -0,0 +1,116 @@
+import asyncio
+import socket
+import threading
+import time
+import chess
+import chess.engine
+import pytest
+import remoto
+from remoto import MotorRemoto
+from transporte import CicloEventos
+
+
+class ServidorMudo:
+    """Servidor UCI que completa a inicialização mas nunca responde às buscas (ou responde com a linha dada)"""
+
+    def __init__(self, resposta=None):
+        self.resposta = resposta
+        self.socket = socket.create_server(("127.0.0.1", 0))
+        self.porta = self.socket.getsockname()[1]
+        self.conexoes = []
+        threading.Thread(target=self._aceitar, daemon=True).start()
+
+    def _aceitar(self):
+        while True:
+            try:
+                conexao, _ = self.socket.accept()
+            except OSError:
+                return
+            self.conexoes.append(conexao)
+            threading.Thread(target=self._atender, args=(conexao,), daemon=True).start()
+
+    def _atender(self, conexao):
+        with conexao.makefile("rwb", buffering=0) as arquivo:
+            for linha in arquivo:
+                comando = linha.strip()
+                if comando == b"uci":
+                    arquivo.write(b"id name Mudo\nuciok\n")
+                elif comando == b"isready":
+                    arquivo.write(b"readyok\n")
+                elif comando.startswith(b"go") and self.resposta:
+                    arquivo.write(self.resposta)
+
+    def fechar(self):
+        self.socket.close()
+        for conexao in self.conexoes:
+            conexao.close()
+
+
+class MotorLocal:
+    def __init__(self):
+        self.jogadas = 0
+
+    def play(self, board, limite, **opcoes):
+        self.jogadas += 1
+        return chess.engine.PlayResult(next(iter(board.legal_moves)), None)
+
+
+@pytest.fixture
+def ciclo():
+    ciclo = CicloEventos()
+    yield ciclo
+    ciclo.fechar()
+
+
+def test_servidor_mudo_cai_no_motor_local(ciclo):
+    servidor = ServidorMudo()
+    local = MotorLocal()
+    motor = MotorRemoto(ciclo, ("127.0.0.1", servidor.porta), local)
+    try:
+        inicio = time.monotonic()
+        resultado = motor.play(chess.Board(), chess.engine.Limit(time=0.1))
+        assert time.monotonic() - inicio < 2
+        assert resultado.move in chess.Board().legal_moves
+        assert local.jogadas == 1
+        assert (motor.remotas, motor.reservas, motor.falhas) == (0, 1, 1)
+
+        # A busca remota cancelada não fica pendente no laço compartilhado
+        async def pendentes():
+            await asyncio.sleep(0.1)
+            return [tarefa for tarefa in asyncio.all_tasks() if tarefa is not asyncio.current_task()]
+        assert ciclo.executar(pendentes()) == []
+
+        # Durante a espera depois da falha as buscas vão direto para o motor local
+        motor.play(chess.Board(), chess.engine.Limit(time=0.1))
+        assert local.jogadas == 2
+    finally:
+        servidor.fechar()
+
+
+def test_busca_so_com_profundidade_tem_prazo(ciclo, monkeypatch):
+    monkeypatch.setattr(remoto, "REMOTO_PRAZO_MAXIMO", 0.3)
+    servidor = ServidorMudo()
+    local = MotorLocal()
+    motor = MotorRemoto(ciclo, ("127.0.0.1", servidor.porta), local)
+    try:
+        inicio = time.monotonic()
+        motor.play(chess.Board(), chess.engine.Limit(depth=20))
+        assert time.monotonic() - inicio < 2
+        assert local.jogadas == 1
+        assert motor._abertas == 0
+    finally:
+        servidor.fechar()
+
+
+def test_resposta_invalida_libera_a_conexao(ciclo):
+    servidor = ServidorMudo(b"bestmove zzzz\n")
+    local = MotorLocal()
+    motor = MotorRemoto(ciclo, ("127.0.0.1", servidor.porta), local)
+    try:
+        resultado = motor.play(chess.Board(), chess.engine.Limit(time=0.1))
+        assert resultado.move in chess.Board().legal_moves
+        assert local.jogadas == 1
+        # A conexão com a resposta inválida é fechada e sai da contagem: o servidor volta a ser usado depois da espera
+        assert (motor.reservas, motor.falhas, motor._abertas) == (1, 1, 0)
+    finally:
+        servidor.fechar()
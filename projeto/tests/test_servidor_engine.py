@@ -0,0 +1,68 @@
+import asyncio
+import sys
+import textwrap
+from servidor_engine import ServidorMotor, filtrar_linha
+
+# Motor UCI mínimo que anota cada linha recebida
+MOTOR = textwrap.dedent("""
+    import sys
+    with open(sys.argv[1], "a") as registro:
+        for linha in sys.stdin:
+            registro.write(linha)
+            registro.flush()
+            comando = linha.strip()
+            if comando == "uci":
+                print("uciok", flush=True)
+            elif comando == "isready":
+                print("readyok", flush=True)
+""")
+
+
+def test_filtrar_linha():
+    assert filtrar_linha(b"go depth 10\n") == (True, None)
+    assert filtrar_linha(b"position startpos moves e2e4\n") == (True, None)
+    assert filtrar_linha(b"setoption name MultiPV value 4\n") == (True, "MultiPV")
+    assert filtrar_linha(b"setoption name threads value 2\n") == (True, "Threads")
+    assert filtrar_linha(b"setoption name Debug Log File value /etc/passwd\n") == (False, None)
+    assert filtrar_linha(b"setoption name SyzygyPath value /tmp\n") == (False, None)
+    assert filtrar_linha(b"debug on\n") == (False, None)
+    assert filtrar_linha(b"\n") == (False, None)
+
+
+def test_opcoes_recusadas_e_restauradas_entre_clientes(tmp_path):
+    script = tmp_path / "motor.py"
+    script.write_text(MOTOR)
+    registro = tmp_path / "registro.txt"
+
+    async def cliente(porta, *linhas):
+        leitor, escritor = await asyncio.open_connection("127.0.0.1", porta)
+        for linha in linhas + ("isready",):
+            escritor.write((linha + "\n").encode())
+        await escritor.drain()
+        while (await leitor.readline()).strip() != b"readyok":
+            pass
+        escritor.close()
+
+    async def executar():
+        servidor = ServidorMotor([sys.executable, str(script), str(registro)], {"Threads": 2, "Hash": 64}, 1)
+        tcp = await asyncio.start_server(servidor.atender, "127.0.0.1", 0)
+        porta = tcp.sockets[0].getsockname()[1]
+        try:
+            await cliente(porta, "setoption name Debug Log File value /tmp/invasao", "setoption name MultiPV value 3",
+                          "setoption name Threads value 8")
+            # O segundo cliente só é atendido depois de o processo voltar à reserva
+            await cliente(porta, "go depth 1")
+        finally:
+            tcp.close()
+            await tcp.wait_closed()
+            servidor.fechar()
+
+    asyncio.run(executar())
+    linhas = registro.read_text().splitlines()
+    assert not any("Debug Log File" in linha for linha in linhas)
+    devolucao = linhas.index("setoption name Threads value 8") + 1
+    assert "setoption name MultiPV value 1" in linhas[devolucao:]
+    assert "setoption name Threads value 2" in linhas[devolucao:]
+    # Um só processo, reaproveitado: as opções do servidor aparecem na partida e na devolução
+    assert linhas.count("setoption name Threads value 2") == 2
+    assert linhas.index("go depth 1") > linhas.index("setoption name MultiPV value 1")
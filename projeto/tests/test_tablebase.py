@@ -0,0 +1,69 @@
+import chess
+import pytest
+from tablebase import SCORE_VITORIA, TablebaseSyzygy
+
+
+class TabelasFalsas:
+    """Imita o chess.syzygy.Tablebase: WDL e DTZ (do lado que joga depois do lance) por último lance"""
+
+    def __init__(self, valores):
+        self.wdl = {"KQvK": None}
+        self.valores = valores  # lance uci -> (wdl, dtz); ausente = tabela faltando
+
+    def probe_wdl(self, board):
+        return self._valor(board)[0]
+
+    def probe_dtz(self, board):
+        return self._valor(board)[1]
+
+    def _valor(self, board):
+        try:
+            return self.valores[board.peek().uci()]
+        except KeyError:
+            raise chess.syzygy.MissingTableError("KQvK") from None
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def tablebase(tmp_path):
+    tablebase = TablebaseSyzygy(str(tmp_path))
+    yield tablebase
+    tablebase.fechar()
+
+
+def test_sem_tabelas_nao_cobre_nada(tablebase):
+    board = chess.Board("8/8/8/8/8/2k5/8/1QK5 w - - 0 1")
+    assert tablebase.max_pecas == 0
+    assert tablebase.jogada(board) is None
+    assert tablebase.estatisticas() == {"acertos": 0, "falhas": 0, "taxa": 0.0}
+
+
+def test_ranking_prefere_vencer_rapido_e_adiar_a_derrota(tablebase):
+    board = chess.Board("8/8/8/8/8/2k5/8/1QK5 w - - 0 1")
+    movimentos = [chess.Move.from_uci(uci) for uci in ("b1b2", "b1b5", "b1h7", "c1d1")]
+    # Do ponto de vista do adversário: -2 = ele perde (o lance vence), 0 = empate, 2 = ele vence
+    tablebase.tablebase = TabelasFalsas({"b1b2": (0, 0), "b1b5": (-2, 9), "b1h7": (-2, 3), "c1d1": (2, 5)})
+    tablebase.max_pecas = 3
+    ranking = tablebase.ranking(board, movimentos)
+    assert [move.uci() for move, _ in ranking] == ["b1h7", "b1b5", "b1b2", "c1d1"]
+    assert dict((move.uci(), score) for move, score in ranking) == {
+        "b1h7": SCORE_VITORIA - 3, "b1b5": SCORE_VITORIA - 9, "b1b2": 0, "c1d1": -SCORE_VITORIA + 5}
+    assert tablebase.estatisticas()["acertos"] == 1
+
+
+def test_roque_ou_muitas_pecas_ficam_de_fora(tablebase):
+    tablebase.tablebase = TabelasFalsas({})
+    tablebase.max_pecas = 3
+    assert not tablebase.cobre(chess.Board())
+    assert not tablebase.cobre(chess.Board("8/8/8/8/8/2k5/8/R3K3 w Q - 0 1"))
+    assert tablebase.cobre(chess.Board("8/8/8/8/8/2k5/8/R3K3 w - - 0 1"))
+
+
+def test_tabela_faltando_conta_falha(tablebase):
+    board = chess.Board("8/8/8/8/8/2k5/8/1QK5 w - - 0 1")
+    tablebase.tablebase = TabelasFalsas({})
+    tablebase.max_pecas = 3
+    assert tablebase.jogada(board) is None
+    assert tablebase.estatisticas() == {"acertos": 0, "falhas": 1, "taxa": 0.0}
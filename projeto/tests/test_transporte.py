@@ -0,0 +1,106 @@
+import asyncio
+import json
+import queue
+import time
+import pytest
+import transporte
+from transporte import CicloEventos, TransporteSerial
+
+
+class SerialFalsa:
+    """Porta sem descritor de arquivo (lida no executor): guarda o que foi escrito e entrega as linhas injetadas"""
+
+    port = "/dev/falsa"
+
+    def __init__(self):
+        self.escritas = []
+        self.entrada = queue.Queue()
+
+    def write(self, dados):
+        self.escritas.append(json.loads(dados))
+        return len(dados)
+
+    def readline(self):
+        try:
+            return self.entrada.get(timeout=0.02)
+        except queue.Empty:
+            return b""
+
+    def responder(self, **mensagem):
+        self.entrada.put((json.dumps(mensagem) + "\n").encode())
+
+    def enviados(self, comando):
+        return [mensagem["seq"] for mensagem in self.escritas if mensagem["comando"] == comando]
+
+
+@pytest.fixture
+def enlace(monkeypatch):
+    monkeypatch.setattr(transporte, "FILA_TIMEOUT", 0.05)
+    monkeypatch.setattr(transporte, "FILA_TENTATIVAS", 3)
+    monkeypatch.setattr(transporte, "FILA_JANELA", 2)
+    ciclo = CicloEventos()
+    ser = SerialFalsa()
+    enlace = TransporteSerial(ser, ciclo)
+    enlace.usar_fila()
+    yield ciclo, ser, enlace
+    enlace.fechar()
+    ciclo.fechar()
+
+
+def aguardar(condicao, timeout=2):
+    limite = time.monotonic() + timeout
+    while not condicao():
+        assert time.monotonic() < limite
+        time.sleep(0.005)
+
+
+def test_comandos_numerados_e_confirmados_pelo_numero(enlace):
+    ciclo, ser, enlace = enlace
+    assert ciclo.executar(enlace.enviar_numerado({"comando": "dica", "resposta": [1]}))[1] == 0
+    assert ciclo.executar(enlace.enviar_numerado({"comando": "dica", "resposta": [2]}))[1] == 1
+    # A confirmação do segundo não serve para o primeiro
+    ser.responder(comando="ack", seq=1, resposta="")
+    assert ciclo.executar(enlace.confirmacao(1, timeout=1)) == {"comando": "ack", "seq": 1, "resposta": ""}
+    assert ciclo.executar(enlace.confirmacao(0, timeout=0.01)) is None
+
+
+def test_reenvia_ate_confirmar(enlace):
+    ciclo, ser, enlace = enlace
+    ciclo.executar(enlace.enviar({"comando": "confirmacao", "resposta": "sim"}))
+    aguardar(lambda: len(ser.enviados("confirmacao")) >= 2)
+    ser.responder(comando="ack", seq=0, resposta="")
+    assert ciclo.executar(enlace.confirmacao(0, timeout=1))["comando"] == "ack"
+    enviados = len(ser.enviados("confirmacao"))
+    time.sleep(0.3)
+    assert len(ser.enviados("confirmacao")) == enviados
+    assert ser.enviados("confirmacao") == [0] * enviados
+
+
+def test_desiste_e_libera_a_janela(enlace):
+    ciclo, ser, enlace = enlace
+    ciclo.executar(enlace.enviar({"comando": "dica", "resposta": [1]}))
+    ciclo.executar(enlace.enviar({"comando": "dica", "resposta": [2]}))
+    # Janela cheia: o terceiro comando só sai quando uma vaga é liberada
+    terceiro = ciclo.agendar(enlace.enviar({"comando": "dica", "resposta": [3]}))
+    time.sleep(0.02)
+    assert not terceiro.done()
+    ser.responder(comando="ack", seq=0, resposta="")
+    assert terceiro.result(1) > 0
+    assert 2 in ser.enviados("dica")
+    # Sem confirmação, o seq 1 é enviado FILA_TENTATIVAS vezes e a espera termina sem resposta
+    assert ciclo.executar(enlace.confirmacao(1, timeout=2)) is None
+    assert ser.enviados("dica").count(1) == transporte.FILA_TENTATIVAS
+
+
+def test_fechar_encerra_os_reenvios(enlace):
+    ciclo, ser, enlace = enlace
+    ciclo.executar(enlace.enviar({"comando": "dica", "resposta": [1]}))
+    enlace.fechar()
+
+    async def pendentes():
+        await asyncio.sleep(0.05)
+        return [tarefa for tarefa in asyncio.all_tasks() if tarefa is not asyncio.current_task()]
+    assert ciclo.executar(pendentes()) == []
+    enviados = len(ser.escritas)
+    time.sleep(0.2)
+    assert len(ser.escritas) == enviados
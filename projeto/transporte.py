@@ -0,0 +1,424 @@
+import asyncio
+import collections
+import json
+import threading
+import time
+import serial
+import chess.engine
+from log import obter_log
+from metricas import REGISTRO
+from protocolo import DecodificadorQuadros, codificar
+
+# Mensagens recebidas que ninguém aguardava ficam guardadas até este limite
+MAX_MENSAGENS_PENDENTES = 100
+
+# Comandos que o ESP32 responde com "ok" (ou "sincronizar"): medem o tempo de ida e volta da serial
+COMANDOS_COM_RESPOSTA = ("teste", "protocolo", "iniciar_partida", "tabuleiro")
+
+# Fila de comandos (negociada com o ESP32): cada comando leva um número de sequência e é confirmado pelo número.
+# Até FILA_JANELA comandos ficam sem confirmação; sem ela em FILA_TIMEOUT segundos (dobrando a cada vez)
+# o comando é reenviado, até FILA_TENTATIVAS envios
+FILA_JANELA = 8
+FILA_TIMEOUT = 0.5
+FILA_TENTATIVAS = 6
+
+# Mensagens do ESP32 que respondem a um comando numerado (as demais levam o número do último comando recebido)
+RESPOSTAS_FILA = ("ok", "ack", "modo")
+
+SERIAL_BYTES = REGISTRO.contador("xadrez_serial_bytes_total", "Bytes trafegados na serial", ["porta", "sentido"])
+SERIAL_RTT = REGISTRO.histograma("xadrez_serial_rtt_segundos", "Tempo entre um comando e a resposta do ESP32",
+                                 ["porta", "comando"])
+SERIAL_TIMEOUTS = REGISTRO.contador("xadrez_serial_timeouts_total", "Esperas por mensagem do ESP32 sem resposta",
+                                    ["porta"])
+SERIAL_RETRANSMISSOES = REGISTRO.contador("xadrez_serial_retransmissoes_total",
+                                          "Comandos reenviados por falta de confirmação", ["porta", "comando"])
+SERIAL_ERROS_CRC = REGISTRO.contador("xadrez_serial_erros_crc_total", "Quadros binários descartados por CRC inválido",
+                                     ["porta"])
+
+
+class ConexaoPerdida(serial.SerialException):
+    """A porta do ESP32 deixou de funcionar (cabo USB desconectado, ESP32 desligado...)"""
+
+
+def seq_em_diante(seq, referencia):
+    """Indica se o número de sequência é o de referência ou posterior (os números dão a volta em 256)"""
+    return (seq - referencia) % 256 < 128
+
+
+class CicloEventos:
+    """Laço asyncio em uma thread própria, compartilhado pela serial e pelo motor de xadrez"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="CicloEventos", daemon=True)
+        self._thread.start()
+
+    def executar(self, coro, timeout=None):
+        """Executa uma corrotina no laço e bloqueia até o resultado (não chamar de dentro do laço)"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def agendar(self, coro):
+        """Agenda uma corrotina no laço e devolve um concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def abrir_engine(self, comando):
+        """Inicia o motor UCI pela API assíncrona do chess.engine, no mesmo laço da serial"""
+        transport, protocol = self.executar(chess.engine.popen_uci(comando))
+        return chess.engine.SimpleEngine(transport, protocol)
+
+    def fechar(self):
+        if self.loop.is_running():
+            # Tarefas ainda pendentes são canceladas e concluídas antes de o laço parar
+            try:
+                self.executar(self._cancelar_tarefas(), timeout=5)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+
+    @staticmethod
+    async def _cancelar_tarefas():
+        tarefas = [tarefa for tarefa in asyncio.all_tasks() if tarefa is not asyncio.current_task()]
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+
+
+class TransporteSerial:
+    """Enlace com o ESP32 (JSON ou binário): leitura orientada a eventos e despacho das mensagens por comando"""
+
+    def __init__(self, ser, ciclo):
+        self.ser = ser
+        self.ciclo = ciclo
+        self.protocolo = "json"
+        self._decodificador = DecodificadorQuadros()
+        self._buffer = bytearray()
+        self._esperas = []
+        self._recebidas = collections.deque(maxlen=MAX_MENSAGENS_PENDENTES)
+        self._tratadores = {}
+        self._leitor = None
+        self._fd = None
+        self._pendente = None  # (comando, instante do envio) aguardando resposta, para o RTT
+        self.sequencia = False  # fila de comandos numerados, ativada depois de negociada
+        self.ultimo_seq = None  # número do último comando enviado
+        self._proximo_seq = 0
+        self._pedidos = {}  # número -> futuro da confirmação (a resposta do ESP32, ou None se não veio)
+        self._retransmissoes = set()  # tarefas que reenviam os comandos em voo
+        self._janela = None
+        self.desconectado = False
+        self.porta = getattr(ser, "port", None) or ""
+        self.log = obter_log(f"serial {self.porta}" if self.porta else "serial")
+        self.ciclo.executar(self._iniciar_leitura())
+
+    ###########
+    # LEITURA #
+    ###########
+
+    async def _iniciar_leitura(self):
+        loop = asyncio.get_running_loop()
+        try:
+            self._fd = self.ser.fileno()
+            loop.add_reader(self._fd, self._ao_ler)
+        except (AttributeError, NotImplementedError, OSError, ValueError):
+            # Sem descritor de arquivo (Windows ou portas simuladas): lê em uma thread do executor
+            self._fd = None
+            self._leitor = loop.create_task(self._ler_em_executor())
+
+    def _ao_ler(self):
+        try:
+            dados = self.ser.read(self.ser.in_waiting or 1)
+        except (serial.SerialException, OSError) as e:
+            self.log.erro("Erro de comunicação serial: %s", e)
+            self._remover_leitor()
+            self._desconectar(e)
+            return
+        self._receber(dados)
+
+    async def _ler_em_executor(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                dados = await loop.run_in_executor(None, self.ser.readline)
+            except (serial.SerialException, OSError) as e:
+                self.log.erro("Erro de comunicação serial: %s", e)
+                self._desconectar(e)
+                return
+            except RuntimeError:
+                # Executor já encerrado: o programa está terminando
+                return
+            if dados:
+                self._receber(dados)
+
+    def _receber(self, dados):
+        SERIAL_BYTES.incrementar(len(dados), porta=self.porta, sentido="recebidos")
+        if self.protocolo == "binario":
+            erros_crc = self._decodificador.erros_crc
+            for mensagem in self._decodificador.alimentar(dados):
+                self.log.depurar("Quadro recebido: %s", mensagem)
+                self._despachar(mensagem)
+            if self._decodificador.erros_crc > erros_crc:
+                SERIAL_ERROS_CRC.incrementar(self._decodificador.erros_crc - erros_crc, porta=self.porta)
+            return
+        self._buffer.extend(dados)
+        while True:
+            fim = self._buffer.find(b"\n")
+            if fim < 0:
+                return
+            linha = self._buffer[:fim].decode("utf-8", errors="ignore").strip()
+            del self._buffer[:fim + 1]
+            if linha:
+                self._processar_linha(linha)
+
+    def _processar_linha(self, linha):
+        self.log.depurar("Dados recebidos: %s", linha)
+        if not (linha.startswith("{") and linha.endswith("}")):
+            self.log.aviso("Dados não-JSON ignorados: %s", linha)
+            return
+        try:
+            mensagem = json.loads(linha)
+        except json.JSONDecodeError as je:
+            self.log.aviso("JSON inválido: %s - Erro: %s", linha, je)
+            return
+        self._despachar(mensagem)
+
+    ###############
+    # DESPACHANTE #
+    ###############
+
+    def registrar(self, comando, tratador):
+        """Trata mensagens de um comando que chegam sem ninguém aguardando por elas"""
+        self._tratadores[comando] = tratador
+
+    def _despachar(self, mensagem):
+        comando = mensagem.get("comando")
+        if self.sequencia and mensagem.get("seq") is not None and comando in RESPOSTAS_FILA:
+            # Resposta casada pelo número: uma confirmação atrasada não é tomada pela de outro comando
+            futuro = self._pedidos.get(mensagem["seq"])
+            if futuro is None or futuro.done():
+                self.log.aviso("Confirmação atrasada ou repetida descartada: %s", mensagem)
+            else:
+                futuro.set_result(mensagem)
+            return
+        if self._pendente is not None and comando in ("ok", "sincronizar"):
+            enviado, instante = self._pendente
+            self._pendente = None
+            SERIAL_RTT.observar(time.perf_counter() - instante, porta=self.porta, comando=enviado)
+        for espera in self._esperas:
+            comandos, futuro, apos = espera
+            if not futuro.done() and (comandos is None or comando in comandos):
+                if self._atrasada(mensagem, apos):
+                    return
+                self._esperas.remove(espera)
+                futuro.set_result(mensagem)
+                return
+        tratador = self._tratadores.get(comando)
+        if tratador is not None:
+            tratador(mensagem)
+        else:
+            self._recebidas.append(mensagem)
+
+    def _atrasada(self, mensagem, apos):
+        # Com a fila, o ESP32 carimba cada mensagem com o último comando que recebeu
+        seq = mensagem.get("seq")
+        if apos is None or seq is None or seq_em_diante(seq, apos):
+            return False
+        # Normal no modo ocupação, em que o ESP32 repete a leitura a cada OCUPACAO_REPETICAO
+        self.log.depurar("Mensagem anterior ao passo atual descartada: %s", mensagem)
+        return True
+
+    def _desconectar(self, erro):
+        self.desconectado = True
+        for _, futuro, _ in self._esperas:
+            if not futuro.done():
+                futuro.set_exception(ConexaoPerdida(str(erro)))
+        self._esperas.clear()
+        for futuro in self._pedidos.values():
+            if not futuro.done():
+                futuro.set_result(None)
+
+    async def receber(self, comandos=None, timeout=None, apos=None):
+        """Aguarda a próxima mensagem (de um dos comandos, se informados); None no timeout.
+        Com a fila, mensagens carimbadas antes do comando apos são descartadas."""
+        if self.desconectado:
+            raise ConexaoPerdida("porta serial desconectada")
+        for mensagem in list(self._recebidas):
+            if comandos is None or mensagem.get("comando") in comandos:
+                self._recebidas.remove(mensagem)
+                if not self._atrasada(mensagem, apos):
+                    return mensagem
+
+        futuro = asyncio.get_running_loop().create_future()
+        espera = (set(comandos) if comandos is not None else None, futuro, apos)
+        self._esperas.append(espera)
+        try:
+            return await asyncio.wait_for(futuro, timeout)
+        except asyncio.TimeoutError:
+            self.log.aviso("Timeout após %s segundos", timeout)
+            SERIAL_TIMEOUTS.incrementar(porta=self.porta)
+            return None
+        finally:
+            if espera in self._esperas:
+                self._esperas.remove(espera)
+
+    #########
+    # ENVIO #
+    #########
+
+    async def enviar(self, mensagem):
+        """Escreve uma mensagem na serial, no protocolo em uso, e devolve o número de bytes enviados.
+        Com a fila o comando é numerado e reenviado até ser confirmado, sem esperar a confirmação."""
+        enviados, _ = await self.enviar_numerado(mensagem)
+        return enviados
+
+    async def enviar_numerado(self, mensagem):
+        """Como enviar, devolvendo também o número de sequência dado ao comando (None sem a fila)"""
+        if not self.sequencia:
+            return self._escrever(mensagem), None
+        # Janela cheia: espera uma confirmação (ou desistência) antes de pôr mais um comando em voo
+        await self._janela.acquire()
+        seq = self._proximo_seq
+        self._proximo_seq = (seq + 1) % 256
+        mensagem = dict(mensagem, seq=seq)
+        futuro = asyncio.get_running_loop().create_future()
+        self._pedidos[seq] = futuro
+        self.ultimo_seq = seq
+        try:
+            enviados = self._escrever(mensagem)
+        except ConexaoPerdida:
+            self._janela.release()
+            raise
+        tarefa = asyncio.get_running_loop().create_task(self._retransmitir(mensagem, futuro))
+        self._retransmissoes.add(tarefa)
+        tarefa.add_done_callback(self._retransmissoes.discard)
+        return enviados, seq
+
+    async def _retransmitir(self, mensagem, futuro):
+        # Reenvia o comando até a confirmação chegar ou as tentativas acabarem, e libera a vaga na janela
+        comando, seq = mensagem["comando"], mensagem["seq"]
+        inicio = time.perf_counter()
+        espera = FILA_TIMEOUT
+        try:
+            for tentativa in range(1, FILA_TENTATIVAS + 1):
+                try:
+                    await asyncio.wait_for(asyncio.shield(futuro), espera)
+                    if tentativa == 1:
+                        # Só comandos sem reenvio medem o RTT: não se sabe a qual envio a resposta corresponde
+                        SERIAL_RTT.observar(time.perf_counter() - inicio, porta=self.porta, comando=comando)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+                if tentativa == FILA_TENTATIVAS or self.desconectado:
+                    break
+                self.log.aviso("Sem confirmação de %s (seq %d), reenviando", comando, seq)
+                SERIAL_RETRANSMISSOES.incrementar(porta=self.porta, comando=comando)
+                self._escrever(mensagem)
+                espera *= 2
+            self.log.erro("%s (seq %d) não confirmado após %d envios", comando, seq, FILA_TENTATIVAS)
+            SERIAL_TIMEOUTS.incrementar(porta=self.porta)
+        except ConexaoPerdida:
+            pass
+        finally:
+            if not futuro.done():
+                futuro.set_result(None)
+            self._janela.release()
+
+    def _escrever(self, mensagem):
+        if self.protocolo == "binario":
+            dados = codificar(mensagem)
+        else:
+            dados = (json.dumps(mensagem) + "\n").encode("utf-8")
+        if self.desconectado:
+            raise ConexaoPerdida("porta serial desconectada")
+        try:
+            enviados = self.ser.write(dados)
+        except (serial.SerialException, OSError) as e:
+            self._remover_leitor()
+            self._desconectar(e)
+            raise ConexaoPerdida(str(e)) from e
+        SERIAL_BYTES.incrementar(len(dados), porta=self.porta, sentido="enviados")
+        if not self.sequencia and mensagem.get("comando") in COMANDOS_COM_RESPOSTA:
+            self._pendente = (mensagem["comando"], time.perf_counter())
+        return enviados
+
+    async def requisitar(self, mensagem, comandos=("ok",), timeout=None):
+        """Envia uma mensagem e aguarda a resposta correspondente (com a fila, a que traz o mesmo número)"""
+        _, seq = await self.enviar_numerado(mensagem)
+        if seq is None:
+            return await self.receber(comandos, timeout)
+        return await self.confirmacao(seq, timeout)
+
+    async def confirmacao(self, seq, timeout=None):
+        """Resposta do ESP32 ao comando numerado seq (pode ser só um "ack"); None se não veio"""
+        futuro = self._pedidos.get(seq)
+        if futuro is None:
+            return None
+        try:
+            resposta = await asyncio.wait_for(asyncio.shield(futuro), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if resposta is None and self.desconectado:
+            raise ConexaoPerdida("porta serial desconectada")
+        return resposta
+
+    def descartar_pendentes(self):
+        """Esquece mensagens recebidas, bytes parciais e comandos numerados ainda em voo"""
+        def descartar():
+            self._recebidas.clear()
+            self._buffer.clear()
+            self._decodificador.buffer.clear()
+            # Os reenvios param (liberando as vagas da janela) e confirmações atrasadas deles são descartadas
+            self._cancelar_retransmissoes()
+            self._pedidos.clear()
+        self.ciclo.loop.call_soon_threadsafe(descartar)
+
+    def usar_protocolo(self, protocolo):
+        """Troca entre "json" e "binario" (o ESP32 deve ter confirmado a troca antes)"""
+        def trocar():
+            self.protocolo = protocolo
+            self._buffer.clear()
+            self._decodificador.buffer.clear()
+        self.ciclo.loop.call_soon_threadsafe(trocar)
+
+    def usar_fila(self):
+        """Passa a numerar os comandos (o ESP32 deve ter confirmado a fila antes)"""
+        def ativar():
+            self._janela = asyncio.Semaphore(FILA_JANELA)
+            self._proximo_seq = 0
+            self._pedidos.clear()
+            self.sequencia = True
+        self.ciclo.loop.call_soon_threadsafe(ativar)
+
+    def estatisticas(self):
+        """Bytes descartados e quadros com CRC inválido desde o início"""
+        return {
+            "protocolo": self.protocolo,
+            "descartados": self._decodificador.descartados,
+            "erros_crc": self._decodificador.erros_crc,
+        }
+
+    ############
+    # CONTROLE #
+    ############
+
+    def _remover_leitor(self):
+        if self._fd is not None:
+            self.ciclo.loop.remove_reader(self._fd)
+            self._fd = None
+        if self._leitor is not None:
+            self._leitor.cancel()
+            self._leitor = None
+
+    def _cancelar_retransmissoes(self):
+        for tarefa in list(self._retransmissoes):
+            tarefa.cancel()
+
+    async def _encerrar(self):
+        self._remover_leitor()
+        tarefas = list(self._retransmissoes)
+        self._cancelar_retransmissoes()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+
+    def fechar(self):
+        # Os reenvios terminam antes: não escrevem em uma porta fechada nem ficam pendentes no laço
+        if self.ciclo.loop.is_running():
+            self.ciclo.executar(self._encerrar(), timeout=5)
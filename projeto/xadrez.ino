@@ -1,3 +1,4 @@
+#define ARDUINOJSON_USE_LONG_LONG 1  // leitura de ocupação (64 bits) em JSON
 #include <ArduinoJson.h>
 #include <Adafruit_NeoPixel.h>
 
@@ -16,9 +17,50 @@ int pinosColunas[NUM_COLUNAS] = {17,16,32,25,26,27,14,13};
 // Objeto NeoPixel
 Adafruit_NeoPixel strip(NUM_TOTAL_LEDS, LED_PIN, NEO_GRB + NEO_KHZ800);
 
+// Protocolo binário: [0xA5 0x5A][tipo][tamanho][dados...][CRC16 alto][CRC16 baixo]
+// O CRC (CCITT, valor inicial 0xFFFF) cobre tipo, tamanho e dados
+// Com a fila de comandos, o bit COM_SEQ do tipo indica que o primeiro byte dos dados é o número de sequência
+#define SYNC1 0xA5
+#define SYNC2 0x5A
+#define MAX_DADOS 64
+#define COM_SEQ 0x80
+
+#define TIPO_TESTE 0x01
+#define TIPO_INICIAR_PARTIDA 0x02
+#define TIPO_TABULEIRO 0x03
+#define TIPO_MELHORES_MOVIMENTOS 0x04
+#define TIPO_CONFIRMACAO 0x05
+#define TIPO_JOGADA 0x06
+#define TIPO_VENCEDOR 0x07
+#define TIPO_OK 0x08
+#define TIPO_PROTOCOLO 0x09
+#define TIPO_DELTA 0x0A
+#define TIPO_SINCRONIZAR 0x0B
+#define TIPO_DICA 0x0C
+#define TIPO_OCUPACAO 0x0D
+#define TIPO_MODO 0x0E
+#define TIPO_ACK 0x0F
+#define TIPO_FILA 0x10
+#define TIPO_DESCONHECIDO 0xFF
+
+// Modo ocupação: sem mudanças nos sensores, a leitura é repetida neste intervalo (ms)
+#define OCUPACAO_REPETICAO 100
+
+struct Mensagem {
+    uint8_t tipo;
+    uint8_t tamanho;
+    uint8_t dados[MAX_DADOS];
+    int seq;  // número de sequência (fila de comandos); -1 se não veio
+};
+
 // Variáveis globais
 bool jogadaEnviada = false;
 bool novoJogo = false;
+bool modoBinario = false;
+bool modoOcupacao = false;
+bool modoFila = false;
+uint8_t seqEsperado = 0;   // fila de comandos: próximo número aceito
+uint8_t ultimoSeq = 255;   // último comando aceito, enviado em tudo o que sai daqui
 int tabuleiro[64];
 
 int verdadeiros_locais[64] = {
@@ -127,16 +169,331 @@ void piscar_led(int qtde, int delayTime = 500) {
 
 //----------------------------------------------
 
+/*************\
+|* PROTOCOLO *|
+\*************/ 
+
+uint16_t crc16(const uint8_t* dados, int tamanho, uint16_t crc = 0xFFFF) {
+    for (int i = 0; i < tamanho; i++) {
+        crc ^= (uint16_t)dados[i] << 8;
+        for (int b = 0; b < 8; b++) {
+            crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+        }
+    }
+    return crc;
+}
+
+void enviarQuadro(uint8_t tipo, const uint8_t* dados, uint8_t tamanho, int seq) {
+    uint8_t cabecalho[5] = {SYNC1, SYNC2, tipo, tamanho, 0};
+    int tamanhoCabecalho = 4;
+    if (seq >= 0) {
+        // Número de sequência como primeiro byte dos dados
+        cabecalho[2] |= COM_SEQ;
+        cabecalho[3] = tamanho + 1;
+        cabecalho[4] = seq;
+        tamanhoCabecalho = 5;
+    }
+    uint16_t crc = crc16(&cabecalho[2], tamanhoCabecalho - 2);
+    crc = crc16(dados, tamanho, crc);
+    uint8_t rodape[2] = {(uint8_t)(crc >> 8), (uint8_t)(crc & 0xFF)};
+    Serial.write(cabecalho, tamanhoCabecalho);
+    Serial.write(dados, tamanho);
+    Serial.write(rodape, 2);
+}
+
+void enviarQuadro(uint8_t tipo, const uint8_t* dados, uint8_t tamanho) {
+    enviarQuadro(tipo, dados, tamanho, modoFila ? ultimoSeq : -1);
+}
+
+void enviarJson(JsonDocument &doc, int seq) {
+    if (seq >= 0) {
+        doc["seq"] = seq;
+    }
+    serializeJson(doc, Serial);
+    Serial.print('\n');
+}
+
+void enviarJson(JsonDocument &doc) {
+    enviarJson(doc, modoFila ? ultimoSeq : -1);
+}
+
+bool esperarBytes(int quantidade) {
+    unsigned long inicio = millis();
+    while (Serial.available() < quantidade) {
+        if (millis() - inicio > 100) {
+            return false;
+        }
+        delay(1);
+    }
+    return true;
+}
+
+uint8_t tipoDoComando(const String& comando) {
+    if (comando == "teste") return TIPO_TESTE;
+    if (comando == "iniciar_partida") return TIPO_INICIAR_PARTIDA;
+    if (comando == "tabuleiro") return TIPO_TABULEIRO;
+    if (comando == "melhores_movimentos") return TIPO_MELHORES_MOVIMENTOS;
+    if (comando == "confirmacao") return TIPO_CONFIRMACAO;
+    if (comando == "vencedor") return TIPO_VENCEDOR;
+    if (comando == "protocolo") return TIPO_PROTOCOLO;
+    if (comando == "delta") return TIPO_DELTA;
+    if (comando == "dica") return TIPO_DICA;
+    if (comando == "modo") return TIPO_MODO;
+    if (comando == "fila") return TIPO_FILA;
+    return TIPO_DESCONHECIDO;
+}
+
+String textoResultado(uint8_t codigo) {
+    if (codigo == 0) return "1-0";
+    if (codigo == 1) return "0-1";
+    if (codigo == 3) return "interrompida";
+    return "1/2-1/2";
+}
+
+// Lê um quadro binário; bytes inválidos são descartados até a próxima sincronia
+bool lerQuadro(Mensagem &msg) {
+    Serial.read(); // SYNC1
+    if (!esperarBytes(1) || Serial.peek() != SYNC2) {
+        return false;
+    }
+    Serial.read(); // SYNC2
+    if (!esperarBytes(2)) {
+        return false;
+    }
+    uint8_t corpo[2];
+    corpo[0] = Serial.read();
+    corpo[1] = Serial.read();
+    if (corpo[1] > MAX_DADOS || !esperarBytes(corpo[1] + 2)) {
+        return false;
+    }
+    msg.tipo = corpo[0];
+    msg.tamanho = corpo[1];
+    Serial.readBytes(msg.dados, msg.tamanho);
+    uint16_t recebido = (uint16_t)Serial.read() << 8;
+    recebido |= (uint16_t)Serial.read();
+    uint16_t calculado = crc16(msg.dados, msg.tamanho, crc16(corpo, 2));
+    if (recebido != calculado) {
+        return false;
+    }
+    msg.seq = -1;
+    if (msg.tipo & COM_SEQ) {
+        if (msg.tamanho == 0) {
+            return false;
+        }
+        msg.tipo &= ~COM_SEQ;
+        msg.seq = msg.dados[0];
+        msg.tamanho--;
+        memmove(msg.dados, msg.dados + 1, msg.tamanho);
+    }
+    return true;
+}
+
+// Lê uma linha JSON e a converte para o mesmo formato dos quadros binários
+bool lerJson(Mensagem &msg) {
+    String linha = Serial.readStringUntil('\n');
+    StaticJsonDocument<1536> doc;
+    if (deserializeJson(doc, linha) != DeserializationError::Ok) {
+        return false;
+    }
+    String comando = doc["comando"].as<String>();
+    msg.tipo = tipoDoComando(comando);
+    msg.tamanho = 0;
+    msg.seq = doc["seq"] | -1;
+
+    if (msg.tipo == TIPO_TABULEIRO) {
+        // 64 casas viram um bitboard de 8 bytes (bit i = casa i)
+        memset(msg.dados, 0, 8);
+        int i = 0;
+        for (JsonVariant v : doc["resposta"].as<JsonArray>()) {
+            if (i < 64 && v.as<int>() == 1) {
+                msg.dados[i / 8] |= 1 << (i % 8);
+            }
+            i++;
+        }
+        msg.tamanho = 8;
+    }
+    else if (msg.tipo == TIPO_MELHORES_MOVIMENTOS || msg.tipo == TIPO_DICA) {
+        for (JsonVariant v : doc["resposta"].as<JsonArray>()) {
+            if (msg.tamanho < MAX_DADOS) {
+                msg.dados[msg.tamanho++] = v.as<int>();
+            }
+        }
+    }
+    else if (msg.tipo == TIPO_CONFIRMACAO) {
+        msg.dados[0] = doc["resposta"].as<String>() == "sim" ? 1 : 0;
+        msg.tamanho = 1;
+    }
+    else if (msg.tipo == TIPO_VENCEDOR) {
+        String vencedor = doc["resposta"].as<String>();
+        msg.dados[0] = vencedor == "1-0" ? 0 : (vencedor == "0-1" ? 1 : (vencedor == "interrompida" ? 3 : 2));
+        msg.tamanho = 1;
+    }
+    else if (msg.tipo == TIPO_INICIAR_PARTIDA) {
+        msg.dados[0] = doc["dificuldade"].as<int>();
+        msg.tamanho = 1;
+    }
+    else if (msg.tipo == TIPO_PROTOCOLO) {
+        msg.dados[0] = doc["resposta"].as<String>() == "binario" ? 1 : 0;
+        msg.tamanho = 1;
+    }
+    else if (msg.tipo == TIPO_MODO) {
+        msg.dados[0] = doc["resposta"].as<String>() == "ocupacao" ? 1 : 0;
+        msg.tamanho = 1;
+    }
+    else if (msg.tipo == TIPO_FILA) {
+        msg.dados[0] = doc["resposta"].as<String>() == "sim" ? 1 : 0;
+        msg.tamanho = 1;
+    }
+    else if (msg.tipo == TIPO_DELTA) {
+        // Mesmo formato do quadro binário: casas alteradas seguidas do checksum
+        for (JsonVariant v : doc["resposta"].as<JsonArray>()) {
+            if (msg.tamanho < MAX_DADOS - 2) {
+                msg.dados[msg.tamanho++] = v.as<int>();
+            }
+        }
+        uint16_t checksum = doc["checksum"].as<uint16_t>();
+        msg.dados[msg.tamanho++] = checksum >> 8;
+        msg.dados[msg.tamanho++] = checksum & 0xFF;
+    }
+    else if (msg.tipo == TIPO_TESTE) {
+        // Um teste em JSON indica que o Raspberry reiniciou: volta ao protocolo JSON, sem fila e ao lance em duas etapas
+        modoBinario = false;
+        modoOcupacao = false;
+        modoFila = false;
+    }
+    return true;
+}
+
+void enviarAck(uint8_t seq) {
+    if (modoBinario) {
+        enviarQuadro(TIPO_ACK, NULL, 0, seq);
+        return;
+    }
+    StaticJsonDocument<100> ack;
+    ack["comando"] = "ack";
+    enviarJson(ack, seq);
+}
+
+// Comandos confirmados pela própria resposta; os demais recebem um ack
+bool temResposta(uint8_t tipo) {
+    return tipo == TIPO_TESTE || tipo == TIPO_PROTOCOLO || tipo == TIPO_INICIAR_PARTIDA
+        || tipo == TIPO_TABULEIRO || tipo == TIPO_MODO || tipo == TIPO_FILA;
+}
+
+// Fila de comandos: só o próximo número é aceito, em ordem; um repetido (a confirmação se perdeu) é confirmado de novo
+// e um adiantado (o anterior se perdeu) é descartado, já que o Raspberry reenvia os dois
+bool aceitarSequencia(Mensagem &msg) {
+    if (!modoFila || msg.seq < 0) {
+        return true;
+    }
+    if (msg.seq != seqEsperado) {
+        if ((uint8_t)(msg.seq - seqEsperado) >= 128) {
+            enviarAck(msg.seq);
+        }
+        return false;
+    }
+    ultimoSeq = msg.seq;
+    seqEsperado = ultimoSeq + 1;
+    if (!temResposta(msg.tipo)) {
+        enviarAck(msg.seq);
+    }
+    return true;
+}
+
+// Lê a próxima mensagem disponível, em qualquer um dos dois protocolos
+bool receberMensagem(Mensagem &msg) {
+    if (!Serial.available()) {
+        return false;
+    }
+    int primeiro = Serial.peek();
+    bool lida;
+    if (primeiro == SYNC1) {
+        lida = lerQuadro(msg);
+    }
+    else if (primeiro == '{') {
+        lida = lerJson(msg);
+    }
+    else {
+        Serial.read(); // Ruído na linha
+        return false;
+    }
+    return lida && aceitarSequencia(msg);
+}
+
+void enviarOk(const char* resposta) {
+    if (modoBinario) {
+        enviarQuadro(TIPO_OK, NULL, 0);
+        return;
+    }
+    StaticJsonDocument<100> confirmacao;
+    confirmacao["comando"] = "ok";
+    confirmacao["resposta"] = resposta;
+    enviarJson(confirmacao);
+}
+
+// Checksum da ocupação (bit i = casa i), o mesmo calculado pelo Raspberry
+uint16_t checksumTabuleiro(int tabuleiro[64]) {
+    uint8_t bitboard[8] = {0};
+    for (int i = 0; i < 64; i++) {
+        if (tabuleiro[i]) {
+            bitboard[i / 8] |= 1 << (i % 8);
+        }
+    }
+    return crc16(bitboard, 8);
+}
+
+void enviarConfirmacaoTabuleiro(uint16_t checksum) {
+    if (modoBinario) {
+        uint8_t dados[2] = {(uint8_t)(checksum >> 8), (uint8_t)(checksum & 0xFF)};
+        enviarQuadro(TIPO_OK, dados, 2);
+        return;
+    }
+    StaticJsonDocument<100> confirmacao;
+    confirmacao["comando"] = "ok";
+    confirmacao["resposta"] = "tabuleiro_recebido";
+    confirmacao["checksum"] = checksum;
+    enviarJson(confirmacao);
+}
+
+void enviarModo() {
+    if (modoBinario) {
+        uint8_t dados[1] = {(uint8_t)(modoOcupacao ? 1 : 0)};
+        enviarQuadro(TIPO_MODO, dados, 1);
+        return;
+    }
+    StaticJsonDocument<100> resposta;
+    resposta["comando"] = "modo";
+    resposta["resposta"] = modoOcupacao ? "ocupacao" : "etapas";
+    enviarJson(resposta);
+}
+
+void pedirTabuleiroCompleto() {
+    if (modoBinario) {
+        enviarQuadro(TIPO_SINCRONIZAR, NULL, 0);
+        return;
+    }
+    StaticJsonDocument<100> pedido;
+    pedido["comando"] = "sincronizar";
+    pedido["resposta"] = "checksum_invalido";
+    enviarJson(pedido);
+}
+
+//----------------------------------------------
+
 /*****************\
 |* ENVIAR JOGADA *|
 \*****************/ 
 
 void enviarJogada(const int posicao) {
+    if (modoBinario) {
+        uint8_t dados[1] = {(uint8_t)posicao};
+        enviarQuadro(TIPO_JOGADA, dados, 1);
+        return;
+    }
     StaticJsonDocument<100> doc;
     doc["comando"] = "jogada";
     doc["posicao"] = posicao;
-    serializeJson(doc, Serial);
-    Serial.print('\n');
+    enviarJson(doc);
 }
 
 /*************************\
@@ -144,35 +501,41 @@ void enviarJogada(const int posicao) {
 \*************************/ 
 
 int aguardarInicializacao() {
+    Mensagem msg;
     while (true) {
         if (Serial.available()) {
-            String msg = Serial.readStringUntil('\n');
-            StaticJsonDocument<100> resposta; 
-            if (deserializeJson(resposta, msg) == DeserializationError::Ok) {
-                String comando = resposta["comando"].as<String>();
-                if (comando == "iniciar_partida") {
-                    // Enviar confirmação OK
-                    StaticJsonDocument<100> confirmacao;
-                    confirmacao["comando"] = "ok";
-                    confirmacao["resposta"] = "pronto_para_receber_tabuleiro";
-                    serializeJson(confirmacao, Serial);
-                    Serial.print('\n');
-                    
+            if (receberMensagem(msg)) {
+                if (msg.tipo == TIPO_INICIAR_PARTIDA) {
+                    enviarOk("pronto_para_receber_tabuleiro");
                     novoJogo = true;
-                    return resposta["dificuldade"].as<int>();
+                    return msg.dados[0];
                 } 
-                else if(comando == "teste") {
-                    // Enviar confirmação OK
-                    StaticJsonDocument<100> confirmacao;
-                    confirmacao["comando"] = "ok";
-                    confirmacao["resposta"] = "teste_recebido";
-                    serializeJson(confirmacao, Serial);
-                    Serial.print('\n'); 
+                else if (msg.tipo == TIPO_TESTE) {
+                    enviarOk("teste_recebido");
+                }
+                else if (msg.tipo == TIPO_PROTOCOLO) {
+                    // Confirma no protocolo atual e só então troca
+                    enviarOk(msg.dados[0] ? "binario" : "json");
+                    Serial.flush();
+                    modoBinario = msg.dados[0] == 1;
+                }
+                else if (msg.tipo == TIPO_MODO) {
+                    modoOcupacao = msg.dados[0] == 1;
+                    enviarModo();
+                }
+                else if (msg.tipo == TIPO_FILA) {
+                    // Confirma fora da fila e só então passa a numerar
+                    modoFila = false;
+                    enviarOk(msg.dados[0] ? "fila" : "sem_fila");
+                    Serial.flush();
+                    modoFila = msg.dados[0] == 1;
+                    seqEsperado = 0;
+                    ultimoSeq = 255;
                 }
             }
         } 
         else
-            delay(1000);
+            delay(10);  // responde ao handshake logo que o Raspberry conecta
     }
 }
 
@@ -182,36 +545,46 @@ int aguardarInicializacao() {
 |* RECEBER TABULEIRO *|
 \*********************/ 
 
+// Aplica um tabuleiro completo ou um delta; false se o delta divergiu (o tabuleiro completo foi pedido)
+bool aplicarTabuleiro(Mensagem &msg, int tabuleiro[64]) {
+    if (msg.tipo == TIPO_TABULEIRO && msg.tamanho == 8) {
+        // Bitboard de ocupação: bit i = casa i
+        for (int i = 0; i < 64; i++) {
+            tabuleiro[i] = (msg.dados[i / 8] >> (i % 8)) & 1;
+        }
+        
+        // Confirma com o checksum do que foi guardado
+        enviarConfirmacaoTabuleiro(checksumTabuleiro(tabuleiro));
+        return true;
+    }
+    if (msg.tipo == TIPO_DELTA && msg.tamanho >= 2) {
+        // Só as casas alteradas (casa + 64 se ficou ocupada), seguidas do checksum esperado
+        int casas = msg.tamanho - 2;
+        for (int i = 0; i < casas; i++) {
+            tabuleiro[msg.dados[i] % 64] = msg.dados[i] / 64;
+        }
+        uint16_t esperado = ((uint16_t)msg.dados[casas] << 8) | msg.dados[casas + 1];
+        
+        // Sem resposta quando bate; se divergiu, pede o tabuleiro completo
+        if (checksumTabuleiro(tabuleiro) == esperado) {
+            return true;
+        }
+        pedirTabuleiroCompleto();
+    }
+    return false;
+}
+
 void receberTabuleiro(int tabuleiro[64]) {
     int mensagem_recebida = 0;
+    Mensagem msg;
     while (!mensagem_recebida) {
         if (Serial.available()) {
-            String msg = Serial.readStringUntil('\n');
-            StaticJsonDocument<100> resposta; 
-            if (deserializeJson(resposta, msg) == DeserializationError::Ok) {
-                String comando = resposta["comando"].as<String>();
-                if (comando == "tabuleiro") {
-                    JsonArray arr = resposta["resposta"].as<JsonArray>();
-                    int i = 0;
-                    for (JsonVariant v : arr) {
-                        if (i < 64) {
-                            tabuleiro[i] = v.as<int>();
-                            i++;
-                        }
-                    }
-                    
-                    // Enviar confirmação OK
-                    StaticJsonDocument<100> confirmacao;
-                    confirmacao["comando"] = "ok";
-                    confirmacao["resposta"] = "tabuleiro_recebido";
-                    serializeJson(confirmacao, Serial);
-                    Serial.print('\n');
-                    
-                    mensagem_recebida = 1;
+            if (receberMensagem(msg)) {
+                if (msg.tipo == TIPO_TABULEIRO || msg.tipo == TIPO_DELTA) {
+                    mensagem_recebida = aplicarTabuleiro(msg, tabuleiro);
                 } 
-                else if (comando == "vencedor") {
-                    String vencedor = resposta["resposta"].as<String>();
-                    verificar_vencedor(vencedor);
+                else if (msg.tipo == TIPO_VENCEDOR) {
+                    verificar_vencedor(textoResultado(msg.dados[0]));
                     mensagem_recebida = 1;
                 }
             }
@@ -295,20 +668,17 @@ int processar_origem_usuario(int tabuleiro[64]) {
 }
 
 bool aguarda_resposta(int origem, int tabuleiro[64]) {
+    Mensagem msg;
     while (true) {
         strip.clear();
         if (Serial.available()) {
-            String msg = Serial.readStringUntil('\n');
-            StaticJsonDocument<100> resposta; 
-            if (deserializeJson(resposta, msg) == DeserializationError::Ok) {
-                String comando = resposta["comando"].as<String>();
-                if (comando == "confirmacao") {
-                    String resp = resposta["resposta"].as<String>();
-                    if (resp == "sim") {
+            if (receberMensagem(msg)) {
+                if (msg.tipo == TIPO_CONFIRMACAO) {
+                    if (msg.dados[0] == 1) {
                         tabuleiro[origem] = 0; // Marca a casa de origem como vazia
                         return true;
                     }
-                    else if (resp=="nao") {
+                    else {
                         strip.setPixelColor(verdadeiros_locais[origem]*2, strip.Color(255,0,0)); 
                         strip.setPixelColor(verdadeiros_locais[origem]*2+1, strip.Color(255,0,0)); 
                         strip.show();
@@ -325,22 +695,16 @@ bool aguarda_resposta(int origem, int tabuleiro[64]) {
 }
 
 int receberMelhoresMovimentos(int best_moves[]) {
+    Mensagem msg;
     while (true) {
         if (Serial.available()) {
-            String msg = Serial.readStringUntil('\n');
-            StaticJsonDocument<100> resposta; 
-            if (deserializeJson(resposta, msg) == DeserializationError::Ok) {
-                String comando = resposta["comando"].as<String>();
-                if (comando == "melhores_movimentos") {
-                    JsonArray arr = resposta["resposta"].as<JsonArray>();
-                    int qtde = resposta["qtde"].as<int>();
-                    int i=0;
-                    for (JsonVariant v : arr) {
-                        best_moves[i] = v.as<int>();
-                        i++;
+            if (receberMensagem(msg)) {
+                if (msg.tipo == TIPO_MELHORES_MOVIMENTOS) {
+                    for (int i = 0; i < msg.tamanho; i++) {
+                        best_moves[i] = msg.dados[i];
                     }
 
-                    return qtde; 
+                    return msg.tamanho; 
                 }
             }
         }
@@ -350,8 +714,17 @@ int receberMelhoresMovimentos(int best_moves[]) {
 void processar_destino_usuario(int origem, int tabuleiro[64], int movimentos[] = NULL, int numMov = 0) {
     jogadaEnviada = false;
     bool peca_origem_levantada = false;
+    Mensagem msg;
     // Serial.println("Aguardando confirmar jogada");
     while(jogadaEnviada == false) {
+        // Dica progressiva: o Raspberry reordena os mesmos destinos conforme a busca se aprofunda
+        if (Serial.available() && receberMensagem(msg) && msg.tipo == TIPO_DICA) {
+            for (int i = 0; i < msg.tamanho; i++) {
+                movimentos[i] = msg.dados[i];
+            }
+            numMov = msg.tamanho;
+        }
+
         strip.clear();
 
         //Acende a casa de origem de branco
@@ -449,22 +822,18 @@ void processar_destino_usuario(int origem, int tabuleiro[64], int movimentos[] =
 
 void receberMovimentosComputador(int movimentos[2]) {
     int mensagem_recebida = 0;
+    Mensagem msg;
     while (!mensagem_recebida) {
         if (Serial.available()) {
-            String msg = Serial.readStringUntil('\n');
-            StaticJsonDocument<100> resposta; 
-            if (deserializeJson(resposta, msg) == DeserializationError::Ok) {
-                String comando = resposta["comando"].as<String>();
-                if (comando == "melhores_movimentos") {
-                    JsonArray arr = resposta["resposta"].as<JsonArray>();
-                    movimentos[0] = arr[0].as<int>(); // Origem
-                    movimentos[1] = arr[1].as<int>(); // Destino
+            if (receberMensagem(msg)) {
+                if (msg.tipo == TIPO_MELHORES_MOVIMENTOS && msg.tamanho >= 2) {
+                    movimentos[0] = msg.dados[0]; // Origem
+                    movimentos[1] = msg.dados[1]; // Destino
                     mensagem_recebida = 1;
                     break;
                 } 
-                else if (comando == "vencedor") {
-                    String vencedor = resposta["resposta"].as<String>();
-                    verificar_vencedor(vencedor);
+                else if (msg.tipo == TIPO_VENCEDOR) {
+                    verificar_vencedor(textoResultado(msg.dados[0]));
                     mensagem_recebida = 1;
                     break;
                 }
@@ -538,6 +907,111 @@ void processar_destino_computador(int origem, int tabuleiro[64], int movimentos[
 
 //----------------------------------------------
 
+/*****************\
+|* MODO OCUPAÇÃO *|
+\*****************/ 
+
+// Bitboard dos sensores (bit i = casa i); sensor Hall em LOW = casa ocupada
+void lerOcupacao(uint8_t ocupacao[8]) {
+    memset(ocupacao, 0, 8);
+    for (int i = 0; i < NUM_LINHAS; i++) {
+        digitalWrite(pinosLinhas[i], LOW);
+        delayMicroseconds(50);
+
+        for (int j = 0; j < NUM_COLUNAS; j++) {
+            int posicao = i * NUM_COLUNAS + j;
+            if (digitalRead(pinosColunas[j]) == LOW) {
+                ocupacao[posicao / 8] |= 1 << (posicao % 8);
+            }
+        }
+        digitalWrite(pinosLinhas[i], HIGH);
+    }
+}
+
+void enviarOcupacao(const uint8_t ocupacao[8]) {
+    if (modoBinario) {
+        enviarQuadro(TIPO_OCUPACAO, ocupacao, 8);
+        return;
+    }
+    uint64_t bitboard = 0;
+    for (int i = 7; i >= 0; i--) {
+        bitboard = (bitboard << 8) | ocupacao[i];
+    }
+    StaticJsonDocument<100> doc;
+    doc["comando"] = "ocupacao";
+    doc["resposta"] = bitboard;
+    enviarJson(doc);
+}
+
+// Transmite os sensores a cada mudança (o Raspberry reconhece os lances) e acende o que ele mandar, até o fim da partida
+void transmitirOcupacao(int tabuleiro[64]) {
+    Mensagem msg;
+    int destaques[MAX_DADOS];
+    int numDestaques = 0;
+    bool computador = false;
+    bool conferido = false;
+    uint8_t ocupacao[8];
+    uint8_t enviada[8] = {0};
+    unsigned long ultimoEnvio = 0;
+
+    while (novoJogo) {
+        if (Serial.available() && receberMensagem(msg)) {
+            if (msg.tipo == TIPO_TABULEIRO || msg.tipo == TIPO_DELTA) {
+                // Novo turno: confere as peças de novo e apaga os destaques do turno anterior
+                if (aplicarTabuleiro(msg, tabuleiro)) {
+                    conferido = false;
+                    numDestaques = 0;
+                }
+            }
+            else if (msg.tipo == TIPO_DICA || msg.tipo == TIPO_MELHORES_MOVIMENTOS) {
+                // Dica: destinos da peça levantada; computador: origem e destino do lance a executar
+                for (int i = 0; i < msg.tamanho; i++) {
+                    destaques[i] = msg.dados[i];
+                }
+                numDestaques = msg.tamanho;
+                computador = msg.tipo == TIPO_MELHORES_MOVIMENTOS;
+            }
+            else if (msg.tipo == TIPO_VENCEDOR) {
+                verificar_vencedor(textoResultado(msg.dados[0]));
+            }
+            else if (msg.tipo == TIPO_TESTE) {
+                // O Raspberry reiniciou: volta a aguardar a inicialização
+                novoJogo = false;
+            }
+        }
+
+        lerOcupacao(ocupacao);
+        if (memcmp(ocupacao, enviada, 8) != 0 || millis() - ultimoEnvio >= OCUPACAO_REPETICAO) {
+            enviarOcupacao(ocupacao);
+            memcpy(enviada, ocupacao, 8);
+            ultimoEnvio = millis();
+        }
+
+        if (!conferido) {
+            // Como no início de cada turno do modo em duas etapas: mostra as peças fora do lugar
+            conferido = verificar_tabuleiro(tabuleiro);
+        }
+        else {
+            strip.clear();
+            for (int i = 0; i < numDestaques; i++) {
+                uint32_t cor;
+                if (computador) {
+                    cor = i == 0 ? strip.Color(0, 0, 255) : strip.Color(0, 255, 0);  // origem azul, destino verde
+                }
+                else {
+                    cor = i == 0 ? strip.Color(0, 255, 0) : strip.Color(0, 255, 255);  // melhor verde, demais azuis
+                }
+                strip.setPixelColor(verdadeiros_locais[destaques[i]]*2, cor);
+                strip.setPixelColor(verdadeiros_locais[destaques[i]]*2+1, cor);
+            }
+            strip.show();
+        }
+        delay(10);
+    }
+}
+
+//----------------------------------------------
+
 /**********************\
 |* VERIFICAR VENCEDOR *|
 \**********************/ 
@@ -559,6 +1033,15 @@ void verificar_vencedor(const String& vencedor) {
             delay(500); 
         }
     }
+    else if (vencedor == "interrompida") {
+        // Sem resultado: a partida continua quando o Raspberry iniciar a próxima
+        for (int i=0; i<5; i++) {
+            acender_led("BLUE");
+            strip.clear();
+            strip.show();
+            delay(500); 
+        }
+    }
     else {
         for (int i=0; i<5; i++) {
             acender_led("YELLOW");
@@ -595,6 +1078,10 @@ void loop() {
     delay(200);
     piscar_led(3, 250);
 
+    if (modoOcupacao) {
+        transmitirOcupacao(tabuleiro);
+        return;
+    }
 
     while(novoJogo) {
         strip.clear(); 
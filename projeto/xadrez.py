@@ -1,209 +1,438 @@
 import serial
-import json
+import os
 import time
-import serial.tools.list_ports
+import argparse
+import threading
 import chess
 import chess.engine
+from afinidade import EscalonamentoCpu
+from analise import AnaliseEspeculativa, ranking_das_infos
+from cache import CacheAnalise
+from descoberta import ESPERA_MAXIMA, DescobertaESP32
+from diario import DiarioPartida, vez_do_jogador
+from escalonador import EscalonadorMotor, MotorCompartilhado
+from livro import LivroAberturas
+from log import DEPURACAO, configurar, obter_log
+from metricas import LIMITES_NOS, LIMITES_NPS, LIMITES_PROFUNDIDADE, REGISTRO
+from motor import MotorXadrez
+from ocupacao import OCUPACAO_ERRO, InferenciaJogada
+from orcamento import OrcamentoBusca
+from perfil import carregar_perfil
+from perfilamento import PerfilamentoTurnos
+from remoto import MotorRemoto
+from protocolo import MAX_DADOS, bitboard_para_ocupacao, checksum_ocupacao, delta_ocupacao, ocupacao_para_bitboard
+from tablebase import TablebaseSyzygy
+from transporte import CicloEventos, ConexaoPerdida, TransporteSerial
 
 # Configurações
+STOCKFISH_PATH = "/usr/games/stockfish"
 BAUDRATE = 115200
 TIMEOUT = 10
+PROTOCOLO_BINARIO = True  # negocia o protocolo binário; o ESP32 sem suporte continua em JSON
+SINCRONIA_INCREMENTAL = True  # envia só as casas alteradas quando o ESP32 confirma o tabuleiro com checksum
+MODO_OCUPACAO = False  # o ESP32 transmite a leitura dos sensores e o lance é reconhecido aqui (uma mensagem por lance)
+FILA_COMANDOS = True  # comandos numerados: confirmados pelo número, reenviados sem confirmação e vários em voo
+
+# Orçamento das buscas: tempo de parede alvo (incluindo a comunicação com o motor),
+# convertido em limites de nós e tempo conforme os nós/s medidos
+DICA_PROFUNDIDADE = 8   # profundidade máxima da dica (uma busca MultiPV restrita aos movimentos da casa)
+DICA_TEMPO = 0.5        # segundos por dica
+JOGADA_TEMPO = {3: 1.0, 6: 2.0, 9: 3.0, 12: 5.0}  # segundos por jogada do computador, por profundidade
+
+# Nome de cada faixa de profundidade (as de JOGADA_TEMPO; a 12 só é alcançada ao repetir partidas sem o menu)
+DIFICULDADES = {3: "Fácil", 6: "Médio", 9: "Difícil", 12: "Mestre"}
+
+# Perfil do motor calibrado para este hardware por "python calibrar.py" (Threads/Hash, nós/s e limites de cada
+# dificuldade que cumprem a latência alvo); substitui a configuração acima e é ignorado se não existir
+PERFIL_ARQUIVO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perfil_motor.json")
+
+# Servidor de motor na rede (servidor_engine.py) que faz as buscas no lugar do Stockfish local; o local assume
+# quando o servidor está lento ou fora do ar (None = só o motor local)
+MOTOR_REMOTO = None  # ex.: ("192.168.0.20", 9110)
+
+# Divisão da CPU: o jogo (laço da serial e leitura dos sensores) fica em um núcleo reservado e o Stockfish nos
+# demais, com prioridade mais baixa, para o tabuleiro não engasgar durante buscas profundas (afinidade só no Linux)
+NUCLEO_JOGO = 0         # None = o jogo não tem núcleo reservado
+MOTOR_NUCLEOS = None    # ex.: [1, 2, 3]; None = todos menos o do jogo (as Threads do motor são limitadas a eles)
+MOTOR_NICE = 5          # prioridade do motor (0 = a mesma do jogo; maior = mais baixa)
+
+# Threads do Stockfish por tipo de busca (None = as do motor); mudar as Threads recria as threads do Stockfish e
+# limpa a hash dele, então valores diferentes custam isso a cada troca entre dicas e jogadas
+DICA_THREADS = None
+JOGADA_THREADS = None
+
+# Dica progressiva: os destinos acendem na hora (ordem provisória) e são reordenados a cada profundidade da busca
+DICA_PROGRESSIVA = True
+
+# Cache persistente de análises (None = desativado)
+CACHE_ARQUIVO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analises.db")
+
+# Livro de aberturas polyglot; ignorado se o arquivo não existir
+LIVRO_ARQUIVO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "livro.bin")
+
+# Diretório com tablebases Syzygy (.rtbw/.rtbz); ignorado se não existir
+SYZYGY_DIRETORIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "syzygy")
+
+# Diário da partida em andamento (para retomá-la após uma queda) e PGN das terminadas; None = desativado
+DIARIO_DIRETORIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "partidas")
+
+# Registros: nível exibido ("depuracao" mostra cada mensagem da serial) e nível guardado em memória,
+# despejado junto com cada erro
+LOG_NIVEL = "info"
+LOG_NIVEL_ANEL = "depuracao"
+
+# Perfil dos turnos lentos (python xadrez.py --profile): um .prof (pstats) e um .folded (pilhas dobradas, para
+# flamegraph) por turno em que o jogador esperou mais que o limite
+PERFILAMENTO_DIRETORIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perfis")
+PERFILAMENTO_LIMITE_MS = 500
+
+# Modo com vários tabuleiros: intervalo entre relatórios de vazão/latência por tabuleiro
+RELATORIO_INTERVALO = 60  # segundos
+
+# Exportação das métricas no formato do Prometheus (None = desativada)
+METRICAS_PORTA = 9108       # endpoint HTTP /metrics
+METRICAS_ARQUIVO = None     # arquivo regravado periodicamente (ex.: para o textfile collector do node_exporter)
+METRICAS_INTERVALO = 15     # segundos entre gravações do arquivo
+
+# Descrições de porta serial que indicam um ESP32
+PADROES_ESP32 = ['USB', 'CH340', 'CP210', 'ESP32', 'SILICON LABS', 'USB-SERIAL CH340', 'USB SERIAL']
+
+# Última porta que respondeu ao handshake: tentada primeiro na próxima execução (None = não guardar)
+ULTIMA_PORTA_ARQUIVO = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ultima_porta")
+
+# Handshake: pings a cada PING_INTERVALO (dobrando a cada falha) até o ESP32 responder;
+# uma porta que não responde em HANDSHAKE_TIMEOUT segundos é trocada pela próxima
+PING_INTERVALO = 0.25
+HANDSHAKE_TIMEOUT = 5
+
+# Métricas
+FASES_SEGUNDOS = REGISTRO.histograma("xadrez_fase_segundos", "Duração de cada fase do turno",
+                                    ["tabuleiro", "fase"])
+BUSCA_SEGUNDOS = REGISTRO.histograma("xadrez_busca_segundos", "Tempo de parede das buscas do Stockfish", ["busca"])
+BUSCA_NOS = REGISTRO.histograma("xadrez_busca_nos", "Nós visitados por busca", ["busca"], LIMITES_NOS)
+BUSCA_NPS = REGISTRO.histograma("xadrez_busca_nps", "Nós por segundo de cada busca", ["busca"], LIMITES_NPS)
+BUSCA_PROFUNDIDADE = REGISTRO.histograma("xadrez_busca_profundidade", "Profundidade atingida por busca", ["busca"],
+                                         LIMITES_PROFUNDIDADE)
+TENTATIVAS = REGISTRO.contador("xadrez_tentativas_total", "Operações repetidas após falha", ["tabuleiro", "motivo"])
+
+def escalonamento_cpu():
+    """Núcleos, prioridade e threads por busca do motor, conforme a configuração"""
+    return EscalonamentoCpu(NUCLEO_JOGO, MOTOR_NUCLEOS, MOTOR_NICE, {"dica": DICA_THREADS, "jogada": JOGADA_THREADS})
+
+def exportar_metricas():
+    """Inicia o endpoint HTTP e/ou a gravação periódica das métricas, conforme a configuração"""
+    if METRICAS_PORTA:
+        REGISTRO.servir_http(METRICAS_PORTA)
+    if METRICAS_ARQUIVO:
+        REGISTRO.gravar_periodicamente(METRICAS_ARQUIVO, METRICAS_INTERVALO)
 
 class XadrezESP32:
-    def __init__(self):
-        self.ser = None
+    def __init__(self, porta=None, ciclo=None, motor=None, cache=None, ser=None, diario=None):
+        """Sem argumentos atende um tabuleiro; no modo com vários, recebe a porta e os recursos compartilhados"""
+        self.log = obter_log(f"xadrez {porta}" if porta else "xadrez")
+        self.ser = ser  # porta já aberta (ex.: ESP32 simulado); senão é aberta em conectar_esp32
+        self.porta = porta  # se informada, só esta porta é usada (também ao reconectar)
+        self.porta_atual = None
+        self.descoberta = DescobertaESP32(PADROES_ESP32, ULTIMA_PORTA_ARQUIVO)
         self.dificuldade = "Facil"
         self.dificuldade_depth = 3
-        self.STOCKFISH_PATH = "/usr/games/stockfish"
+        self.STOCKFISH_PATH = STOCKFISH_PATH
+        self.motor_opcoes = None  # None = MOTOR_OPCOES
+        self.cpu = escalonamento_cpu()
+        self.orcamento = self.abrir_perfil()
+        self.dica_limite = self.orcamento.limite_dica()
         self.board = None
+        if cache is None and CACHE_ARQUIVO:
+            cache = CacheAnalise(CACHE_ARQUIVO)
+        self.cache = cache
+        self.livro = self.abrir_livro()
+        self.tablebase = self.abrir_tablebase()
+        self.ciclo = ciclo or CicloEventos()
+        self.motor = motor or self.abrir_motor()
+        self.transporte = None
+        self.ocupacao_confirmada = None  # último tabuleiro que o ESP32 confirmou (bitboard)
+        self.latencias = {}  # fase do turno -> durações em segundos
+        self.perfilamento = None  # PerfilamentoTurnos no modo --profile
+        self.interrompida = None  # partida cortada por uma queda da conexão, sem diário para retomá-la
+        self.destinos_enviados = []  # ordem dos destinos que o ESP32 está mostrando
+        self.modo_ocupacao = False  # negociado a cada conexão
+        self.passo = None  # número do último comando que abriu uma etapa (com a fila): jogadas anteriores são descartadas
         self.conectar_esp32()
+        self.diario = diario or self.abrir_diario()
     
     #####################
     # CONEXÃO COM ESP32 #
     #####################
     
-    def encontrar_porta_esp32(self):
-        """Encontra automaticamente a porta do ESP32"""
-        while True:
-            ports = serial.tools.list_ports.comports()
-            
-            if not ports:
-                print("Nenhuma porta serial encontrada!")
-                print("Verifique se o ESP32 está conectado via USB")
-                continue
-
-            print(f"Portas seriais encontradas: {len(ports)}")
-            
-            esp32_ports = []
-            for port in ports:
-                print(f"  {port.device} - {port.description}")
-                if any(keyword in port.description.upper() for keyword in 
-                    ['USB', 'CH340', 'CP210', 'ESP32', 'SILICON LABS', 'USB-SERIAL CH340', 'USB SERIAL']):
-                    esp32_ports.append(port)
-                    print(f"    Possível ESP32 detectado!")
-            
-            if not esp32_ports:
-                print("⚠️ Nenhuma porta com padrão de ESP32 detectada.")
-                continue
-            
-            porta_escolhida = esp32_ports[0].device
-            print(f"Porta ESP32 selecionada: {porta_escolhida} - {esp32_ports[0].description}")
-            return porta_escolhida
-        
+    def encontrar_porta_esp32(self, recusadas=(), timeout=None):
+        """Porta do ESP32: a configurada (só ela), a última que funcionou ou a primeira encontrada"""
+        if self.porta:
+            return self.descoberta.aguardar(self.porta, exclusiva=True, timeout=timeout)
+        return self.descoberta.aguardar(self.porta_atual, recusadas, timeout=timeout)
     
     def conectar_esp32(self):
-        """Conecta à porta do ESP32"""
-        porta_esp32 = self.encontrar_porta_esp32()
-        
-        if not porta_esp32:
-            print("Nenhuma porta disponível para conexão")
-            exit(1)
-        
-        print(f"Tentando conectar à porta {porta_esp32}...")
+        """Conecta à porta do ESP32, aguardando ele aparecer se ainda não estiver conectado"""
+        if self.ser is not None:
+            self.transporte = TransporteSerial(self.ser, self.ciclo)
+            self.ocupacao_confirmada = None
+            self.testar_comunicacao_inicial()
+            return
         
-        try:
-            self.ser = serial.Serial(
-                port=porta_esp32,
-                baudrate=BAUDRATE,
-                timeout=TIMEOUT,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                bytesize=serial.EIGHTBITS
-            )
-            
-            time.sleep(2)
-            self.ser.reset_input_buffer()
+        recusadas = set()  # portas que não responderam ao handshake nesta rodada
+        while True:
+            porta_esp32 = self.encontrar_porta_esp32(recusadas, timeout=ESPERA_MAXIMA if recusadas else None)
+            if porta_esp32 is None:
+                # Nenhuma outra porta: tenta todas de novo
+                recusadas.clear()
+                continue
             
-            if self.ser.is_open:
-                print(f"Conectado à porta {porta_esp32}")
-                print(f"Configuração: {BAUDRATE} baud, timeout {TIMEOUT}s")
-                self.testar_comunicacao_inicial()
-            else:
-                print(f"Falha ao abrir porta {porta_esp32}")
-                exit(1)
+            self.log.info("Tentando conectar à porta %s...", porta_esp32)
+            try:
+                self.ser = serial.Serial(
+                    port=porta_esp32,
+                    baudrate=BAUDRATE,
+                    timeout=TIMEOUT,
+                    parity=serial.PARITY_NONE,
+                    stopbits=serial.STOPBITS_ONE,
+                    bytesize=serial.EIGHTBITS
+                )
+                self.ser.reset_input_buffer()
+                self.transporte = TransporteSerial(self.ser, self.ciclo)
+                # Depois de (re)conectar não se sabe o que o ESP32 guarda: o próximo envio é completo
+                self.ocupacao_confirmada = None
+                self.log.info("Conectado à porta %s", porta_esp32)
+                self.log.info("Configuração: %d baud, timeout %ss", BAUDRATE, TIMEOUT)
                 
-        except serial.SerialException as e:
-            print(f"Erro de comunicação serial: {e}")
-            print("Possíveis soluções:")
-            print("   - Verifique se o ESP32 está conectado")
-            print("   - Verifique se nenhum outro programa está usando a porta")
-            print("   - Tente desconectar e reconectar o cabo USB")
-            print("   - Verifique se os drivers estão instalados")
-            exit(1)
-        except Exception as e:
-            print(f"Erro inesperado ao conectar: {e}")
-            exit(1)
+                if self.testar_comunicacao_inicial(HANDSHAKE_TIMEOUT):
+                    self.porta_atual = porta_esp32
+                    self.descoberta.lembrar(porta_esp32)
+                    return
+                self.log.aviso("A porta %s não respondeu como um ESP32", porta_esp32)
+            except serial.SerialException as e:
+                self.log.aviso("Erro de comunicação serial em %s: %s", porta_esp32, e)
+            
+            self.fechar_conexao()
+            self.ser = None
+            recusadas.add(porta_esp32)
+            TENTATIVAS.incrementar(tabuleiro=porta_esp32, motivo="conexao")
+    
+    def reconectar(self):
+        """Reabre a conexão após uma queda, de preferência na mesma porta"""
+        self.log.info("Reconectando ao ESP32...")
+        self.fechar_conexao()
+        self.ser = None
+        self.conectar_esp32()
+    
+    def conectado(self):
+        return bool(self.transporte and not self.transporte.desconectado and self.ser and self.ser.is_open)
     
     ###############
     # COMUNICAÇÃO #
     ###############
 
-    def testar_comunicacao_inicial(self):
-        """Testa a comunicação inicial com o ESP32"""
-        print("Testando comunicação inicial...")
+    def testar_comunicacao_inicial(self, timeout=None):
+        """Envia pings até o ESP32 responder: ao abrir a porta ele pode estar reiniciando"""
+        self.log.info("Testando comunicação inicial...")
+        self.transporte.descartar_pendentes()
+        limite = None if timeout is None else time.monotonic() + timeout
+        espera = PING_INTERVALO
+        pings = 0
         
-        while True:
-            try:
-                self.ser.reset_input_buffer()
-                self.ser.reset_output_buffer()
-                time.sleep(2)
-                
-                if self.enviar_comando("teste", "ping"):
-                    resposta = self.aguardar_resposta(timeout=20)
-                    
-                    if resposta:
-                        print("Comunicação inicial estabelecida com sucesso!")
-                        return True
-                    else:
-                        print(f"Tentativa falhou - sem resposta JSON válida")
-                else:
-                    print(f"Tentativa falhou - erro no envio")
-                    
-            except Exception as e:
-                print(f"Erro: {e}")
+        while limite is None or time.monotonic() < limite:
+            pings += 1
+            if self.enviar_comando("teste", "ping") and self.aguardar_resposta(timeout=espera, comandos=("ok",)):
+                if pings > 1:
+                    # Respostas atrasadas a pings anteriores não podem ser tomadas pelas próximas
+                    time.sleep(PING_INTERVALO)
+                    self.transporte.descartar_pendentes()
+                self.log.info("Comunicação inicial estabelecida com sucesso! (%d pings)", pings)
+                self.negociar_protocolo()
+                self.negociar_fila()
+                self.negociar_modo()
+                return True
             
-            time.sleep(2)
+            TENTATIVAS.incrementar(tabuleiro=self.transporte.porta, motivo="comunicacao")
+            espera = min(espera * 2, ESPERA_MAXIMA)
+        
+        return False
     
-    def aguardar_resposta(self, timeout=120):
-        """Aguarda uma resposta do ESP32"""
-        if not self.ser or not self.ser.is_open:
-            print("Conexão serial não disponível")
-            return None
-            
-        original_timeout = self.ser.timeout
+    def negociar_protocolo(self):
+        """Passa para o protocolo binário se o ESP32 o suportar; senão continua em JSON"""
+        if not PROTOCOLO_BINARIO:
+            return False
+        
+        self.log.info("Negociando protocolo binário...")
+        if self.enviar_comando("protocolo", "binario"):
+            resposta = self.aguardar_resposta(timeout=2, comandos=("ok",))
+            if resposta and resposta.get("resposta") == "binario":
+                self.transporte.usar_protocolo("binario")
+                
+                # Confirma que os quadros chegam íntegros nos dois sentidos
+                if self.enviar_comando("teste", "ping") and self.aguardar_resposta(timeout=2, comandos=("ok",)):
+                    self.log.info("Protocolo binário ativo")
+                    return True
+                
+                self.log.aviso("Falha no teste do protocolo binário, voltando para JSON")
+                self.enviar_comando("protocolo", "json")
+                self.transporte.usar_protocolo("json")
+                return False
         
-        if timeout:
-            self.ser.timeout = timeout
+        self.log.info("ESP32 sem suporte ao protocolo binário, usando JSON")
+        return False
+    
+    def negociar_fila(self):
+        """Passa a numerar os comandos se o ESP32 suportar a fila; senão cada resposta continua sendo aguardada"""
+        self.passo = None
+        if not FILA_COMANDOS:
+            return False
+        
+        self.log.info("Negociando fila de comandos...")
+        if self.enviar_comando("fila", "sim") and self.aguardar_resposta(timeout=2, comandos=("ok",)):
+            self.transporte.usar_fila()
+            self.log.info("Fila de comandos ativa")
+            return True
+        
+        self.log.info("ESP32 sem suporte à fila de comandos, um comando por vez")
+        return False
+    
+    def negociar_modo(self):
+        """Passa para o modo ocupação se o ESP32 o suportar; senão o lance continua em duas etapas"""
+        self.modo_ocupacao = False
+        if not MODO_OCUPACAO:
+            return False
+        
+        self.log.info("Negociando modo ocupação...")
+        resposta = self.requisitar("modo", "ocupacao", comandos=("modo",), timeout=2)
+        if resposta and resposta.get("resposta") == "ocupacao":
+            self.log.info("Modo ocupação ativo: o lance é reconhecido pelos sensores")
+            self.modo_ocupacao = True
+            return True
+        
+        self.log.info("ESP32 sem suporte ao modo ocupação, lance em duas etapas")
+        return False
+    
+    def aguardar_resposta(self, timeout=120, comandos=None, apos=None):
+        """Aguarda uma resposta do ESP32 (com a fila, descartando as anteriores ao comando apos)"""
+        if not self.transporte or not self.ser or not self.ser.is_open:
+            self.log.aviso("Conexão serial não disponível")
+            return None
         
         try:
-            tempo_inicio = time.time()
-            
-            while True:
-                if timeout and (time.time() - tempo_inicio) > timeout:
-                    print(f"Timeout após {timeout} segundos")
-                    return None
-                
-                try:
-                    raw = self.ser.readline()
-                    
-                    if raw:
-                        linha = raw.decode('utf-8', errors='ignore').strip()
-                        
-                        if linha:
-                            print(f"Dados recebidos: {linha}")
-                            
-                            if linha.startswith("{") and linha.endswith("}"):
-                                try:
-                                    resposta = json.loads(linha)
-                                    print(f"JSON válido recebido: {resposta}")
-                                    return resposta
-                                except json.JSONDecodeError as je:
-                                    print(f"JSON inválido: {linha} - Erro: {je}")
-                            else:
-                                print(f"Dados não-JSON ignorados: {linha}")
-                    else:
-                        time.sleep(0.05)
-                        
-                except serial.SerialException as e:
-                    print(f"Erro de comunicação serial: {e}")
-                    return None
-                except UnicodeDecodeError:
-                    continue
-                except Exception as e:
-                    print(f"Erro ao ler dados: {e}")
-                    return None
-                    
+            resposta = self.ciclo.executar(self.transporte.receber(comandos, timeout, apos))
+        except ConexaoPerdida:
+            raise
+        except serial.SerialException as e:
+            self.log.erro("Erro de comunicação serial: %s", e)
+            return None
         except Exception as e:
-            print(f"Erro inesperado ao aguardar resposta: {e}")
+            self.log.excecao("Erro inesperado ao aguardar resposta: %s", e)
             return None
-        finally:
-            if timeout:
-                self.ser.timeout = original_timeout
+        
+        if resposta is not None:
+            self.log.depurar("Recebido: %s", resposta)
+        return resposta
     
     def fechar_conexao(self):
         """Fecha a conexão serial"""
+        if self.transporte:
+            self.transporte.fechar()
         if self.ser and self.ser.is_open:
             self.ser.close()
-            print("Conexão serial fechada")
+            self.log.info("Conexão serial fechada")
 
+    def montar_mensagem(self, comando, resposta):
+        """Mensagem no formato JSON (dicionário) de um comando, com os campos extras que ele leva"""
+        mensagem = {"comando": comando, "resposta": resposta}
+        # O ESP32 só lê a quantidade nos movimentos e a dificuldade no início da partida
+        if comando == "melhores_movimentos":
+            mensagem["qtde"] = len(resposta)
+        elif comando == "iniciar_partida":
+            mensagem["dificuldade"] = self.dificuldade_depth
+        elif comando == "delta":
+            mensagem["checksum"] = checksum_ocupacao(self.board.occupied)
+        return mensagem
+    
+    def marcar_passo(self, comando, seq):
+        """Guarda o número do comando que abriu uma etapa: o que o ESP32 carimbou antes dele é de uma etapa anterior"""
+        if seq is not None and comando in ("tabuleiro", "delta", "confirmacao", "melhores_movimentos"):
+            self.passo = seq
+    
     def enviar_comando(self, comando, resposta):
-        """Envia um comando JSON para o ESP32"""
+        """Envia um comando JSON para o ESP32 (com a fila, sem esperar a confirmação)"""
         try:
-            comando_json = json.dumps({"comando": comando, "resposta": resposta, "qtde": len(resposta), "dificuldade": self.dificuldade_depth}) + '\n'
+            mensagem = self.montar_mensagem(comando, resposta)
+            bytes_enviados, seq = self.ciclo.executar(self.transporte.enviar_numerado(mensagem))
+            self.marcar_passo(comando, seq)
             
-            self.ser.reset_output_buffer()
-            bytes_enviados = self.ser.write(comando_json.encode('utf-8'))
-            self.ser.flush()
-            
-            print(f"Enviado: {comando} -> {str(resposta)[:100]}... ({bytes_enviados} bytes)")
+            self.log.depurar("Enviado: %s -> %.100s (%d bytes)", comando, resposta, bytes_enviados)
             return True
             
+        except ConexaoPerdida:
+            raise
         except serial.SerialException as e:
-            print(f"Erro de comunicação serial ao enviar: {e}")
+            self.log.erro("Erro de comunicação serial ao enviar: %s", e)
             return False
         except Exception as e:
-            print(f"Erro inesperado ao enviar comando: {e}")
+            self.log.excecao("Erro inesperado ao enviar comando: %s", e)
+            return False
+    
+    def requisitar(self, comando, resposta, comandos=("ok",), timeout=120):
+        """Envia um comando e aguarda a resposta dele; com a fila, a que traz o mesmo número de sequência"""
+        if not self.transporte or not self.ser or not self.ser.is_open:
+            self.log.aviso("Conexão serial não disponível")
+            return None
+        
+        try:
+            mensagem = self.montar_mensagem(comando, resposta)
+            self.log.depurar("Enviado: %s -> %.100s", comando, resposta)
+            resposta = self.ciclo.executar(self.transporte.requisitar(mensagem, comandos, timeout))
+        except ConexaoPerdida:
+            raise
+        except serial.SerialException as e:
+            self.log.erro("Erro de comunicação serial: %s", e)
+            return None
+        except Exception as e:
+            self.log.excecao("Erro inesperado ao enviar comando: %s", e)
+            return None
+        
+        if resposta is not None:
+            self.log.depurar("Recebido: %s", resposta)
+            self.marcar_passo(comando, resposta.get("seq"))
+        return resposta
+    
+    #############
+    # TABULEIRO #
+    #############
+    
+    def sincronizar_tabuleiro(self):
+        """Envia ao ESP32 só as casas alteradas desde o último tabuleiro confirmado, ou o tabuleiro completo"""
+        if not SINCRONIA_INCREMENTAL or self.ocupacao_confirmada is None:
+            return self.enviar_tabuleiro_completo()
+        
+        # Sem esperar confirmação: se o checksum não bater, o ESP32 pede o tabuleiro completo
+        ocupacao = self.board.occupied
+        casas = delta_ocupacao(self.ocupacao_confirmada, ocupacao)
+        if len(casas) > MAX_DADOS - 3:  # checksum e número de sequência
+            return self.enviar_tabuleiro_completo()
+        if not self.enviar_comando("delta", casas):
             return False
+        self.ocupacao_confirmada = ocupacao
+        return True
+    
+    def enviar_tabuleiro_completo(self):
+        """Envia as 64 casas e aguarda a confirmação do ESP32"""
+        ocupacao = self.board.occupied
+        self.ocupacao_confirmada = None
+        resposta = self.requisitar("tabuleiro", bitboard_para_ocupacao(ocupacao), timeout=10000)
+        if not resposta:
+            self.log.aviso("ESP32 não confirmou recebimento do tabuleiro")
+            return False
+        
+        self.log.depurar("ESP32 confirmou recebimento do tabuleiro")
+        # Firmware sem checksum na confirmação continua recebendo sempre o tabuleiro completo
+        if resposta.get("checksum") == checksum_ocupacao(ocupacao):
+            self.ocupacao_confirmada = ocupacao
+        return True
     
     ###########
     # JOGADOR #
@@ -211,17 +440,66 @@ class XadrezESP32:
     
     def aguardar_jogada_usuario(self, timeout=10000):
         """Aguarda o usuário fazer uma jogada"""
-        print("\nAguardando jogada do usuário...")
-        resposta = self.aguardar_resposta(timeout=timeout)
+        self.log.info("Aguardando jogada do usuário...")
+        resposta = self.aguardar_resposta(timeout=timeout, comandos=("jogada", "sincronizar"), apos=self.passo)
+        while resposta and resposta.get("comando") == "sincronizar":
+            # O delta não bateu com o checksum no ESP32: ele aguarda o tabuleiro completo
+            self.log.aviso("ESP32 pediu o tabuleiro completo")
+            TENTATIVAS.incrementar(tabuleiro=self.transporte.porta, motivo="tabuleiro")
+            if not self.enviar_tabuleiro_completo():
+                return None
+            resposta = self.aguardar_resposta(timeout=timeout, comandos=("jogada", "sincronizar"), apos=self.passo)
 
         if resposta and resposta.get("comando") == "jogada":
             posicao = resposta.get("posicao")
-            print(f"Jogada do usuário recebida: posição {posicao}")
+            self.log.info("Jogada do usuário recebida: posição %s", posicao)
             return posicao
         else:
-            print("Jogada do usuário não recebida")
+            self.log.aviso("Jogada do usuário não recebida")
             return None
     
+    def aguardar_ocupacao(self, timeout=10000):
+        """Próxima leitura dos sensores no modo ocupação (bitboard), atendendo pedidos de tabuleiro completo"""
+        while True:
+            resposta = self.aguardar_resposta(timeout=timeout, comandos=("ocupacao", "sincronizar"),
+                                               apos=self.passo)
+            if not resposta:
+                return None
+            if resposta.get("comando") == "ocupacao":
+                return ocupacao_para_bitboard(resposta.get("resposta"))
+            self.log.aviso("ESP32 pediu o tabuleiro completo")
+            TENTATIVAS.incrementar(tabuleiro=self.transporte.porta, motivo="tabuleiro")
+            if not self.enviar_tabuleiro_completo():
+                return None
+    
+    def jogada_usuario_por_ocupacao(self, engine, especulativa, jogada_limite, sem_busca):
+        """Reconhece o lance do jogador pelas leituras dos sensores, acendendo a dica da peça levantada"""
+        self.log.info("Aguardando jogada do usuário (modo ocupação)...")
+        inferencia = InferenciaJogada(self.board)
+        dica = None  # casa da peça cuja dica está acesa
+        while True:
+            ocupacao = self.aguardar_ocupacao(1000000)
+            if ocupacao is None:
+                self.log.aviso("Jogada do usuário não recebida")
+                return None
+            inferencia.observar(ocupacao)
+            if not inferencia.estavel():
+                continue
+            
+            movimento = inferencia.lance()
+            if movimento is not None:
+                especulativa.cancelar()
+                self.log.info("Jogada do usuário reconhecida: %s", movimento)
+                return movimento
+            
+            origem = inferencia.levantada()
+            if origem is not None and origem != dica:
+                dica = origem
+                movimentos = [move for move in self.board.legal_moves if move.from_square == origem]
+                if movimentos:
+                    self.log.info("Analisando melhores jogadas de %s (posição %d)...", chess.square_name(origem), origem)
+                    self.mostrar_dica(engine, especulativa, movimentos, jogada_limite, sem_busca, "dica")
+    
     def movimentos_possiveis(self, origem):
         """Filtra todos os movimentos legais que saem de uma casa específica"""
         try:
@@ -230,53 +508,266 @@ class XadrezESP32:
         except:
             return []
 
+    def dica_sem_busca(self, movimentos, limite=None, especulativa=None):
+        """Ranking pronto (livro, tablebase, análise em segundo plano ou cache), ou None se for preciso buscar"""
+        limite = limite or self.dica_limite
+        origem = movimentos[0].from_square
+        if self.livro:
+            ranking = self.livro.ranking(self.board, movimentos, self.dificuldade_depth)
+            if ranking is not None:
+                self.log.info("Dica do livro de aberturas")
+                return ranking
+        if self.tablebase:
+            ranking = self.tablebase.ranking(self.board, movimentos)
+            if ranking is not None:
+                self.log.info("Dica da tablebase Syzygy - acertos: %s", self.tablebase.estatisticas())
+                return ranking
+        if especulativa:
+            ranking = especulativa.dica(origem)
+            if ranking is not None:
+                self.log.info("Dica já calculada em segundo plano")
+                return ranking
+        if self.cache:
+            ranking = self.cache.obter_dica(self.board, origem, limite)
+            if ranking is not None:
+                return ranking
+        return None
+
+    def ranquear_jogadas_para_casa(self, engine, movimentos, limite=None, especulativa=None):
+        """Ordena os movimentos de uma casa com uma única busca MultiPV restrita a eles"""
+        if not movimentos:
+            return []
+        limite = limite or self.dica_limite
+        origem = movimentos[0].from_square
+        ranking = self.dica_sem_busca(movimentos, limite, especulativa)
+        if ranking is not None:
+            return ranking
+        try:
+            inicio = time.monotonic()
+            infos = engine.analyse(self.board, limite, busca="dica", multipv=len(movimentos), root_moves=movimentos)
+            if infos:
+                self.registrar_busca("dica", infos[0], inicio, limite)
+        except Exception as e:
+            self.log.excecao("Erro ao analisar dicas: %s", e)
+            return [(move, None) for move in movimentos]
+        ranking = ranking_das_infos(self.board, movimentos, infos)
+        if self.cache:
+            self.cache.guardar_dica(self.board, origem, limite, ranking)
+        return ranking
+
     def melhor_jogada_para_casa(self, engine, movimentos):
         """Usa o Stockfish para encontrar a melhor jogada entre as disponíveis"""
-        if not movimentos:
-            return None
-        melhores = []
-        scores = []
-        for move in movimentos:
-            self.board.push(move)
-            try:
-                score = engine.analyse(self.board, chess.engine.Limit(depth=8))["score"].white().score(mate_score=10000)
-                scores.append(score if score is not None else 0)
-                melhores.append(move)
-            except:
-                scores.append(0)
-                melhores.append(move)
-            self.board.pop()
-        
-        if scores:
-            melhor_score = max(scores)
-            idx = scores.index(melhor_score)
-            return melhores[idx]
+        ranking = self.ranquear_jogadas_para_casa(engine, movimentos)
+        if ranking:
+            return ranking[0][0]
         return None
     
-    def enviar_melhores_movimentos(self, movimentos):
+    def ordenar_por_heuristica(self, movimentos):
+        """Ordem provisória, só com a geração de lances: capturas (da vítima mais valiosa), xeques e promoções"""
+        def chave(move):
+            vitima = self.board.piece_type_at(move.to_square) or (chess.PAWN if self.board.is_en_passant(move) else 0)
+            return vitima, self.board.gives_check(move), move.promotion or 0
+        return [(move, None) for move in sorted(movimentos, key=chave, reverse=True)]
+    
+    def destinos_do_ranking(self, ranking):
+        """Casas de destino (numeração do ESP32) na ordem do ranking: a primeira é a melhor"""
+        destinos = []
+        for movimento, _ in ranking:
+            destino = self.traduzir_movimento_computador(movimento.uci()[2:4])
+            if destino not in destinos:
+                destinos.append(destino)
+        return destinos
+    
+    def enviar_dica(self, ranking):
+        """Envia a nova ordem dos destinos durante a dica progressiva, se ela mudou"""
+        destinos = self.destinos_do_ranking(ranking)
+        if destinos == self.destinos_enviados:
+            return
+        self.destinos_enviados = destinos
+        if self.log.ativo(DEPURACAO):
+            self.log.depurar("Dica atualizada: %s", [(move.uci(), score) for move, score in ranking])
+        self.enviar_comando("dica", destinos)
+    
+    def mostrar_dica(self, engine, especulativa, movimentos, jogada_limite, sem_busca, comando="melhores_movimentos"):
+        """Envia os destinos da peça levantada e segue aprofundando a dica (ou ponderando as respostas) em segundo plano"""
+        inicio = time.perf_counter()
+        especulativa.cancelar()
+        ranking = self.dica_sem_busca(movimentos, especulativa=especulativa)
+        progressiva = ranking is None and DICA_PROGRESSIVA
+        if progressiva:
+            # Destinos na hora; a busca os reordena enquanto o jogador decide
+            ranking = self.ordenar_por_heuristica(movimentos)
+            self.log.info("Dica progressiva: destinos em ordem provisória")
+        elif ranking is None:
+            ranking = self.ranquear_jogadas_para_casa(engine, movimentos)
+        
+        if ranking and not progressiva:
+            melhor_movimento = ranking[0][0]
+            self.log.info("Melhor jogada sugerida: %s -> %s", chess.square_name(melhor_movimento.from_square),
+                          chess.square_name(melhor_movimento.to_square))
+            if self.log.ativo(DEPURACAO):
+                self.log.depurar("Ranking: %s", [(move.uci(), score) for move, score in ranking])
+        
+        destinos_possiveis = self.destinos_enviados = self.destinos_do_ranking(ranking)
+        self.log.depurar("Destinos possíveis: %s", destinos_possiveis)
+        
+        if not self.enviar_melhores_movimentos(destinos_possiveis, comando):
+            return False
+        self.registrar_latencia("dica", inicio)
+        
+        if progressiva:
+            # Aprofunda a dica até o jogador escolher o destino e, se sobrar tempo, pondera as respostas
+            especulativa.dica_progressiva(self.board, movimentos, jogada_limite, self.enviar_dica)
+        elif not sem_busca:
+            # Pondera a resposta do computador a cada destino enquanto o jogador move a peça
+            especulativa.ponderar(self.board, [movimento for movimento, _ in ranking], jogada_limite)
+        return True
+    
+    def enviar_melhores_movimentos(self, movimentos, comando="melhores_movimentos"):
         """Envia os melhores movimentos possíveis"""
-        print(f"\nEnviando melhores movimentos: {movimentos}")
-        if not self.enviar_comando("melhores_movimentos", movimentos):
+        self.log.depurar("Enviando melhores movimentos: %s", movimentos)
+        if not self.enviar_comando(comando, movimentos):
             return False
         return True
     
     ##############
     # COMPUTADOR #
     ##############
+    def abrir_perfil(self):
+        """Orçamento das buscas (e caminho e opções do motor) do perfil calibrado, ou da configuração padrão"""
+        perfil = carregar_perfil(PERFIL_ARQUIVO)
+        if perfil is None:
+            return OrcamentoBusca(DICA_PROFUNDIDADE, DICA_TEMPO, JOGADA_TEMPO)
+        self.STOCKFISH_PATH = perfil["stockfish"]
+        self.motor_opcoes = perfil["motor"]
+        self.log.info("Perfil do motor carregado: %s (%s, %d nós/s)", PERFIL_ARQUIVO, perfil["motor"], perfil["nps"])
+        jogada = perfil["jogada"]
+        return OrcamentoBusca(perfil["dica"]["profundidade"], perfil["dica"]["tempo"],
+                              {faixa: limites["tempo"] for faixa, limites in jogada.items()}, perfil["nps"],
+                              {faixa: limites["profundidade"] for faixa, limites in jogada.items()})
+    
+    def abrir_motor(self):
+        """Stockfish local ou, se houver um servidor configurado, o remoto com o local como reserva"""
+        local = MotorXadrez(self.ciclo, self.STOCKFISH_PATH, self.motor_opcoes, self.cpu)
+        if not MOTOR_REMOTO:
+            return local
+        self.log.info("Buscas no motor remoto %s:%d (local como reserva)", *MOTOR_REMOTO)
+        return MotorRemoto(self.ciclo, MOTOR_REMOTO, local)
+    
+    def abrir_livro(self):
+        """Abre o livro de aberturas, se houver um configurado"""
+        if not LIVRO_ARQUIVO or not os.path.exists(LIVRO_ARQUIVO):
+            return None
+        try:
+            livro = LivroAberturas(LIVRO_ARQUIVO)
+            self.log.info("Livro de aberturas carregado: %s", LIVRO_ARQUIVO)
+            return livro
+        except Exception as e:
+            self.log.erro("Erro ao abrir livro de aberturas: %s", e)
+            return None
+    
+    def abrir_tablebase(self):
+        """Abre as tablebases Syzygy, se houver um diretório configurado"""
+        if not SYZYGY_DIRETORIO or not os.path.isdir(SYZYGY_DIRETORIO):
+            return None
+        try:
+            tablebase = TablebaseSyzygy(SYZYGY_DIRETORIO)
+            self.log.info("Tablebases Syzygy carregadas: até %d peças", tablebase.max_pecas)
+            return tablebase
+        except Exception as e:
+            self.log.erro("Erro ao abrir tablebases Syzygy: %s", e)
+            return None
+    
+    def abrir_diario(self):
+        """Abre o diário deste tabuleiro (um arquivo por porta), se houver um diretório configurado"""
+        if not DIARIO_DIRETORIO:
+            return None
+        try:
+            os.makedirs(DIARIO_DIRETORIO, exist_ok=True)
+        except OSError as e:
+            self.log.erro("Erro ao criar diretório do diário: %s", e)
+            return None
+        porta = self.transporte.porta
+        nome = f"diario_{os.path.basename(porta)}.jsonl" if porta else "diario.jsonl"
+        return DiarioPartida(os.path.join(DIARIO_DIRETORIO, nome), os.path.join(DIARIO_DIRETORIO, "partidas.pgn"), porta)
+    
+    def posicao_sem_busca(self, board=None):
+        """Indica se livro ou tablebase respondem a posição sem precisar do Stockfish"""
+        board = board or self.board
+        if self.livro and self.livro.em_livro(board, self.dificuldade_depth):
+            return True
+        return bool(self.tablebase and self.tablebase.cobre(board))
+    
+    def jogada_computador(self, engine, limite, especulativa=None):
+        """Escolhe a jogada do computador: livro, tablebase, análise em segundo plano, cache e, por fim, Stockfish"""
+        if self.livro:
+            movimento = self.livro.jogada(self.board, self.dificuldade_depth)
+            if movimento is not None:
+                self.log.info("Jogada do livro de aberturas")
+                return movimento
+        if self.tablebase:
+            movimento = self.tablebase.jogada(self.board)
+            if movimento is not None:
+                self.log.info("Jogada da tablebase Syzygy - acertos: %s", self.tablebase.estatisticas())
+                return movimento
+        if especulativa:
+            movimento = especulativa.resposta(self.board)
+            if movimento is not None:
+                self.log.info("Jogada já ponderada em segundo plano")
+                return movimento
+        if self.cache:
+            movimento = self.cache.obter_jogada(self.board, limite)
+            if movimento is not None:
+                self.log.info("Jogada encontrada no cache")
+                return movimento
+        inicio = time.monotonic()
+        resultado = engine.play(self.board, limite, busca="jogada", info=chess.engine.INFO_BASIC)
+        self.registrar_busca("jogada", resultado.info, inicio, limite)
+        movimento = resultado.move
+        if self.cache and movimento is not None:
+            self.cache.guardar_jogada(self.board, limite, movimento)
+        return movimento
+    
     def enviar_movimento_computador(self, origem, destino):
         """Envia o movimento do computador"""
         movimentos = [origem, destino]
-        print(f"\nEnviando movimento do computador: {origem} -> {destino}")
+        self.log.info("Enviando movimento do computador: %d -> %d", origem, destino)
         if not self.enviar_comando("melhores_movimentos", movimentos):
             return False
         return True
     
+    def confirmar_jogada_por_ocupacao(self, movimento, origem, destino):
+        """Aguarda os sensores mostrarem o lance do computador executado; outra posição parada é avisada e o lance reenviado"""
+        inferencia = InferenciaJogada(self.board)
+        esperada = inferencia.indice.ocupacao(movimento)
+        avisada = None
+        while True:
+            ocupacao = self.aguardar_ocupacao(10000000)
+            if ocupacao is None:
+                return False
+            inferencia.observar(ocupacao)
+            if ocupacao == esperada:
+                if inferencia.estavel():
+                    return True
+                continue
+            
+            # Mesmo número de peças que o esperado e parado: não é uma peça na mão, é um lance feito errado
+            if (ocupacao not in (inferencia.indice.antes, avisada) and inferencia.estavel(duracao=OCUPACAO_ERRO)
+                    and chess.popcount(ocupacao) == chess.popcount(esperada)):
+                avisada = ocupacao
+                executado = inferencia.lance()
+                self.log.aviso("Jogada do computador executada errada: %s em vez de %s",
+                               executado.uci() if executado else "posição inesperada", movimento)
+                TENTATIVAS.incrementar(tabuleiro=self.transporte.porta, motivo="execucao")
+                if not self.enviar_movimento_computador(origem, destino):
+                    return False
+    
     ######################
     # VERIFICAR VENCEDOR #
     ######################
     def verificar_vencedor(self, resultado):
         """Envia resultado da partida"""
-        print(f"\nEnviando resultado: {resultado}")
+        self.log.info("Enviando resultado: %s", resultado)
         if not self.enviar_comando("vencedor", resultado):
             return False
         return True
@@ -328,16 +819,16 @@ class XadrezESP32:
                 opcao = input(f"\nDificuldade atual: {self.dificuldade}\nEscolha nova dificuldade (1-3): ").strip()
                 
                 if opcao == "1":
-                    self.dificuldade = "Fácil"
                     self.dificuldade_depth = 3
+                    self.dificuldade = DIFICULDADES[self.dificuldade_depth]
                     break
                 elif opcao == "2":
-                    self.dificuldade = "Médio"
                     self.dificuldade_depth = 6
+                    self.dificuldade = DIFICULDADES[self.dificuldade_depth]
                     break
                 elif opcao == "3":
-                    self.dificuldade = "Difícil"
-                    self.dificuldade_depth = 10
+                    self.dificuldade_depth = 9
+                    self.dificuldade = DIFICULDADES[self.dificuldade_depth]
                     break
                 else:
                     print("Opção inválida! Digite um número de 1 a 3.")
@@ -346,139 +837,177 @@ class XadrezESP32:
         
         print(f"Dificuldade definida como: {self.dificuldade}")
     
-    def iniciar_partida(self):
-        """Inicia uma nova partida com chess engine"""
-        print(f"\nIniciando nova partida")
-        print(f"Dificuldade: {self.dificuldade} (Depth: {self.dificuldade_depth})")
+    def registrar_latencia(self, fase, inicio):
+        """Guarda a duração de uma fase do turno, medida a partir de time.perf_counter()"""
+        duracao = time.perf_counter() - inicio
+        self.latencias.setdefault(fase, []).append(duracao)
+        if self.perfilamento:
+            self.perfilamento.acumular(fase, duracao)
+        FASES_SEGUNDOS.observar(duracao, tabuleiro=self.transporte.porta, fase=fase)
+    
+    def registrar_busca(self, busca, info, inicio, limite):
+        """Alimenta o orçamento e as métricas com uma busca do Stockfish iniciada em time.monotonic()"""
+        duracao = time.monotonic() - inicio
+        self.orcamento.registrar(info, duracao, limite)
+        BUSCA_SEGUNDOS.observar(duracao, busca=busca)
+        if info.get("nodes") is not None:
+            BUSCA_NOS.observar(info["nodes"], busca=busca)
+        if info.get("nps") is not None:
+            BUSCA_NPS.observar(info["nps"], busca=busca)
+        if info.get("depth") is not None:
+            BUSCA_PROFUNDIDADE.observar(info["depth"], busca=busca)
+    
+    def iniciar_partida(self, posicao_inicial=None, max_turnos=None):
+        """Inicia uma nova partida com chess engine (opcionalmente a partir de um FEN e limitada em turnos)"""
+        try:
+            return self.jogar_partida(posicao_inicial, max_turnos)
+        except ConexaoPerdida as e:
+            self.log.aviso("Conexão com o ESP32 perdida (%s): a partida continua quando ele reconectar", e)
+            if not self.diario:
+                self.interrompida = self.board
+            return False
+    
+    def jogar_partida(self, posicao_inicial, max_turnos):
+        if not self.conectado():
+            self.reconectar()
         
-        self.board = chess.Board()
+        # Sem posição pedida, uma partida interrompida (no diário ou por queda da conexão) é retomada sem repetir buscas
+        retomada = None
+        if not posicao_inicial:
+            if self.diario:
+                retomada = self.diario.retomar()
+            elif self.interrompida is not None:
+                retomada = vez_do_jogador(self.interrompida), self.dificuldade_depth
+        self.interrompida = None
+        if retomada:
+            self.board, self.dificuldade_depth = retomada
+            self.log.info("Retomando partida interrompida (%d lances)", len(self.board.move_stack))
+        else:
+            self.log.info("Iniciando nova partida")
+            self.board = chess.Board(posicao_inicial) if posicao_inicial else chess.Board()
+            if self.diario:
+                self.diario.iniciar(self.board, self.dificuldade_depth)
+        self.log.info("Dificuldade: %s (Depth: %d)", self.dificuldade, self.dificuldade_depth)
         
-        if not self.enviar_comando("iniciar_partida", "iniciar"):
-            return False
+        # O ESP32 recebe a posição completa no primeiro turno (inclusive a retomada)
+        self.ocupacao_confirmada = None
+        if self.livro:
+            self.livro.nova_partida()
         
-        resposta = self.aguardar_resposta(timeout=10000)
-        if not resposta or resposta.get("comando") != "ok":
-            print("ESP32 não confirmou inicialização")
+        # Com a fila a confirmação pode ser só um "ack" (a resposta se perdeu e o comando foi reenviado)
+        resposta = self.requisitar("iniciar_partida", "iniciar", comandos=None, timeout=10000)
+        if not resposta or resposta.get("comando") not in ("ok", "ack"):
+            self.log.aviso("ESP32 não confirmou inicialização")
             return False
         
-        print("ESP32 confirmou inicialização!")
+        self.log.info("ESP32 confirmou inicialização!")
         
         try:
-            with chess.engine.SimpleEngine.popen_uci(self.STOCKFISH_PATH) as engine:
-                print(f"Motor Stockfish iniciado - Dificuldade: {self.dificuldade}")
+            # O mesmo processo do Stockfish atende todas as partidas
+            engine = self.motor
+            engine.nova_partida()
+            with AnaliseEspeculativa(engine, self.dica_limite, self.cache, self.orcamento) as especulativa:
+                self.log.info("Motor Stockfish pronto - Dificuldade: %s", self.dificuldade)
                 
                 turno = 1
-                while not self.board.is_game_over():
-                    print("\nTabuleiro atual:")
-                    print(self.board)
+                while not self.board.is_game_over() and (max_turnos is None or turno <= max_turnos):
+                    if self.perfilamento:
+                        self.perfilamento.iniciar(turno)
+                    self.log.info("Tabuleiro atual:\n%s", str(self.board))
                     
-                    tabuleiro = [0 for _ in range(64)]
-                    for index, piece in enumerate(self.board.piece_map()):
-                        tabuleiro[piece] = 1
-                        
-                    self.enviar_comando("tabuleiro", tabuleiro)
+                    # Enquanto o jogador pensa, o motor já calcula as dicas e pondera respostas
+                    # (com livro de aberturas ou tablebase isso não é necessário)
+                    engine.verificar()
                     
-                    resposta = self.aguardar_resposta(timeout=10000)
-                    if not resposta or resposta.get("comando") != "ok":
-                        print("ESP32 não confirmou recebimento do tabuleiro")
-                        return False
+                    # Limites do turno a partir do orçamento de tempo e dos nós/s medidos até aqui
+                    self.dica_limite = especulativa.dica_limite = self.orcamento.limite_dica()
+                    jogada_limite = self.orcamento.limite_jogada(self.dificuldade_depth)
                     
-                    print("ESP32 confirmou recebimento do tabuleiro!")
+                    sem_busca = self.posicao_sem_busca()
+                    if not sem_busca:
+                        especulativa.iniciar(self.board, jogada_limite)
                     
-                    print(f"\nTurno {turno}")
-                    print(f"Tabuleiro atual (FEN): {self.board.fen()}")
-                    print(f"Vez do {'BRANCO' if self.board.turn else 'PRETO'}")
+                    inicio = time.perf_counter()
+                    if not self.sincronizar_tabuleiro():
+                        return False
+                    self.registrar_latencia("sincronia", inicio)
                     
-                    print("\nJogada do usuário")
-                    while True:
-                        try:
-                            posicao_origem = self.aguardar_jogada_usuario(1000000)
-                            if posicao_origem < 0 or posicao_origem > 63:
-                                print("Timeout ou erro na escolha da origem")
-                                continue
-                            
-                            origem_chess = self.traduzir_movimento_jogador(posicao_origem)
-                            movimentos_possiveis = self.movimentos_possiveis(origem_chess)
-                            if not movimentos_possiveis:
-                                print(f"Nenhum movimento legal possível de {origem_chess}")
+                    self.log.info("Turno %d - FEN: %s - vez do %s", turno, self.board.fen(),
+                                  "BRANCO" if self.board.turn else "PRETO")
+                    
+                    self.log.info("Jogada do usuário")
+                    if self.modo_ocupacao:
+                        # Uma só mensagem por lance: origem, destino, captura e roque saem da mudança de ocupação
+                        movimento = self.jogada_usuario_por_ocupacao(engine, especulativa, jogada_limite, sem_busca)
+                        if movimento is None:
+                            break
+                        self.board.push(movimento)
+                        if self.diario:
+                            self.diario.registrar(self.board)
+                    else:
+                        while True:
+                            try:
+                                posicao_origem = self.aguardar_jogada_usuario(1000000)
+                                if posicao_origem < 0 or posicao_origem > 63:
+                                    self.log.aviso("Timeout ou erro na escolha da origem")
+                                    continue
+                                
+                                origem_chess = self.traduzir_movimento_jogador(posicao_origem)
+                                movimentos_possiveis = self.movimentos_possiveis(origem_chess)
+                                if not movimentos_possiveis:
+                                    self.log.aviso("Nenhum movimento legal possível de %s", origem_chess)
+                                    self.enviar_comando("confirmacao", "nao")
+                                    continue
+                                
+                                self.enviar_comando("confirmacao", "sim")
+                                break
+
+                            except Exception as e:
+                                self.log.excecao("Erro ao processar jogada do usuário: %s", e)
                                 self.enviar_comando("confirmacao", "nao")
                                 continue
-                            
-                            self.enviar_comando("confirmacao", "sim")
+                        
+                        self.log.info("Analisando melhores jogadas de %s (posição %d)...", origem_chess, posicao_origem)
+                        if not self.mostrar_dica(engine, especulativa, movimentos_possiveis, jogada_limite, sem_busca):
                             break
+                        
+                        self.log.info("Aguardando usuário escolher destino...")
+                        posicao_destino = self.aguardar_jogada_usuario()
+                        especulativa.cancelar()
+                        if posicao_destino < 0 or posicao_destino > 63:
+                            self.log.aviso("Timeout ou erro na escolha do destino")
+                            continue
 
+                        destino_chess = self.traduzir_movimento_jogador(posicao_destino)
+                        jogada_uci = origem_chess + destino_chess
+                        self.log.info("Jogada do usuário: %s", jogada_uci)
+                        
+                        try:
+                            movimento = chess.Move.from_uci(jogada_uci)
+                            if movimento not in self.board.legal_moves:
+                                # Tentativa de promoção automática para dama
+                                movimento_promocao = chess.Move.from_uci(jogada_uci + 'q')
+                                if movimento_promocao in self.board.legal_moves:
+                                    movimento = movimento_promocao
+                                else:
+                                    self.log.aviso("Jogada %s é inválida!", jogada_uci)
+                                    continue
+                            self.board.push(movimento)
+                            if self.diario:
+                                self.diario.registrar(self.board)
+                            self.log.info("Jogada %s executada com sucesso!", movimento)
                         except Exception as e:
-                            print(f"Erro ao processar jogada do usuário: {e}")
-                            self.enviar_comando("confirmacao", "nao")
+                            self.log.excecao("Erro ao processar jogada %s: %s", jogada_uci, e)
                             continue
                     
-                    print(f"Analisando melhores jogadas de {origem_chess} (posição {posicao_origem})...")
-                    melhor_movimento = self.melhor_jogada_para_casa(engine, movimentos_possiveis)
-                    
-                    destinos_possiveis = []
-                    if melhor_movimento:
-                        melhor_destino = self.traduzir_movimento_computador(melhor_movimento.uci()[2:4])
-                        destinos_possiveis.append(melhor_destino)
-                        print(f"Melhor jogada sugerida: {origem_chess} -> {melhor_movimento.uci()[2:4]}")
-                    
-                    for movimento in movimentos_possiveis:
-                        destino = self.traduzir_movimento_computador(movimento.uci()[2:4])
-                        if destino not in destinos_possiveis:
-                            destinos_possiveis.append(destino)
-                    
-                    print(f"Destinos possíveis: {destinos_possiveis}")
-                    
-                    if not self.enviar_melhores_movimentos(destinos_possiveis):
-                        break
-                    
-                    print("\nAguardando usuário escolher destino...")
-                    posicao_destino = self.aguardar_jogada_usuario()
-                    if posicao_destino < 0 or posicao_destino > 63:
-                        print("Timeout ou erro na escolha do destino")
-                        continue
-
-                    destino_chess = self.traduzir_movimento_jogador(posicao_destino)
-                    jogada_uci = origem_chess + destino_chess
-                    print(f"Jogada do usuário: {jogada_uci}")
-                    
-                    try:
-                        movimento = chess.Move.from_uci(jogada_uci)
-                        if movimento not in self.board.legal_moves:
-                            # Tentativa de promoção automática para dama
-                            movimento_promocao = chess.Move.from_uci(jogada_uci + 'q')
-                            if movimento_promocao in self.board.legal_moves:
-                                movimento = movimento_promocao
-                            else:
-                                print(f"Jogada {jogada_uci} é inválida!")
-                                continue
-                        self.board.push(movimento)
-                        print(f"Jogada {movimento.uci()} executada com sucesso!")
-                    except Exception as e:
-                        print(f"Erro ao processar jogada {jogada_uci}: {e}")
-                        continue
-                    
                     if self.board.is_game_over():
                         break
                     
-                    print(f"\nJogada do computador ({self.dificuldade})")
-                    
-                    resultado_engine = engine.play(self.board, chess.engine.Limit(depth=self.dificuldade_depth))
-                    movimento_computador = resultado_engine.move
-                    
-                    origem_comp = self.traduzir_movimento_computador(movimento_computador.uci()[:2])
-                    destino_comp = self.traduzir_movimento_computador(movimento_computador.uci()[2:4])
-                    
-                    print(f"Stockfish escolheu: {movimento_computador.uci()} ({origem_comp} -> {destino_comp})")
+                    self.log.info("Jogada do computador (%s)", self.dificuldade)
                     
-                    if not self.enviar_movimento_computador(origem_comp, destino_comp):
-                        break
+                    inicio = time.perf_counter()
+                    movimento_computador = self.jogada_computador(engine, jogada_limite, especulativa)
                     
-                    print("Aguardando execução física da jogada do computador...")
-                    confirmacao = self.aguardar_jogada_usuario(10000000)
-                    if confirmacao is None:
-                        print("Timeout aguardando confirmação da jogada do computador")
-                        break
-
                     # Força promoção para dama, se for uma promoção
                     if movimento_computador.promotion and movimento_computador.promotion != chess.QUEEN:
                         movimento_forcado = chess.Move(
@@ -487,42 +1016,177 @@ class XadrezESP32:
                             promotion=chess.QUEEN
                         )
                         if movimento_forcado in self.board.legal_moves:
-                            print(f"Substituindo promoção sugerida por: {movimento_forcado.uci()} (promoção para dama)")
+                            self.log.info("Substituindo promoção sugerida por: %s (promoção para dama)", movimento_forcado)
                             movimento_computador = movimento_forcado
                     
+                    origem_comp = self.traduzir_movimento_computador(movimento_computador.uci()[:2])
+                    destino_comp = self.traduzir_movimento_computador(movimento_computador.uci()[2:4])
+                    
+                    self.log.info("Computador escolheu: %s (%d -> %d)", movimento_computador, origem_comp, destino_comp)
+                    
+                    if not self.enviar_movimento_computador(origem_comp, destino_comp):
+                        break
+                    self.registrar_latencia("jogada", inicio)
+                    
+                    # Enquanto a jogada é executada fisicamente, o motor já analisa a posição seguinte
+                    proxima = self.board.copy()
+                    proxima.push(movimento_computador)
+                    if not proxima.is_game_over() and not self.posicao_sem_busca(proxima):
+                        especulativa.iniciar(proxima, jogada_limite)
+                    
+                    self.log.info("Aguardando execução física da jogada do computador...")
+                    inicio = time.perf_counter()
+                    if self.modo_ocupacao:
+                        executada = self.confirmar_jogada_por_ocupacao(movimento_computador, origem_comp, destino_comp)
+                    else:
+                        executada = self.aguardar_jogada_usuario(10000000) is not None
+                    if not executada:
+                        self.log.aviso("Timeout aguardando confirmação da jogada do computador")
+                        break
+                    self.registrar_latencia("confirmacao", inicio)
+
                     self.board.push(movimento_computador)
-                    print(f"Jogada do computador {movimento_computador.uci()} executada!")
+                    if self.diario:
+                        self.diario.registrar(self.board)
+                    self.log.info("Jogada do computador %s executada!", movimento_computador)
                     
                     turno += 1
                 
-                print(f"\nFim de jogo")
-                resultado = self.board.result()
-                print(f"Resultado: {resultado}")
-                print(f"Motivo: {self.board.outcome().termination if self.board.outcome() else 'Desconhecido'}")
-                
-                if resultado == "1-0":
-                    print("Vitória das BRANCAS!")
-                    resultado_msg = "1-0"
-                    self.dificuldade_depth = self.dificuldade_depth % 12 + 3
-                elif resultado == "0-1":
-                    print("Vitória das PRETAS!")
-                    resultado_msg = "0-1"
+                if self.perfilamento:
+                    self.perfilamento.encerrar()
+                if not self.board.is_game_over():
+                    # Partida cortada (limite de turnos ou falha no turno): não tem resultado e o diário fica aberto
+                    # para ela ser retomada no próximo início
+                    self.log.info("Partida interrompida (%d lances)", len(self.board.move_stack))
+                    resultado_msg = "interrompida"
                 else:
-                    print("EMPATE!")
-                    resultado_msg = "1/2-1/2"
+                    self.log.info("Fim de jogo")
+                    resultado = self.board.result()
+                    self.log.info("Resultado: %s", resultado)
+                    self.log.info("Motivo: %s", self.board.outcome().termination)
+                    
+                    if resultado == "1-0":
+                        self.log.info("Vitória das BRANCAS!")
+                        resultado_msg = "1-0"
+                        self.dificuldade_depth = self.dificuldade_depth % 12 + 3
+                        self.dificuldade = DIFICULDADES.get(self.dificuldade_depth, self.dificuldade)
+                    elif resultado == "0-1":
+                        self.log.info("Vitória das PRETAS!")
+                        resultado_msg = "0-1"
+                    else:
+                        self.log.info("EMPATE!")
+                        resultado_msg = "1/2-1/2"
                 
                 self.verificar_vencedor(resultado_msg)
-                print(f"Partida finalizada")
+                self.log.info("Partida finalizada")
+                if self.diario and self.board.is_game_over():
+                    self.diario.finalizar(self.board)
+                    if self.diario.pgn:
+                        self.log.info("Partida exportada para %s", self.diario.pgn)
+                if self.cache:
+                    self.log.info("Cache de análises: %s", self.cache.estatisticas())
+                if self.livro:
+                    self.log.info("Livro de aberturas: %s", self.livro.estatisticas())
+                if self.tablebase:
+                    self.log.info("Tablebase Syzygy: %s", self.tablebase.estatisticas())
+                self.log.info("Motor: %s", engine.estatisticas())
+                self.log.info("Orçamento de busca: %s", self.orcamento.estatisticas())
                 
                 return True
                 
+        except ConexaoPerdida:
+            raise
         except Exception as e:
-            print(f"Erro ao iniciar motor Stockfish: {e}")
-            print("Certifique-se de que o Stockfish está instalado e no PATH do sistema")
+            self.log.excecao("Erro ao iniciar motor Stockfish: %s", e)
+            self.log.erro("Certifique-se de que o Stockfish está instalado e no PATH do sistema")
             return False
+        finally:
+            # Turno cortado por uma falha ou queda da conexão
+            if self.perfilamento:
+                self.perfilamento.encerrar()
+
+def jogar_multiplos(perfilamento_limite=None):
+    """Uma partida independente por tabuleiro conectado, com o Stockfish dividido pelo escalonador"""
+    descoberta = DescobertaESP32(PADROES_ESP32)
+    descoberta.aguardar()
+    portas = descoberta.portas()
+    print(f"\nAtendendo {len(portas)} tabuleiros: {portas}")
+    
+    cpu = escalonamento_cpu()
+    cpu.reservar_jogo()
+    ciclo = CicloEventos()
+    perfil = carregar_perfil(PERFIL_ARQUIVO)
+    if perfil:
+        escalonador = EscalonadorMotor(ciclo, perfil["stockfish"], len(portas), perfil["motor"], cpu)
+    else:
+        escalonador = EscalonadorMotor(ciclo, STOCKFISH_PATH, len(portas), cpu=cpu)
+    cache = CacheAnalise(CACHE_ARQUIVO) if CACHE_ARQUIVO else None
+    sessoes = []
+    atendidas = set()
+    
+    def jogar(porta):
+        xadrez = XadrezESP32(porta, ciclo, MotorCompartilhado(escalonador, porta), cache)
+        if perfilamento_limite is not None:
+            xadrez.perfilamento = PerfilamentoTurnos(PERFILAMENTO_DIRETORIO, perfilamento_limite, prefixo=porta)
+        sessoes.append(xadrez)
+        while True:
+            xadrez.iniciar_partida()
+    
+    def ao_conectar(porta):
+        # Uma porta que volta depois de cair continua com a sessão dela, que reconecta sozinha
+        if porta in atendidas:
+            return
+        atendidas.add(porta)
+        threading.Thread(target=jogar, args=(porta,), name=f"Tabuleiro {porta}", daemon=True).start()
+    
+    # Tabuleiros ligados depois do início também ganham sua partida
+    descoberta.observar(ao_conectar)
+    
+    try:
+        while True:
+            time.sleep(RELATORIO_INTERVALO)
+            print(f"\nMotor por tabuleiro ({escalonador.vagas} processos):")
+            for porta, relatorio in escalonador.relatorio().items():
+                print(f"  {porta}: {relatorio}")
+    except KeyboardInterrupt:
+        print("\nPrograma interrompido pelo usuário (Ctrl+C)")
+    finally:
+        for xadrez in sessoes:
+            xadrez.fechar_conexao()
+            if xadrez.diario:
+                xadrez.diario.fechar()
+            if xadrez.livro:
+                xadrez.livro.fechar()
+            if xadrez.tablebase:
+                xadrez.tablebase.fechar()
+        escalonador.fechar()
+        ciclo.fechar()
+        if cache:
+            cache.fechar()
 
 def main():    
+    parser = argparse.ArgumentParser(description="Xadrez com ESP32 e Stockfish")
+    parser.add_argument("--multiplos", action="store_true",
+                        help="atende todos os tabuleiros conectados, cada um com sua partida")
+    parser.add_argument("--log", choices=["depuracao", "info", "aviso", "erro"], default=LOG_NIVEL,
+                        help="nível dos registros exibidos (padrão: %(default)s)")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"grava o perfil de cada turno lento em {PERFILAMENTO_DIRETORIO}")
+    parser.add_argument("--profile-limite", type=int, default=PERFILAMENTO_LIMITE_MS, metavar="MS",
+                        help="espera do jogador no turno, em ms, a partir da qual o perfil é gravado (padrão: %(default)s)")
+    args = parser.parse_args()
+    configurar(nivel=args.log, nivel_anel=LOG_NIVEL_ANEL)
+    exportar_metricas()
+    perfilamento_limite = args.profile_limite if args.profile else None
+    if args.multiplos:
+        jogar_multiplos(perfilamento_limite)
+        return
+    
+    # Antes de criar as threads e o motor: as threads do jogo herdam o núcleo reservado
+    escalonamento_cpu().reservar_jogo()
     xadrez = XadrezESP32()
+    if perfilamento_limite is not None:
+        xadrez.perfilamento = PerfilamentoTurnos(PERFILAMENTO_DIRETORIO, perfilamento_limite)
     
     print("\nBem-vindo ao jogo de Xadrez com ESP32!")
     try:
@@ -572,9 +1236,19 @@ def main():
     except KeyboardInterrupt:
         print("\nPrograma interrompido pelo usuário (Ctrl+C)")
     except Exception as e:
-        print(f"\nErro inesperado: {e}")
+        obter_log("xadrez").excecao("Erro inesperado: %s", e)
     finally:
         xadrez.fechar_conexao()
+        if xadrez.diario:
+            xadrez.diario.fechar()
+        xadrez.motor.fechar()
+        xadrez.ciclo.fechar()
+        if xadrez.cache:
+            xadrez.cache.fechar()
+        if xadrez.livro:
+            xadrez.livro.fechar()
+        if xadrez.tablebase:
+            xadrez.tablebase.fechar()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file